@@ -0,0 +1,313 @@
+import os
+import sys
+import time
+import html
+import queue
+import random
+import bisect
+import logging
+import argparse
+import threading
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Callable
+
+from entity_extractor import (AMOUNT_RE, WORD_RE, DEFAULT_SYMBOLS, SECTOR_KEYWORDS, classify_sector,
+                              load_symbol_aliases)
+from change_detector import item_key
+from sources import normalize_url
+from storage import atomic_write_json, read_json, find_snapshots
+
+logger = logging.getLogger(__name__)
+
+WATCHLISTS_FILE = os.path.join('data', 'watchlists.json')
+ALERT_STATE_FILE = os.path.join('data', 'alert_state.json')
+
+# Rupee amounts in crore per unit; a bare "₹500" is rupees
+CRORE_PER_UNIT = {'lakh crore': 1e5, 'crore': 1.0, 'cr': 1.0, 'lakh': 0.01, 'billion': 100.0, 'bn': 100.0,
+                  'million': 0.1, 'mn': 0.1, '': 1e-7}
+
+# Condition bits: a rule fires when every condition it sets is met
+TICKER, KEYWORD, SECTOR, AMOUNT = 1, 2, 4, 8
+
+
+def max_crore(text: str) -> float:
+    """Largest rupee amount mentioned in the text, in crore (0 if none)."""
+    largest = 0.0
+    for m in AMOUNT_RE.finditer(text):
+        value = float((m.group('value') or m.group('bare')).replace(',', ''))
+        unit = (m.group('unit') or m.group('bare_unit') or '').lower()
+        largest = max(largest, value * CRORE_PER_UNIT.get(unit, 1.0))
+    return largest
+
+
+@dataclass
+class Rule:
+    """One alert condition set for one chat. Lists match any of their entries."""
+    chat_id: str
+    name: str
+    tickers: List[str] = field(default_factory=list)
+    keywords: List[str] = field(default_factory=list)
+    sectors: List[str] = field(default_factory=list)
+    min_crore: Optional[float] = None
+
+    @property
+    def required(self) -> int:
+        return ((TICKER if self.tickers else 0) | (KEYWORD if self.keywords else 0) |
+                (SECTOR if self.sectors else 0) | (AMOUNT if self.min_crore is not None else 0))
+
+
+def load_rules(path: str = WATCHLISTS_FILE) -> List[Rule]:
+    """Rules from {"watchlists": [{"chat_id": ..., "rules": [{"name", "tickers", "keywords", "sectors", "min_crore"}]}]}."""
+    try:
+        config = read_json(path)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not load watchlists from {path}: {e}")
+        return []
+    rules = []
+    for watchlist in config.get('watchlists', []):
+        for i, spec in enumerate(watchlist.get('rules', []), 1):
+            rule = Rule(chat_id=str(watchlist['chat_id']), name=spec.get('name', f"rule {i}"),
+                        tickers=[t.upper() for t in spec.get('tickers', [])],
+                        keywords=[k.lower() for k in spec.get('keywords', [])],
+                        sectors=[s.lower() for s in spec.get('sectors', [])],
+                        min_crore=spec.get('min_crore'))
+            if rule.required:
+                rules.append(rule)
+            else:
+                logger.warning(f"Ignoring rule '{rule.name}' for {rule.chat_id}: it has no conditions")
+    return rules
+
+
+class RuleMatcher:
+    """All rules compiled into one word trie plus inverted lists from matched terms to rules.
+
+    An item is scanned once, whatever the number of rules: the trie reports
+    every ticker alias and keyword phrase in the text, and only the rules
+    listed under those terms or the item's sector are looked at. Amount
+    thresholds are checked only for those candidates, except for amount-only
+    rules, which are kept sorted by threshold.
+    """
+
+    def __init__(self, rules: List[Rule], aliases: Optional[Dict[str, str]] = None):
+        self.rules = rules
+        self.required = [rule.required for rule in rules]
+        self.min_crore = [rule.min_crore for rule in rules]
+        self.trie = {}
+        self.postings = {}
+        thresholds = []
+        wanted = {t for rule in rules for t in rule.tickers}
+        aliases = aliases if aliases is not None else load_symbol_aliases()
+        for alias, symbol in aliases.items():
+            if symbol in wanted:
+                self._add_phrase(alias, f"ticker:{symbol}")
+        for symbol in wanted:
+            self._add_phrase(symbol, f"ticker:{symbol}")
+
+        for i, rule in enumerate(rules):
+            for symbol in rule.tickers:
+                self.postings.setdefault(f"ticker:{symbol}", []).append((i, TICKER))
+            for keyword in rule.keywords:
+                self._add_phrase(keyword, f"keyword:{keyword}")
+                self.postings.setdefault(f"keyword:{keyword}", []).append((i, KEYWORD))
+            for sector in rule.sectors:
+                self.postings.setdefault(f"sector:{sector}", []).append((i, SECTOR))
+            if rule.required == AMOUNT:
+                thresholds.append((rule.min_crore, i))
+        thresholds.sort()
+        self.thresholds = [t for t, _ in thresholds]
+        self.threshold_rules = [i for _, i in thresholds]
+        self.has_sectors = any(rule.sectors for rule in rules)
+
+    def _add_phrase(self, phrase: str, term: str):
+        node = self.trie
+        for word in WORD_RE.findall(phrase.lower()):
+            node = node.setdefault(word, {})
+        node.setdefault('$', set()).add(term)
+
+    def terms(self, text: str) -> set:
+        """Every term whose phrase occurs in the text (overlapping matches included)."""
+        words = WORD_RE.findall(text.lower())
+        found = set()
+        trie = self.trie
+        for i, word in enumerate(words):
+            node = trie.get(word)
+            j = i + 1
+            while node is not None:
+                if '$' in node:
+                    found.update(node['$'])
+                node = node.get(words[j]) if j < len(words) else None
+                j += 1
+        return found
+
+    def match(self, news_item: Dict) -> List[int]:
+        """Indexes of the rules the item satisfies."""
+        text = f"{news_item.get('headline', '')} {news_item.get('description', '')}"
+        terms = self.terms(text)
+        if self.has_sectors:
+            terms.add(f"sector:{classify_sector(news_item)}")
+        met = {}
+        for term in terms:
+            for rule, bit in self.postings.get(term, ()):
+                met[rule] = met.get(rule, 0) | bit
+        amount = None
+        fired = []
+        for rule, bits in met.items():
+            if self.min_crore[rule] is not None:
+                if amount is None:
+                    amount = max_crore(text)
+                if amount >= self.min_crore[rule]:
+                    bits |= AMOUNT
+            if bits == self.required[rule]:
+                fired.append(rule)
+        if self.thresholds:
+            amount = max_crore(text) if amount is None else amount
+            fired += self.threshold_rules[:bisect.bisect_right(self.thresholds, amount)]
+        return fired
+
+
+def format_alert(news_item: Dict, rules: List[Rule]) -> str:
+    names = ", ".join(html.escape(rule.name) for rule in rules)
+    headline = html.escape(news_item.get('headline', ''))
+    if news_item.get('url'):
+        headline = f"<a href=\"{html.escape(news_item['url'])}\">{headline}</a>"
+    description = html.escape(news_item.get('description', '')[:300])
+    return f"🚨 <b>{names}</b>\n{headline}\n{description}"
+
+
+class AlertEngine:
+    """Evaluates each scraped item against the compiled rules and pushes alerts without waiting for analysis.
+
+    on_item() is the scraper callback. Sending happens on a background thread
+    so a slow Telegram call never holds up the scrape, and a story alerts each
+    chat once per dedup window, across sources and runs. A story counts as
+    alerted only once its send succeeds; while queued it is held as pending,
+    so a second copy from another source is not queued too.
+    """
+
+    def __init__(self, rules: List[Rule], send: Callable[[str, str], bool], state_path: str = ALERT_STATE_FILE,
+                 dedup_hours: float = 48):
+        self.matcher = RuleMatcher(rules)
+        self.send = send
+        self.state_path = state_path
+        self.dedup_seconds = dedup_hours * 3600
+        try:
+            self.sent = read_json(state_path)
+        except (OSError, ValueError):
+            self.sent = {}
+        self.stats = {'items': 0, 'alerts': 0, 'failed': 0, 'match_seconds': 0.0}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._send_loop, daemon=True)
+        self._worker.start()
+
+    def on_item(self, news_item: Dict):
+        start = time.perf_counter()
+        fired = self.matcher.match(news_item)
+        with self._lock:
+            self.stats['match_seconds'] += time.perf_counter() - start
+            self.stats['items'] += 1
+        if not fired:
+            return
+        keys = [item_key(news_item)]
+        if news_item.get('url'):
+            keys.append(normalize_url(news_item['url']))
+        by_chat = {}
+        for i in fired:
+            by_chat.setdefault(self.matcher.rules[i].chat_id, []).append(self.matcher.rules[i])
+        now = time.time()
+        with self._lock:
+            for chat_id, rules in by_chat.items():
+                chat_keys = [f"{chat_id}|{key}" for key in keys]
+                if any(key in self._pending or now - self.sent.get(key, 0) < self.dedup_seconds
+                       for key in chat_keys):
+                    continue
+                self._pending.update(chat_keys)
+                self._queue.put((chat_id, chat_keys, format_alert(news_item, rules)))
+
+    def _send_loop(self):
+        while True:
+            chat_id, chat_keys, text = self._queue.get()
+            try:
+                ok = self.send(chat_id, text)
+            except Exception as e:
+                logger.warning(f"Alert to {chat_id} failed: {e}")
+                ok = False
+            with self._lock:
+                # A failed alert is not recorded, so the next copy of the story tries again
+                if ok:
+                    now = time.time()
+                    for key in chat_keys:
+                        self.sent[key] = now
+                self._pending.difference_update(chat_keys)
+                self.stats['alerts' if ok else 'failed'] += 1
+            self._queue.task_done()
+
+    def close(self):
+        """Wait for queued alerts to go out and persist which stories were alerted."""
+        self._queue.join()
+        cutoff = time.time() - self.dedup_seconds
+        with self._lock:
+            self.sent = {key: ts for key, ts in self.sent.items() if ts >= cutoff}
+            atomic_write_json(self.state_path, self.sent)
+
+
+def synthetic_rules(count: int, seed: int = 43) -> List[Rule]:
+    """Random watchlist rules over the built-in symbols, for benchmarking."""
+    rng = random.Random(seed)
+    symbols = sorted(set(DEFAULT_SYMBOLS.values()))
+    keywords = ['downgrade', 'upgrade', 'block deal', 'stake sale', 'order', 'results', 'target price', 'ipo',
+                'penalty', 'sebi', 'rbi', 'merger', 'dividend', 'buyback', 'lower circuit', 'upper circuit']
+    rules = []
+    for i in range(count):
+        kind = i % 4
+        rules.append(Rule(
+            chat_id=str(1000 + i // 5), name=f"rule {i}",
+            tickers=rng.sample(symbols, rng.randint(1, 5)) if kind in (0, 1) else [],
+            keywords=rng.sample(keywords, rng.randint(1, 3)) if kind in (1, 2) else [],
+            sectors=[rng.choice(list(SECTOR_KEYWORDS))] if kind == 3 else [],
+            min_crore=float(rng.choice([100, 500, 1000, 5000])) if kind in (2, 3) else None))
+    return rules
+
+
+def benchmark(rule_counts: List[int]) -> List[Dict]:
+    news_items = []
+    for path in find_snapshots():
+        try:
+            news_items += read_json(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping {path}: {e}")
+    results = []
+    for count in rule_counts:
+        start = time.perf_counter()
+        matcher = RuleMatcher(synthetic_rules(count))
+        compile_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        fired = sum(len(matcher.match(n)) for n in news_items)
+        seconds = time.perf_counter() - start
+        results.append({'rules': count, 'items': len(news_items), 'compile_ms': compile_seconds * 1000,
+                        'us_per_item': seconds * 1e6 / max(1, len(news_items)), 'matches': fired})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watchlist alert rules")
+    parser.add_argument('--benchmark', action='store_true', help="Time matching with synthetic rule sets")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.benchmark:
+        for r in benchmark([10, 100, 1000, 5000]):
+            print(f"{r['rules']:>5} rules: compile {r['compile_ms']:7.1f} ms, {r['us_per_item']:6.1f} µs/item "
+                  f"over {r['items']} items, {r['matches']} matches")
+        return
+    rules = load_rules()
+    chats = {rule.chat_id for rule in rules}
+    print(f"{len(rules)} rules for {len(chats)} chats in {WATCHLISTS_FILE}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(0)
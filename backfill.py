@@ -0,0 +1,295 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from string import Template
+from typing import List, Dict, Optional
+
+import aiohttp
+
+from entity_extractor import EntityExtractor, classify_sector, is_simple_corporate_action, build_corporate_actions_bullets
+from entity_index import EntityIndex, INDEX_DIR
+from storage import atomic_write_json, read_json, strip_suffixes, find_snapshots, snapshot_timestamp
+from search_index import SearchIndex, SEARCH_DB
+from sources import dedup_items
+from summarizer import ExtractiveSummarizer
+from prioritizer import prioritize
+from insight_schema import schema_prompt, parse_batch_records, merge_records
+from prompts import Prompt, PREFIXES
+from token_budget import cached_tokens
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_DIR = os.path.join('data', 'backfill')
+
+_extractor = None  # one per worker process
+
+
+def _shard_name(snapshot: str) -> str:
+    return strip_suffixes(os.path.basename(snapshot))
+
+
+def _load_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: str, data: Dict):
+    atomic_write_json(path, data)
+
+
+def prepare_shard(snapshot: str, out_dir: str = BACKFILL_DIR) -> Dict:
+    """CPU stage for one snapshot: parse, dedup, extract, score and summarize (checkpointed)."""
+    global _extractor
+    checkpoint = os.path.join(out_dir, 'prepared', f"{_shard_name(snapshot)}.json")
+    shard = _load_json(checkpoint)
+    if shard is not None:
+        shard['stats']['cached'] = True
+        return shard
+
+    start = time.perf_counter()
+    raw_items = read_json(snapshot)
+    if _extractor is None:
+        _extractor = EntityExtractor()
+    news_items = prioritize(_extractor.annotate(dedup_items(raw_items)))
+    for news_item in news_items:
+        news_item['sector'] = classify_sector(news_item)
+
+    # Same selection as the live analyzer: local corporate actions out, duplicates merged
+    candidates = [n for n in news_items if not is_simple_corporate_action(n['entities'])]
+    summarized = ExtractiveSummarizer().summarize(candidates)
+    position = {id(n): i for i, n in enumerate(news_items)}
+
+    shard = {
+        'snapshot': snapshot,
+        'indexed_at': snapshot_timestamp(snapshot),
+        'news': news_items,
+        'analyze': [position[id(n)] for n in summarized],
+        'corporate_actions': build_corporate_actions_bullets(news_items),
+        'stats': {'raw': len(raw_items), 'deduped': len(news_items), 'analyze': len(summarized),
+                  'seconds': round(time.perf_counter() - start, 3), 'cached': False},
+    }
+    _write_json(checkpoint, shard)
+    return shard
+
+
+class RateLimiter:
+    """Spaces out requests to stay under a requests-per-minute limit."""
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute
+        self._lock = asyncio.Lock()
+        self._next = 0.0
+
+    async def wait(self):
+        async with self._lock:
+            delay = self._next - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next = max(time.monotonic(), self._next) + self.interval
+
+
+class LLMStage:
+    """Async, rate-limited structured extraction for prepared shards (checkpointed per shard)."""
+
+    def __init__(self, analyzer, out_dir: str, variant: str = 'default',
+                 prompt_template: Optional[Template] = None, requests_per_minute: float = 30):
+        self.analyzer = analyzer
+        self.out_dir = os.path.join(out_dir, variant)
+        self.prompt_template = prompt_template
+        self.limiter = RateLimiter(requests_per_minute)
+
+    def checkpoint(self, snapshot: str) -> str:
+        return os.path.join(self.out_dir, f"{_shard_name(snapshot)}.json")
+
+    def build_prompt(self, batch: List[Dict]) -> Prompt:
+        news_summary = self.analyzer.prepare_concise_batch_summary(batch)
+        if self.prompt_template:
+            return Prompt(PREFIXES['custom'], self.prompt_template.substitute(schema=schema_prompt(), news=news_summary))
+        return self.analyzer.build_structured_batch_prompt(news_summary)
+
+    async def complete(self, session: aiohttp.ClientSession, prompt: Prompt, tier: str = 'large',
+                       max_retries: int = 3) -> str:
+        analyzer = self.analyzer
+        model, max_tokens = analyzer.tiers[tier]
+        payload = analyzer.build_payload(prompt, json_mode=True, max_tokens=max_tokens, model=model)
+        input_tokens = prompt.tokens(model)
+        if not analyzer.token_budget.can_afford(input_tokens, max_tokens, model=model):
+            raise RuntimeError("token budget exhausted")
+        start = time.perf_counter()
+        for attempt in range(max_retries):
+            await self.limiter.wait()
+            async with session.post(analyzer.base_url, headers=analyzer.headers, json=payload) as response:
+                if response.status == 429:
+                    wait_time = 15 * (attempt + 1)
+                    logger.warning(f"Rate limit hit, waiting {wait_time}s")
+                    await asyncio.sleep(wait_time)
+                    continue
+                response.raise_for_status()
+                result = await response.json()
+            content = result['choices'][0]['message']['content'].strip()
+            usage = result.get('usage', {})
+            analyzer.token_budget.record(usage.get('prompt_tokens', input_tokens),
+                                         usage.get('completion_tokens', analyzer.token_budget.count(content)),
+                                         model=model, cached_tokens=cached_tokens(usage), tier=tier,
+                                         seconds=time.perf_counter() - start)
+            return content
+        raise RuntimeError("max retries exceeded")
+
+    async def run_batch(self, session: aiohttp.ClientSession, batch: List[Dict], offset: int) -> Dict:
+        """Records for one batch, escalating through the tiers like the live analyzer's run_batch."""
+        prompt = self.build_prompt(batch)
+        tiers = self.analyzer.escalation_tiers()
+        for calls, tier in enumerate(tiers, 1):
+            response = await self.complete(session, prompt, tier)
+            try:
+                records, _ = parse_batch_records(response, len(batch), offset)
+                return {'records': records, 'tier': tier, 'api_calls': calls}
+            except ValueError as e:
+                # Invalid JSON on the last tier fails the shard, so a rerun retries it
+                if tier == tiers[-1]:
+                    raise
+                logger.warning(f"{tier} model returned unusable records ({e}), escalating")
+                self.analyzer.token_budget.record_escalation(tier)
+
+    async def run_shard(self, session: aiohttp.ClientSession, shard: Dict) -> Dict:
+        checkpoint = self.checkpoint(shard['snapshot'])
+        result = _load_json(checkpoint)
+        if result is not None:
+            return result
+
+        items = [shard['news'][i] for i in shard['analyze']]
+        batch_size = self.analyzer.batch_size
+        offsets = range(0, len(items), batch_size)
+        batches = await asyncio.gather(*(self.run_batch(session, items[o:o + batch_size], o) for o in offsets))
+        records = [record for batch in batches for record in batch['records']]
+
+        result = {'snapshot': shard['snapshot'], 'tiers': [batch['tier'] for batch in batches],
+                  'api_calls': sum(batch['api_calls'] for batch in batches), 'records': merge_records(records)}
+        _write_json(checkpoint, result)
+        return result
+
+
+async def run_backfill(snapshots: List[str], workers: int, out_dir: str = BACKFILL_DIR,
+                       llm_stage: Optional[LLMStage] = None) -> Dict:
+    """Shard snapshots over a process pool and feed each finished shard straight into the LLM stage."""
+    loop = asyncio.get_running_loop()
+    stats = {'shards': len(snapshots), 'prepared': 0, 'cached': 0, 'items': 0, 'cpu_wall': 0.0,
+             'analyzed': 0, 'failed': 0, 'records': 0, 'shards_data': []}
+    start = time.perf_counter()
+
+    async def prepare(pool, path):
+        # One bad snapshot is counted and skipped rather than aborting the backfill
+        try:
+            return await loop.run_in_executor(pool, prepare_shard, path, out_dir)
+        except Exception as e:
+            stats['failed'] += 1
+            logger.warning(f"CPU stage failed for {path}, skipping it: {e}")
+            return None
+
+    async def analyze(session, shard):
+        try:
+            result = await llm_stage.run_shard(session, shard)
+            stats['analyzed'] += 1
+            stats['records'] += len(result['records'])
+        except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError, ValueError, KeyError) as e:
+            stats['failed'] += 1
+            logger.warning(f"LLM stage failed for {shard['snapshot']}, will resume next run: {e}")
+
+    session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60)) if llm_stage else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [prepare(pool, path) for path in snapshots]
+            llm_tasks = []
+            for future in asyncio.as_completed(futures):
+                shard = await future
+                if shard is None:
+                    continue
+                shard_stats = shard['stats']
+                stats['cached' if shard_stats['cached'] else 'prepared'] += 1
+                stats['items'] += shard_stats['raw']
+                stats['shards_data'].append(shard)
+                logger.info(f"Prepared {shard['snapshot']}: {shard_stats}")
+                if llm_stage:
+                    llm_tasks.append(asyncio.create_task(analyze(session, shard)))
+            stats['cpu_wall'] = time.perf_counter() - start
+            await asyncio.gather(*llm_tasks)
+    finally:
+        if session:
+            await session.close()
+    stats['wall'] = time.perf_counter() - start
+    return stats
+
+
+def rebuild_indexes(shards: List[Dict]):
+    """Rebuild the entity and search indexes from prepared shards, oldest snapshot first."""
+    for path in (os.path.join(INDEX_DIR, 'articles.jsonl'), os.path.join(INDEX_DIR, 'postings.bin'), SEARCH_DB):
+        if os.path.exists(path):
+            os.remove(path)
+    entity_index = EntityIndex()
+    search_index = SearchIndex()
+    for shard in sorted(shards, key=lambda s: s['indexed_at']):
+        entity_index.add_items(shard['news'], indexed_at=shard['indexed_at'])
+        search_index.add_items(shard['news'], indexed_at=shard['indexed_at'])
+    print(f"Indexes rebuilt: {entity_index.stats()['articles']} articles, {search_index.count()} searchable")
+    search_index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run the pipeline over archived snapshots")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Processes for the CPU stages")
+    parser.add_argument('--llm', action='store_true', help="Also run structured LLM extraction per snapshot")
+    parser.add_argument('--prompt-file', help="Prompt variant: a template using $schema and $news")
+    parser.add_argument('--rpm', type=float, default=30, help="LLM requests per minute")
+    parser.add_argument('--rebuild-indexes', action='store_true', help="Rebuild the entity and search indexes")
+    parser.add_argument('--fresh', action='store_true', help="Ignore checkpoints of the CPU stage")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    snapshots = find_snapshots()
+    if args.fresh:
+        for path in snapshots:
+            checkpoint = os.path.join(BACKFILL_DIR, 'prepared', f"{_shard_name(path)}.json")
+            if os.path.exists(checkpoint):
+                os.remove(checkpoint)
+
+    llm_stage = None
+    if args.llm:
+        # Imported here so CPU-only backfills don't need the scraper's dependencies
+        from zerodha_news_analyzer import StreamlinedFinancialNewsAnalyzer, get_groq_token
+        template = None
+        variant = 'default'
+        if args.prompt_file:
+            with open(args.prompt_file, 'r', encoding='utf-8') as f:
+                template = Template(f.read())
+            variant = _shard_name(args.prompt_file)
+        llm_stage = LLMStage(StreamlinedFinancialNewsAnalyzer(get_groq_token()), BACKFILL_DIR, variant,
+                             template, args.rpm)
+
+    stats = asyncio.run(run_backfill(snapshots, args.workers, BACKFILL_DIR, llm_stage))
+    # A failed shard, in either stage, is retried by the next run
+    print(f"{stats['shards']} snapshots: {stats['prepared']} prepared, {stats['cached']} from checkpoints, "
+          f"{stats['failed']} failed")
+    # Compare items/s across --workers values to check scaling on this machine
+    print(f"CPU stage: {stats['items']} items in {stats['cpu_wall']:.2f}s on {args.workers} workers "
+          f"({stats['items'] / max(stats['cpu_wall'], 1e-9):.0f} items/s)")
+    if llm_stage:
+        print(f"LLM stage: {stats['analyzed']} analyzed, {stats['records']} records "
+              f"({llm_stage.analyzer.token_budget.summary()})")
+    if args.rebuild_indexes:
+        rebuild_indexes(stats['shards_data'])
+    print(f"Total: {stats['wall']:.2f}s")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,292 @@
+import os
+import sys
+import html
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+
+import aiohttp
+from dotenv import load_dotenv
+
+from report_renderer import parse_report_text, render_telegram_messages, chunk_blocks
+from entity_extractor import SECTOR_KEYWORDS, classify_sector
+from entity_index import EntityIndex, INDEX_DIR
+from storage import latest_report, read_text
+from sentiment import SentimentSeries, SERIES_FILE
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_BASE = "https://api.telegram.org"
+HELP_TEXT = ("<b>Commands</b>\n"
+             "/latest - the latest full report\n"
+             "/sector &lt;name&gt; - report points and recent news for a sector, e.g. /sector banking\n"
+             "/stock &lt;ticker or name&gt; - report points and recent news for a stock, e.g. /stock TATASTEEL\n"
+             "/sentiment [sector] - local news sentiment over the last day, e.g. /sentiment banking")
+SECTORS = list(SECTOR_KEYWORDS) + ['general']
+
+
+class ReportCache:
+    """The latest saved report and the news index, held in memory and refreshed when files change.
+
+    refresh() may run in a worker thread while answer() runs on the event
+    loop: answers built from data that a refresh replaced are not cached.
+    """
+
+    def __init__(self, data_dir: str = 'data', news_days: float = 7, news_limit: int = 8,
+                 max_responses: int = 512):
+        self.data_dir = data_dir
+        self.news_days = news_days
+        self.news_limit = news_limit
+        self.report = None
+        self.report_file = None
+        self.index = None
+        self._index_mtime = None
+        self.sentiment = None
+        self._sentiment_mtime = None
+        self.max_responses = max_responses
+        self._responses = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def refresh(self) -> bool:
+        """Reload whatever changed on disk. Returns True if anything did."""
+        changed = False
+        latest = latest_report(self.data_dir)
+        if latest and latest != self.report_file:
+            self.report = parse_report_text(read_text(latest))
+            self.report_file = latest
+            changed = True
+
+        postings = os.path.join(INDEX_DIR, 'postings.bin')
+        mtime = os.path.getmtime(postings) if os.path.exists(postings) else None
+        if self.index is None or mtime != self._index_mtime:
+            self.index = EntityIndex()
+            self._index_mtime = mtime
+            changed = True
+
+        mtime = os.path.getmtime(SERIES_FILE) if os.path.exists(SERIES_FILE) else None
+        if self.sentiment is None or mtime != self._sentiment_mtime:
+            self.sentiment = SentimentSeries()
+            self._sentiment_mtime = mtime
+            changed = True
+
+        if changed:
+            with self._lock:
+                self._generation += 1
+                self._responses.clear()
+            logger.info(f"Cache refreshed: report {self.report_file}, {len(self.index.articles)} indexed articles")
+        return changed
+
+    def answer(self, command: str, argument: str) -> List[str]:
+        """HTML messages for a command; repeated questions are served from a bounded LRU response cache."""
+        key = self._resolve(command, argument)
+        with self._lock:
+            replies = self._responses.get(key)
+            if replies is not None:
+                self._responses.move_to_end(key)
+                return replies
+            generation = self._generation
+        replies = self._build_answer(*key)
+        with self._lock:
+            if generation == self._generation:
+                self._responses[key] = replies
+                if len(self._responses) > self.max_responses:
+                    self._responses.popitem(last=False)
+        return replies
+
+    def _resolve(self, command: str, argument: str) -> Tuple[str, str]:
+        """(command, subject) with the subject resolved to a known ticker, sector or series name ('' if none),
+        so every spelling of one question shares a cache entry."""
+        if command == '/latest':
+            return command, ''
+        if command == '/sector':
+            sector = argument.strip().lower().replace(' ', '_')
+            return command, sector if sector in SECTORS else ''
+        if command == '/stock':
+            return command, self.index.resolve_ticker(argument) if argument.strip() else ''
+        if command == '/sentiment':
+            name = argument.strip().lower().replace(' ', '_') or 'overall'
+            return command, name if name in self.sentiment.names else ''
+        return '/help', ''
+
+    def _build_answer(self, command: str, subject: str) -> List[str]:
+        if command == '/latest':
+            return render_telegram_messages(self.report) if self.report else ["No report available yet."]
+        if command == '/sector':
+            sector = subject
+            if not sector:
+                return [f"Unknown sector. Try one of: {', '.join(SECTORS)}"]
+            bullets = self._report_bullets(lambda text: classify_sector({'headline': text}) == sector)
+            articles = self.index.query(sector=sector, days=self.news_days, limit=self.news_limit)
+            return self._format(sector.replace('_', ' ').title(), bullets, articles)
+        if command == '/stock':
+            ticker = subject
+            if not ticker:
+                return ["Usage: /stock TATASTEEL"]
+            bullets = self._report_bullets(
+                lambda text: ticker in text.upper().split() or
+                any(symbol == ticker for _, symbol in self.index.extractor.trie.find_all(text)))
+            articles = self.index.query(ticker=ticker, days=self.news_days, limit=self.news_limit)
+            return self._format(ticker, bullets, articles)
+        if command == '/sentiment':
+            return [self._format_sentiment(subject)]
+        return [HELP_TEXT]
+
+    def _format_sentiment(self, name: str) -> str:
+        if not name:
+            return f"Unknown sector. Try one of: {', '.join(SECTORS)}"
+        hourly = [(start, mean) for start, mean, _ in self.sentiment.query('hour', name, 24) if mean is not None]
+        if not hourly:
+            return "No sentiment recorded in the last day."
+        title = 'Market' if name == 'overall' else name.replace('_', ' ').title()
+        lines = [f"<b>{html.escape(title)} sentiment</b> (-1 to +1, last 24 hours)"]
+        lines += [f"{time.strftime('%d %b %H:00', time.localtime(start))}: {mean:+.2f}" for start, mean in hourly[-8:]]
+        if name == 'overall':
+            sectors = [(n, self.sentiment.latest('day', n)) for n in SECTORS]
+            lines.append("<b>Today by sector</b>: " + ", ".join(
+                f"{n.replace('_', ' ')} {mean:+.2f}" for n, (mean, count) in sectors if count))
+        return "\n".join(lines)
+
+    def _report_bullets(self, matches) -> List[str]:
+        if not self.report:
+            return []
+        return [f"{section.title}: {bullet.text}" for section in self.report.sections
+                for bullet in section.bullets if matches(bullet.text)]
+
+    def _format(self, title: str, bullets: List[str], articles: List[Dict]) -> List[str]:
+        blocks = [f"<b>{html.escape(title)}</b>"]
+        if bullets:
+            generated = html.escape(self.report.generated) if self.report else ''
+            blocks.append(f"<b>Latest report</b> ({generated})\n" +
+                          "\n".join(f"• {html.escape(b).replace('**', '')}" for b in bullets))
+        if articles:
+            blocks.append(f"<b>News, last {self.news_days:g} days</b>\n" + "\n".join(
+                f"• <a href=\"{html.escape(a['url'])}\">{html.escape(a['headline'])}</a> ({html.escape(a['time'])})"
+                if a.get('url') else f"• {html.escape(a['headline'])} ({html.escape(a['time'])})"
+                for a in articles))
+        if len(blocks) == 1:
+            blocks.append("Nothing in the latest report or recent news.")
+        return chunk_blocks(blocks)
+
+
+class BotService:
+    """Long-polling Telegram bot answering commands from ReportCache, without scraping or LLM calls."""
+
+    def __init__(self, token: str, cache: Optional[ReportCache] = None, api_base: str = TELEGRAM_API_BASE,
+                 poll_timeout: int = 30, max_concurrency: int = 64, refresh_interval: float = 30):
+        self.base_url = f"{api_base.rstrip('/')}/bot{token}"
+        self.cache = cache or ReportCache()
+        self.poll_timeout = poll_timeout
+        self.refresh_interval = refresh_interval
+        self._limit = asyncio.Semaphore(max_concurrency)
+        self._tasks = set()
+        self.stats = {'updates': 0, 'replies': 0, 'errors': 0, 'answer_ms': 0.0}
+
+    async def _call(self, session: aiohttp.ClientSession, method: str, payload: Dict) -> Dict:
+        for attempt in range(3):
+            async with session.post(f"{self.base_url}/{method}", json=payload) as response:
+                try:
+                    result = await response.json(content_type=None)
+                except ValueError:
+                    result = None
+            if not isinstance(result, dict):
+                # A proxy's HTML error page or similar: back off and retry like a rate limit
+                logger.warning(f"{method}: unexpected non-JSON response (HTTP {response.status})")
+                await asyncio.sleep(1 + attempt)
+                continue
+            if response.status == 429:
+                await asyncio.sleep(result.get('parameters', {}).get('retry_after', 1 + attempt))
+                continue
+            if not result.get('ok'):
+                raise aiohttp.ClientError(f"{method} failed: {result.get('description', response.status)}")
+            return result
+        raise aiohttp.ClientError(f"{method} failed after retries")
+
+    async def handle_update(self, session: aiohttp.ClientSession, update: Dict):
+        message = update.get('message') or {}
+        text = (message.get('text') or '').strip()
+        chat_id = message.get('chat', {}).get('id')
+        if not text.startswith('/') or chat_id is None:
+            return
+        command, _, argument = text.partition(' ')
+        command = command.split('@')[0].lower()
+
+        async with self._limit:
+            start = time.perf_counter()
+            try:
+                replies = self.cache.answer(command, argument)
+            except Exception:
+                # A bad index or report must not kill this update's task silently
+                self.stats['errors'] += 1
+                logger.exception(f"Could not answer {command!r} for {chat_id}")
+                return
+            self.stats['answer_ms'] += (time.perf_counter() - start) * 1000
+            try:
+                for reply in replies:
+                    await self._call(session, 'sendMessage', {'chat_id': chat_id, 'text': reply, 'parse_mode': 'HTML',
+                                                              'disable_web_page_preview': True})
+                self.stats['replies'] += 1
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.stats['errors'] += 1
+                logger.warning(f"Could not reply to {chat_id}: {e}")
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                # Reloading the index reads it from disk; keep that off the event loop
+                await asyncio.get_running_loop().run_in_executor(None, self.cache.refresh)
+            except Exception as e:
+                logger.warning(f"Cache refresh failed: {e}")
+
+    async def run(self, max_polls: Optional[int] = None):
+        """Poll getUpdates forever (or max_polls times), answering each update in its own task."""
+        await asyncio.get_running_loop().run_in_executor(None, self.cache.refresh)
+        refresher = asyncio.create_task(self._refresh_loop())
+        offset = None
+        polls = 0
+        timeout = aiohttp.ClientTimeout(total=self.poll_timeout + 10)
+        try:
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                while max_polls is None or polls < max_polls:
+                    polls += 1
+                    try:
+                        result = await self._call(session, 'getUpdates', {'offset': offset, 'timeout': self.poll_timeout,
+                                                                          'allowed_updates': ['message']})
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        logger.warning(f"getUpdates failed: {e}")
+                        await asyncio.sleep(5)
+                        continue
+                    for update in result.get('result', []):
+                        offset = update['update_id'] + 1
+                        self.stats['updates'] += 1
+                        task = asyncio.create_task(self.handle_update(session, update))
+                        self._tasks.add(task)
+                        task.add_done_callback(self._tasks.discard)
+                if self._tasks:
+                    await asyncio.gather(*self._tasks)
+        finally:
+            refresher.cancel()
+
+
+def main():
+    load_dotenv()
+    token = os.getenv('TELEGRAM_BOT_TOKEN')
+    if not token:
+        print("Error: Please set the TELEGRAM_BOT_TOKEN environment variable")
+        return
+    logging.basicConfig(level=logging.INFO)
+    cache = ReportCache(news_days=float(os.getenv('BOT_NEWS_DAYS', 7)))
+    service = BotService(token, cache, api_base=os.getenv('TELEGRAM_API_BASE', TELEGRAM_API_BASE))
+    print("Bot service running, press Ctrl+C to stop")
+    asyncio.run(service.run())
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from typing import List, Dict, Tuple
+
+from sources import NORMALIZE_RE
+from insight_schema import ACTION_SECTIONS
+from storage import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = os.path.join('data', 'analysis_state.json')
+
+
+def item_key(news_item: Dict) -> str:
+    """Stable identity of a story across runs: its normalized headline, else its URL."""
+    return NORMALIZE_RE.sub(' ', news_item.get('headline', '').lower()).strip() or news_item.get('url', '')
+
+
+def content_hash(news_item: Dict) -> str:
+    """Hash of what the model would see for the item; a change means re-analysis."""
+    text = news_item.get('summary') or f"{news_item.get('description', '')} {news_item.get('body_summary', '')}"
+    return hashlib.sha1(f"{text}|{news_item.get('cluster_size', 1)}".encode('utf-8')).hexdigest()[:16]
+
+
+class AnalysisState:
+    """The last run's per-item insight records, so the next run only analyzes the delta."""
+
+    def __init__(self, path: str = STATE_FILE, max_age_hours: float = 24):
+        self.path = path
+        self.items = {}
+        self.final_report = ''
+        self.updated_at = 0.0
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if time.time() - state.get('updated_at', 0) > max_age_hours * 3600:
+            logger.info("Analysis state is stale, running a full analysis")
+            return
+        self.items = state.get('items', {})
+        self.final_report = state.get('final_report', '')
+        self.updated_at = state['updated_at']
+
+    def diff(self, news_items: List[Dict]) -> Tuple[List[Dict], List[Dict], List[Dict], int]:
+        """Split items into (new, changed, unchanged) and count stories gone since the last run."""
+        new, changed, unchanged = [], [], []
+        keys = set()
+        for news_item in news_items:
+            key = item_key(news_item)
+            keys.add(key)
+            previous = self.items.get(key)
+            if previous is None:
+                new.append(news_item)
+            elif previous['hash'] != content_hash(news_item):
+                changed.append(news_item)
+            else:
+                unchanged.append(news_item)
+        removed = sum(1 for key in self.items if key not in keys)
+        return new, changed, unchanged, removed
+
+    def cached_records(self, news_item: Dict) -> List[Dict]:
+        return [dict(r) for r in self.items.get(item_key(news_item), {}).get('records', [])]
+
+    def save(self, analyzed: Dict[str, Dict], final_report: str):
+        """Persist the current page: analyzed maps item key -> {'hash', 'headline', 'records'}."""
+        self.items = analyzed
+        self.final_report = final_report
+        self.updated_at = time.time()
+        atomic_write_json(self.path, {'updated_at': self.updated_at, 'final_report': final_report,
+                                      'items': analyzed})
+
+
+def format_change_bullets(merged: List[Dict], news_items: List[Dict], new_keys: set,
+                          changed_keys: set, removed: int) -> List[str]:
+    """'What changed' bullets: merged records backed by a new or updated story, plus counts."""
+    bullets = [f"{len(new_keys)} new stories, {len(changed_keys)} updated, {removed} no longer on the page"]
+    for record in merged:
+        keys = {item_key(news_items[source - 1]) for source in record['sources'] if 0 < source <= len(news_items)}
+        if keys & new_keys:
+            label = 'New'
+        elif keys & changed_keys:
+            label = 'Updated'
+        else:
+            continue
+        figures = f" [{'; '.join(record['figures'])}]" if record['figures'] else ""
+        bullets.append(f"**{label}** {record['ticker']} ({ACTION_SECTIONS[record['action']]}): "
+                       f"{record['summary']}{figures}")
+    return bullets
@@ -0,0 +1,218 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from html.parser import HTMLParser
+from typing import List, Dict, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from sources import HEADERS
+from storage import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join('data', 'article_cache')
+
+SKIP_TAGS = {'script', 'style', 'noscript', 'nav', 'header', 'footer', 'aside', 'form', 'figure', 'button', 'svg'}
+BLOCK_TAGS = {'p', 'div', 'li', 'h1', 'h2', 'h3', 'article', 'section', 'br'}
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9₹"])')
+FIGURE_RE = re.compile(r'₹|\brs\.?\s*\d|\d+\s*(?:%|crore|lakh|per\s?cent)', re.IGNORECASE)
+
+# Failed fetches are retried after a day; 408 and 429 are never cached
+FAILURE_TTL = 24 * 3600
+TRANSIENT_STATUSES = {408, 429}
+
+MIN_PARAGRAPH_CHARS = 60
+MAX_LINK_DENSITY = 0.5
+
+
+class _TextExtractor(HTMLParser):
+    """Collects text blocks with their link density, skipping page chrome."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks = []
+        self._text = []
+        self._link_chars = 0
+        self._skip_depth = 0
+        self._in_link = 0
+
+    def _flush(self):
+        text = ' '.join(''.join(self._text).split())
+        if text:
+            self.blocks.append((text, self._link_chars / max(1, len(text))))
+        self._text = []
+        self._link_chars = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == 'a':
+            self._in_link += 1
+        elif tag in BLOCK_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == 'a':
+            self._in_link = max(0, self._in_link - 1)
+        elif tag in BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        self._text.append(data)
+        if self._in_link:
+            self._link_chars += len(data.strip())
+
+
+def extract_main_text(html: str) -> str:
+    """Boilerplate removal: keep long, link-poor text blocks in document order."""
+    parser = _TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:
+        logger.debug(f"HTML parse error: {e}")
+    parser._flush()
+    paragraphs = [text for text, link_density in parser.blocks
+                  if len(text) >= MIN_PARAGRAPH_CHARS and link_density <= MAX_LINK_DENSITY]
+    return '\n'.join(dict.fromkeys(paragraphs))
+
+
+def summarize_body(text: str, max_chars: int = 300) -> str:
+    """Compress an article body: lead sentence plus the sentences carrying figures."""
+    sentences = SENTENCE_RE.split(text.replace('\n', ' '))
+    if not sentences:
+        return ''
+    chosen = [sentences[0]] + [s for s in sentences[1:] if FIGURE_RE.search(s)]
+    summary = ''
+    for sentence in chosen:
+        if len(summary) + len(sentence) + 1 > max_chars:
+            break
+        summary = f"{summary} {sentence}".strip()
+    return summary or sentences[0][:max_chars]
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    """Whether a fetch error will recur: a 4xx other than timeout/rate limit, or an undecodable body."""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return 400 <= error.status < 500 and error.status not in TRANSIENT_STATUSES
+    return isinstance(error, UnicodeDecodeError)
+
+
+class ArticleCache:
+    """On-disk article bodies keyed by URL hash.
+
+    Permanent failures are cached too, so dead links are not refetched every
+    run, but only for failure_ttl seconds.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, failure_ttl: float = FAILURE_TTL):
+        self.cache_dir = cache_dir
+        self.failure_ttl = failure_ttl
+
+    def _path(self, url: str) -> str:
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.json")
+
+    def get(self, url: str) -> Optional[Dict]:
+        try:
+            with open(self._path(url), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('status') != 'ok' and time.time() - entry.get('fetched_at', 0) > self.failure_ttl:
+            return None
+        return entry
+
+    def put(self, url: str, entry: Dict):
+        atomic_write_json(self._path(url), entry)
+
+
+class ArticleEnricher:
+    """Fetches linked article bodies in parallel under per-domain caps and a total time budget."""
+
+    def __init__(self, cache: Optional[ArticleCache] = None, per_domain_limit: int = 2,
+                 max_concurrency: int = 16, time_budget: float = 20.0, request_timeout: float = 8.0):
+        self.cache = cache or ArticleCache()
+        self.per_domain_limit = per_domain_limit
+        self.max_concurrency = max_concurrency
+        self.time_budget = time_budget
+        self.request_timeout = request_timeout
+        self._domain_limits = {}
+        self.stats = {'cached': 0, 'fetched': 0, 'failed': 0, 'skipped': 0}
+
+    async def _fetch(self, session: aiohttp.ClientSession, global_limit: asyncio.Semaphore, url: str) -> Dict:
+        domain = urlsplit(url).netloc
+        domain_limit = self._domain_limits.setdefault(domain, asyncio.Semaphore(self.per_domain_limit))
+        # Wait for the domain's slot before taking a global one, so a busy host cannot hold every global slot
+        async with domain_limit, global_limit:
+            try:
+                async with session.get(url) as response:
+                    response.raise_for_status()
+                    html = await response.text(errors='replace')
+                text = extract_main_text(html)
+                entry = {'url': url, 'fetched_at': time.time(), 'status': 'ok',
+                         'text': text, 'summary': summarize_body(text)}
+                self.stats['fetched'] += 1
+            except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeDecodeError) as e:
+                entry = {'url': url, 'fetched_at': time.time(), 'status': f"error: {e}", 'text': '', 'summary': ''}
+                self.stats['failed'] += 1
+                if not is_permanent_failure(e):
+                    # Timeouts, resets and 5xx are retried on the next run
+                    return entry
+        try:
+            self.cache.put(url, entry)
+        except OSError as e:
+            logger.warning(f"Could not cache article {url}: {e}")
+        return entry
+
+    async def _enrich(self, news_items: List[Dict]):
+        pending_items = {}
+        for news_item in news_items:
+            url = news_item.get('url', '')
+            if not url.startswith('http'):
+                continue
+            cached = self.cache.get(url)
+            if cached is not None:
+                self.stats['cached'] += 1
+                if cached.get('summary'):
+                    news_item['body_summary'] = cached['summary']
+            else:
+                pending_items.setdefault(url, []).append(news_item)
+        if not pending_items:
+            return
+
+        global_limit = asyncio.Semaphore(self.max_concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+        async with aiohttp.ClientSession(timeout=timeout, headers=HEADERS) as session:
+            tasks = {asyncio.ensure_future(self._fetch(session, global_limit, url)): url for url in pending_items}
+            done, pending = await asyncio.wait(tasks, timeout=self.time_budget)
+            for task in pending:
+                task.cancel()
+            self.stats['skipped'] += len(pending)
+            for task in done:
+                try:
+                    entry = task.result()
+                except Exception as e:
+                    logger.warning(f"Enrichment of {tasks[task]} failed: {e}")
+                    self.stats['failed'] += 1
+                    continue
+                if entry.get('summary'):
+                    for news_item in pending_items[tasks[task]]:
+                        news_item['body_summary'] = entry['summary']
+
+    def enrich(self, news_items: List[Dict]) -> List[Dict]:
+        """Attach 'body_summary' to items whose article could be fetched (or was cached)."""
+        start = time.perf_counter()
+        asyncio.run(self._enrich(news_items))
+        logger.info(f"Enrichment: {self.stats} in {time.perf_counter() - start:.1f}s")
+        return news_items
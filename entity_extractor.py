@@ -0,0 +1,258 @@
+import os
+import re
+import csv
+import logging
+from typing import List, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Optional NSE/BSE symbol list (e.g. NSE's EQUITY_L.csv: SYMBOL, NAME OF COMPANY)
+SYMBOLS_FILE = os.path.join('data', 'symbols.csv')
+
+# Built-in aliases for frequently covered companies: alias -> NSE symbol
+DEFAULT_SYMBOLS = {
+    'reliance': 'RELIANCE', 'reliance industries': 'RELIANCE', 'ril': 'RELIANCE',
+    'tcs': 'TCS', 'tata consultancy services': 'TCS',
+    'infosys': 'INFY', 'wipro': 'WIPRO', 'hcl tech': 'HCLTECH', 'hcltech': 'HCLTECH',
+    'tech mahindra': 'TECHM', 'coforge': 'COFORGE', 'ltimindtree': 'LTIM', 'persistent systems': 'PERSISTENT',
+    'hdfc bank': 'HDFCBANK', 'icici bank': 'ICICIBANK', 'sbi': 'SBIN', 'state bank of india': 'SBIN',
+    'axis bank': 'AXISBANK', 'kotak mahindra bank': 'KOTAKBANK', 'kotak bank': 'KOTAKBANK',
+    'yes bank': 'YESBANK', 'indusind bank': 'INDUSINDBK', 'federal bank': 'FEDERALBNK',
+    'bank of baroda': 'BANKBARODA', 'punjab national bank': 'PNB', 'pnb': 'PNB',
+    'karur vysya bank': 'KARURVYSYA', 'bajaj finance': 'BAJFINANCE', 'bajaj finserv': 'BAJAJFINSV',
+    'jio financial': 'JIOFIN', 'jio finance': 'JIOFIN',
+    'lic': 'LICI', 'life insurance corporation': 'LICI', 'hdfc life': 'HDFCLIFE', 'sbi life': 'SBILIFE',
+    'max financial': 'MFSL', 'icici lombard': 'ICICIGI',
+    'tata steel': 'TATASTEEL', 'jsw steel': 'JSWSTEEL', 'hindalco': 'HINDALCO', 'nmdc': 'NMDC',
+    'vedanta': 'VEDL', 'nalco': 'NATIONALUM', 'hindustan copper': 'HINDCOPPER', 'coal india': 'COALINDIA',
+    'tata motors': 'TATAMOTORS', 'maruti': 'MARUTI', 'maruti suzuki': 'MARUTI',
+    'mahindra': 'M&M', 'mahindra & mahindra': 'M&M', 'm&m': 'M&M', 'bajaj auto': 'BAJAJ-AUTO',
+    'hero motocorp': 'HEROMOTOCO', 'eicher motors': 'EICHERMOT', 'tvs motor': 'TVSMOTOR', 'tvs motors': 'TVSMOTOR',
+    'hyundai motor india': 'HYUNDAI', 'bosch': 'BOSCHLTD', 'olectra greentech': 'OLECTRA',
+    'itc': 'ITC', 'hindustan unilever': 'HINDUNILVR', 'hul': 'HINDUNILVR', 'nestle india': 'NESTLEIND',
+    'varun beverages': 'VBL', 'britannia': 'BRITANNIA', 'balrampur chini': 'BALRAMCHIN',
+    'sun pharma': 'SUNPHARMA', "dr reddy's": 'DRREDDY', 'dr reddys': 'DRREDDY', 'cipla': 'CIPLA',
+    'aurobindo pharma': 'AUROPHARMA', 'gland pharma': 'GLAND', 'eris lifesciences': 'ERIS',
+    'ntpc': 'NTPC', 'power grid': 'POWERGRID', 'tata power': 'TATAPOWER', 'adani green': 'ADANIGREEN',
+    'ge vernova': 'GVT&D', 'ongc': 'ONGC', 'bpcl': 'BPCL', 'ioc': 'IOC', 'indian oil': 'IOC',
+    'chennai petroleum': 'CHENNPETRO', 'gail': 'GAIL',
+    'larsen & toubro': 'LT', 'l&t': 'LT', 'ultratech cement': 'ULTRACEMCO', 'dalmia bharat': 'DALBHARAT',
+    'dlf': 'DLF', 'godrej properties': 'GODREJPROP',
+    'indigo': 'INDIGO', 'interglobe aviation': 'INDIGO',
+    'bharti airtel': 'BHARTIARTL', 'airtel': 'BHARTIARTL', 'vodafone idea': 'IDEA',
+    'adani enterprises': 'ADANIENT', 'adani ports': 'ADANIPORTS', 'asian paints': 'ASIANPAINT',
+    'titan': 'TITAN', 'bharat electronics': 'BEL', 'bharat dynamics': 'BDL', 'hal': 'HAL',
+    'hindustan aeronautics': 'HAL', 'beml': 'BEML', 'mishra dhatu': 'MIDHANI',
+    'garden reach': 'GRSE', 'cochin shipyard': 'COCHINSHIP', 'mazagon dock': 'MAZDOCK',
+    'nazara technologies': 'NAZARA', 'info edge': 'NAUKRI', 'naukri': 'NAUKRI',
+    'zomato': 'ETERNAL', 'eternal': 'ETERNAL', 'swiggy': 'SWIGGY', 'paytm': 'PAYTM', 'nykaa': 'NYKAA',
+    'pg electroplast': 'PGEL', 'netweb technologies': 'NETWEB', 'quick heal': 'QUICKHEAL',
+    'cdsl': 'CDSL', 'irctc': 'IRCTC',
+}
+
+# Sector keyword lists; the first sector with a matching keyword wins
+SECTOR_KEYWORDS = {
+    'banking': ['bank', 'icici', 'hdfc', 'sbi', 'axis', 'kotak', 'npa', 'credit'],
+    'technology': ['tech', 'it', 'infosys', 'tcs', 'wipro', 'software', 'digital'],
+    'pharma': ['pharma', 'drug', 'medicine', 'fda', 'reddy', 'sun pharma', 'cipla'],
+    'power': ['power', 'ntpc', 'renewable', 'energy', 'coal', 'electricity'],
+    'auto': ['auto', 'car', 'motor', 'tata motors', 'hyundai', 'maruti'],
+    'fmcg': ['fmcg', 'consumer', 'itc', 'hindustan unilever', 'nestle'],
+    'metals': ['metal', 'steel', 'iron', 'copper', 'aluminum', 'tata steel'],
+    'oil_gas': ['oil', 'gas', 'petroleum', 'reliance', 'ongc', 'crude'],
+    'realty': ['real estate', 'property', 'construction', 'housing'],
+    'aviation': ['aviation', 'airline', 'aircraft', 'airport', 'indigo', 'air india']
+}
+
+AMOUNT_RE = re.compile(
+    r'(?:₹|\brs\.?|\binr)\s*(?P<value>\d[\d,]*(?:\.\d+)?)\s*-?\s*(?P<unit>lakh crore|crore|cr\b|lakh|billion|bn\b|million|mn\b)?'
+    r'|(?P<bare>\d[\d,]*(?:\.\d+)?)\s*-?\s*(?P<bare_unit>lakh crore|crore)', re.IGNORECASE)
+PERCENT_RE = re.compile(
+    r'(?:(?P<verb>rise|rose|up|jump|surge|gain|climb|soar|rall|grow|grew|increase|fall|fell|down|drop|'
+    r'decline|slump|plunge|slip|dip|shed|lose|lost|cut)\w*\s+(?:by\s+|over\s+|up\s+to\s+|nearly\s+)?)?'
+    r'(?P<value>\d+(?:\.\d+)?)\s*(?:%|per\s?cent)', re.IGNORECASE)
+DIVIDEND_RE = re.compile(
+    r'dividend\s+of\s+(?:₹|\brs\.?)\s*(?P<after>\d+(?:\.\d+)?)'
+    r'|(?:₹|\brs\.?)\s*(?P<before>\d+(?:\.\d+)?)\s*(?:per\s+share\s+)?(?:final\s+|interim\s+|special\s+)?dividend',
+    re.IGNORECASE)
+TARGET_RE = re.compile(r'target(?:\s+price)?\s*(?:of|to|at|:)?\s*(?:₹|\brs\.?)\s*(?P<value>\d[\d,]*(?:\.\d+)?)',
+                       re.IGNORECASE)
+RATING_RE = re.compile(r'\b(?P<change>upgrade|downgrade|outperform|underperform|overweight|underweight|accumulate)'
+                       r'|[\'‘"](?P<quoted>buy|sell|hold|reduce|add)[\'’"]'
+                       r'|\b(?P<call>buy|sell|hold)\s+(?:rating|call|recommendation)', re.IGNORECASE)
+RECORD_DATE_RE = re.compile(
+    r'record\s+date\s*(?:of|is|as|on|fixed\s+as|:)?\s*'
+    r'(?P<date>\d{1,2}(?:st|nd|rd|th)?\s+[a-z]{3,9}(?:,?\s+\d{4})?|[a-z]{3,9}\s+\d{1,2}(?:,?\s+\d{4})?)',
+    re.IGNORECASE)
+ACTION_RE = re.compile(r'\b(?P<action>dividend|buyback|bonus|stock split|split|ipo|drhp|merger|merge|acquisition|'
+                       r'acquire[sd]?|demerger|rights issue|delisting|block deal|stake|q[1-4]\s*(?:fy\d{2}\s*)?results?)\b',
+                       re.IGNORECASE)
+WORD_RE = re.compile(r"[a-z0-9&']+(?:\.[a-z]+)?")
+
+DECREASE_VERBS = ('fall', 'fell', 'down', 'drop', 'decline', 'slump', 'plunge', 'slip', 'dip', 'shed', 'lose', 'lost', 'cut')
+SIMPLE_ACTIONS = {'dividend', 'buyback', 'bonus', 'split', 'stock split'}
+UNIT_NAMES = {'cr': 'crore', 'bn': 'billion', 'mn': 'million'}
+
+
+class SymbolTrie:
+    """Word-level trie for longest-match lookup of company names to symbols."""
+
+    def __init__(self, aliases: Optional[Dict[str, str]] = None):
+        self.root = {}
+        for alias, symbol in (aliases or {}).items():
+            self.add(alias, symbol)
+
+    def add(self, alias: str, symbol: str):
+        node = self.root
+        for word in WORD_RE.findall(alias.lower()):
+            node = node.setdefault(word, {})
+        node['$'] = symbol
+
+    def find_all(self, text: str) -> List[Tuple[str, str]]:
+        """Return (matched alias, symbol) pairs in order of appearance, longest match first."""
+        words = WORD_RE.findall(text.lower())
+        matches = []
+        i = 0
+        while i < len(words):
+            node = self.root
+            best = None
+            j = i
+            while j < len(words) and words[j] in node:
+                node = node[words[j]]
+                j += 1
+                if '$' in node:
+                    best = (j, node['$'])
+            if best:
+                matches.append((' '.join(words[i:best[0]]), best[1]))
+                i = best[0]
+            else:
+                i += 1
+        return matches
+
+
+def load_symbol_aliases(path: str = SYMBOLS_FILE) -> Dict[str, str]:
+    """Merge the built-in aliases with an optional NSE/BSE symbol CSV."""
+    aliases = dict(DEFAULT_SYMBOLS)
+    if not os.path.exists(path):
+        return aliases
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                symbol = (row.get('SYMBOL') or row.get('symbol') or '').strip()
+                name = (row.get('NAME OF COMPANY') or row.get('name') or '').strip()
+                if symbol and name:
+                    # "Tata Steel Limited" -> "tata steel"
+                    short = re.sub(r'\b(limited|ltd\.?)$', '', name.lower()).strip()
+                    aliases.setdefault(short, symbol)
+                    aliases.setdefault(symbol.lower(), symbol)
+    except (OSError, csv.Error) as e:
+        logger.warning(f"Could not load symbols from {path}: {e}")
+    return aliases
+
+
+class EntityExtractor:
+    """Extracts tickers, figures and corporate actions from news text with compiled patterns."""
+
+    def __init__(self, aliases: Optional[Dict[str, str]] = None):
+        self.trie = SymbolTrie(aliases if aliases is not None else load_symbol_aliases())
+
+    def extract(self, text: str) -> Dict[str, List]:
+        """Extract all entities from a piece of text."""
+        amounts = []
+        for m in AMOUNT_RE.finditer(text):
+            value = m.group('value') or m.group('bare')
+            unit = (m.group('unit') or m.group('bare_unit') or '').lower()
+            amounts.append(f"₹{value}{' ' + UNIT_NAMES.get(unit, unit) if unit else ''}")
+
+        percentages = []
+        for m in PERCENT_RE.finditer(text):
+            verb = (m.group('verb') or '').lower()
+            sign = '-' if verb.startswith(DECREASE_VERBS) else '+' if verb else ''
+            percentages.append(f"{sign}{m.group('value')}%")
+
+        tickers = []
+        for _, symbol in self.trie.find_all(text):
+            if symbol not in tickers:
+                tickers.append(symbol)
+
+        actions = []
+        for m in ACTION_RE.finditer(text):
+            action = m.group('action').lower()
+            if action.startswith('q') and 'result' in action:
+                action = 'results'
+            elif action in ('merge', 'acquired', 'acquires', 'acquire'):
+                action = 'merger' if action == 'merge' else 'acquisition'
+            if action not in actions:
+                actions.append(action)
+
+        return {
+            'tickers': tickers,
+            'amounts': list(dict.fromkeys(amounts)),
+            'percentages': list(dict.fromkeys(percentages)),
+            'dividends': list(dict.fromkeys(f"₹{m.group('after') or m.group('before')}/share"
+                                            for m in DIVIDEND_RE.finditer(text))),
+            'targets': list(dict.fromkeys(f"₹{m.group('value')}" for m in TARGET_RE.finditer(text))),
+            'ratings': list(dict.fromkeys((m.group('change') or m.group('quoted') or m.group('call')).lower()
+                                          for m in RATING_RE.finditer(text))),
+            'record_dates': list(dict.fromkeys(m.group('date') for m in RECORD_DATE_RE.finditer(text))),
+            'actions': actions,
+        }
+
+    def annotate(self, news_data: List[Dict]) -> List[Dict]:
+        """Attach extracted entities to each news item (in place) under 'entities'."""
+        for news_item in news_data:
+            if 'entities' not in news_item:
+                text = f"{news_item.get('headline', '')}. {news_item.get('description', '')}"
+                news_item['entities'] = self.extract(text)
+        return news_data
+
+
+def classify_sector(news_item: Dict, sector_keywords: Optional[Dict[str, List[str]]] = None) -> str:
+    """Assign a news item to the first sector whose keywords match, else 'general'."""
+    combined_text = f"{news_item.get('headline', '')} {news_item.get('description', '')}".lower()
+    for sector, keywords in (sector_keywords or SECTOR_KEYWORDS).items():
+        if any(keyword in combined_text for keyword in keywords):
+            return sector
+    return 'general'
+
+
+def has_figures(entities: Dict) -> bool:
+    """Whether the item carries concrete financial figures."""
+    return bool(entities.get('amounts') or entities.get('percentages') or entities.get('dividends'))
+
+
+def is_simple_corporate_action(entities: Dict) -> bool:
+    """Pure dividend/bonus/split/buyback news with no analyst view, which needs no LLM call."""
+    actions = set(entities.get('actions', []))
+    return (bool(entities.get('tickers')) and bool(actions) and actions <= SIMPLE_ACTIONS
+            and not entities.get('targets') and not entities.get('ratings'))
+
+
+def format_corporate_action(news_item: Dict) -> str:
+    """Render one corporate-action bullet from extracted entities."""
+    entities = news_item['entities']
+    details = []
+    if entities['dividends']:
+        details.append(f"dividend {', '.join(entities['dividends'])}")
+    if entities['record_dates']:
+        details.append(f"record date {entities['record_dates'][0]}")
+    details.extend(a for a in entities['actions'] if a in SIMPLE_ACTIONS and a != 'dividend')
+    tickers = ', '.join(entities['tickers'])
+    suffix = f" ({'; '.join(details)})" if details else ''
+    return f"**{tickers}**: {news_item.get('headline', '').strip()}{suffix}"
+
+
+def build_corporate_actions_bullets(news_data: List[Dict]) -> List[str]:
+    """Build corporate-action bullets locally, one per ticker set, in input order."""
+    bullets = []
+    seen = set()
+    for news_item in news_data:
+        entities = news_item.get('entities')
+        if not entities or not is_simple_corporate_action(entities):
+            continue
+        key = tuple(entities['tickers'])
+        if key in seen:
+            continue
+        seen.add(key)
+        bullets.append(format_corporate_action(news_item))
+    return bullets
@@ -0,0 +1,285 @@
+import os
+import sys
+import json
+import time
+import bisect
+import logging
+import argparse
+from array import array
+from typing import List, Dict, Optional, Iterable
+
+from entity_extractor import EntityExtractor, classify_sector
+from storage import atomic_write_bytes, read_json, find_snapshots, snapshot_timestamp
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = os.path.join('data', 'news_index')
+POSTINGS_MAGIC = b'ZNIX1'
+
+
+def _write_varint(value: int, out: bytearray):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def encode_postings(postings: Dict[str, array]) -> bytes:
+    """Serialise posting lists as key + count + delta-encoded varint IDs."""
+    out = bytearray(POSTINGS_MAGIC)
+    _write_varint(len(postings), out)
+    for key in sorted(postings):
+        ids = postings[key]
+        key_bytes = key.encode('utf-8')
+        _write_varint(len(key_bytes), out)
+        out += key_bytes
+        _write_varint(len(ids), out)
+        previous = 0
+        for article_id in ids:
+            _write_varint(article_id - previous, out)
+            previous = article_id
+    return bytes(out)
+
+
+def decode_postings(data: bytes) -> Dict[str, array]:
+    """Inverse of encode_postings."""
+    if not data.startswith(POSTINGS_MAGIC):
+        raise ValueError("not an entity index postings file")
+    pos = len(POSTINGS_MAGIC)
+    count, pos = _read_varint(data, pos)
+    postings = {}
+    for _ in range(count):
+        key_len, pos = _read_varint(data, pos)
+        key = data[pos:pos + key_len].decode('utf-8')
+        pos += key_len
+        n, pos = _read_varint(data, pos)
+        ids = array('I')
+        previous = 0
+        for _ in range(n):
+            delta, pos = _read_varint(data, pos)
+            previous += delta
+            ids.append(previous)
+        postings[key] = ids
+    return postings
+
+
+def intersect_postings(lists: List[array]) -> List[int]:
+    """Intersect sorted posting lists, starting from the shortest."""
+    if not lists:
+        return []
+    lists = sorted(lists, key=len)
+    result = list(lists[0])
+    for other in lists[1:]:
+        if not result:
+            break
+        kept = []
+        lo = 0
+        for article_id in result:
+            lo = bisect.bisect_left(other, article_id, lo)
+            if lo == len(other):
+                break
+            if other[lo] == article_id:
+                kept.append(article_id)
+        result = kept
+    return result
+
+
+def _article_key(news_item: Dict) -> str:
+    return news_item.get('url') or news_item.get('headline', '').strip().lower()
+
+
+class EntityIndex:
+    """Incremental inverted index from ticker/sector to article IDs.
+
+    Article IDs are assigned in indexing order, so they are also ordered by
+    indexing time and a date cutoff becomes a binary search over IDs.
+    """
+
+    def __init__(self, index_dir: str = INDEX_DIR, extractor: Optional[EntityExtractor] = None):
+        self.index_dir = index_dir
+        self.articles_file = os.path.join(index_dir, 'articles.jsonl')
+        self.postings_file = os.path.join(index_dir, 'postings.bin')
+        self.extractor = extractor or EntityExtractor()
+        self.articles = []          # id -> article metadata
+        self.indexed_at = array('d')  # id -> indexing timestamp (non-decreasing)
+        self.keys = {}              # article key -> id
+        self.postings = {}          # "ticker:X" / "sector:Y" -> sorted array of IDs
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.articles_file):
+            with open(self.articles_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        self._register(json.loads(line))
+                    except ValueError:
+                        # A line torn by a crash mid-append; its article was never posted
+                        logger.warning(f"Skipping a truncated line in {self.articles_file}")
+        if os.path.exists(self.postings_file):
+            try:
+                with open(self.postings_file, 'rb') as f:
+                    self.postings = decode_postings(f.read())
+            except (ValueError, IndexError) as e:
+                logger.warning(f"Unreadable postings file {self.postings_file} ({e}), rebuilding it")
+                self.postings = {}
+        # The article log is appended before the postings are rewritten, so a crash in
+        # between leaves articles with no postings: every article posts its sector, so
+        # the highest posted ID must be the last article's
+        posted = max((ids[-1] for ids in self.postings.values() if ids), default=-1)
+        if posted != len(self.articles) - 1:
+            if posted >= len(self.articles):
+                posted = -1
+                self.postings = {}
+            logger.warning(f"Entity index postings are behind the article log, "
+                           f"posting {len(self.articles) - posted - 1} articles again")
+            for article in self.articles[posted + 1:]:
+                self._post(article)
+
+    def _register(self, article: Dict):
+        self.keys[article['key']] = article['id']
+        self.articles.append(article)
+        last = self.indexed_at[-1] if self.indexed_at else 0.0
+        self.indexed_at.append(max(last, article['indexed_at']))
+
+    def _post(self, article: Dict):
+        keys = [f"ticker:{t}" for t in article['tickers']] + [f"sector:{article['sector']}"]
+        for key in keys:
+            self.postings.setdefault(key, array('I')).append(article['id'])
+
+    def is_indexed(self, news_item: Dict) -> bool:
+        """Whether the item's story (by URL, else headline) is already in the index."""
+        return _article_key(news_item) in self.keys
+
+    def add_items(self, news_items: Iterable[Dict], indexed_at: Optional[float] = None) -> int:
+        """Index new items (already-indexed URLs are skipped) and persist. Returns the number added."""
+        indexed_at = indexed_at or time.time()
+        new_articles = []
+        for news_item in news_items:
+            key = _article_key(news_item)
+            if not key or key in self.keys:
+                continue
+            entities = news_item.get('entities') or self.extractor.extract(
+                f"{news_item.get('headline', '')}. {news_item.get('description', '')}")
+            article = {
+                'id': len(self.articles),
+                'key': key,
+                'headline': news_item.get('headline', ''),
+                'url': news_item.get('url', ''),
+                'source': news_item.get('source', ''),
+                'time': news_item.get('time', ''),
+                'indexed_at': indexed_at,
+                'tickers': entities['tickers'],
+                'sector': classify_sector(news_item),
+            }
+            self._register(article)
+            self._post(article)
+            new_articles.append(article)
+
+        if new_articles:
+            self._save(new_articles)
+        return len(new_articles)
+
+    def _save(self, new_articles: List[Dict]):
+        os.makedirs(self.index_dir, exist_ok=True)
+        with open(self.articles_file, 'a+', encoding='utf-8') as f:
+            # Start on a fresh line if a crash tore the last one
+            if f.tell() > 0:
+                f.seek(f.tell() - 1)
+                if f.read(1) != '\n':
+                    f.write('\n')
+            for article in new_articles:
+                f.write(json.dumps(article, ensure_ascii=False) + '\n')
+        atomic_write_bytes(self.postings_file, encode_postings(self.postings))
+
+    def resolve_ticker(self, name: str) -> str:
+        """Map a company name or alias ('Tata Steel') to its symbol ('TATASTEEL')."""
+        matches = self.extractor.trie.find_all(name)
+        return matches[0][1] if matches else name.strip().upper()
+
+    def query_ids(self, ticker: Optional[str] = None, sector: Optional[str] = None,
+                  days: Optional[float] = None) -> List[int]:
+        """Article IDs matching all given filters, newest first."""
+        lists = []
+        if ticker:
+            lists.append(self.postings.get(f"ticker:{self.resolve_ticker(ticker)}", array('I')))
+        if sector:
+            lists.append(self.postings.get(f"sector:{sector.lower()}", array('I')))
+        if not lists:
+            return []
+        ids = intersect_postings(lists)
+        if days is not None:
+            first_id = bisect.bisect_left(self.indexed_at, time.time() - days * 86400)
+            ids = ids[bisect.bisect_left(ids, first_id):]
+        return ids[::-1]
+
+    def query(self, ticker: Optional[str] = None, sector: Optional[str] = None,
+              days: Optional[float] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Article metadata matching all given filters, newest first."""
+        return [self.articles[i] for i in self.query_ids(ticker, sector, days)[:limit]]
+
+    def stats(self) -> Dict:
+        return {
+            'articles': len(self.articles),
+            'keys': len(self.postings),
+            'postings_bytes': os.path.getsize(self.postings_file) if os.path.exists(self.postings_file) else 0,
+        }
+
+
+def rebuild_index(index_dir: str = INDEX_DIR) -> EntityIndex:
+    """Rebuild the index from scratch over every archived snapshot."""
+    for path in (os.path.join(index_dir, 'articles.jsonl'), os.path.join(index_dir, 'postings.bin')):
+        if os.path.exists(path):
+            os.remove(path)
+    index = EntityIndex(index_dir)
+    for path in find_snapshots():
+        try:
+            news_items = read_json(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping {path}: {e}")
+            continue
+        added = index.add_items(news_items, indexed_at=snapshot_timestamp(path))
+        logger.info(f"Indexed {added} new articles from {path}")
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the ticker/sector news index")
+    parser.add_argument('--stock', help="Ticker or company name, e.g. TATASTEEL or 'Tata Steel'")
+    parser.add_argument('--sector', help="Sector name, e.g. banking")
+    parser.add_argument('--days', type=float, help="Only news indexed in the last N days")
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--rebuild', action='store_true', help="Rebuild the index from all snapshots")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    index = rebuild_index() if args.rebuild else EntityIndex()
+    if not args.stock and not args.sector:
+        print(json.dumps(index.stats()))
+        return
+
+    start = time.perf_counter()
+    results = index.query(args.stock, args.sector, args.days, args.limit)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    for article in results:
+        print(f"[{article['time']}] {article['headline']}\n    {article['url']}")
+    print(f"\n{len(results)} articles ({elapsed_ms:.3f} ms)")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -7,6 +7,8 @@ from datetime import datetime
 import os
 from dotenv import load_dotenv
 import re
+from token_budget import TokenBudget, count_message_tokens
+from token_budget import count_tokens as _count_tokens
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -34,8 +36,8 @@ def get_groq_token() -> Optional[str]:
     return token
 
 def count_tokens(text: str, model: str = None) -> int:
-    """Roughly estimate token count (1 token ≈ 4 characters)."""
-    return max(1, len(text) // 4)
+    """Count tokens with the cached tiktoken encoding (≈4 characters per token without it)."""
+    return _count_tokens(text, model)
 
 class StreamlinedFinancialNewsAnalyzer:
     def __init__(self, groq_token: Optional[str] = None):
@@ -51,9 +53,10 @@ class StreamlinedFinancialNewsAnalyzer:
         
         # Use efficient model for batch analysis
         self.model = "meta-llama/llama-4-scout-17b-16e-instruct"
-        self.max_context_tokens = 4000
-        self.max_output_tokens = 1500
+        self.max_context_tokens = 16000
+        self.max_output_tokens = 800  # Shorter responses
         self.batch_size = 15  # Larger batches for efficiency
+        self.token_budget = TokenBudget.from_env(self.model)
         
         # Enhanced categorization
         self.sector_keywords = {
@@ -238,17 +241,13 @@ Use bullet points with clear company names and specific details. Keep each point
         final_report = self.generate_final_consolidated_report(batch_insights, sector_summary, len(news_data))
         total_api_calls += 1
         
-        # Calculate token usage
-        total_input_tokens = sum(count_tokens(insight) for insight in batch_insights) + count_tokens(final_report)
-        total_output_tokens = count_tokens(final_report)
-        
+        # Token usage is measured on the prompts actually sent
         return {
             'total_news_items': len(news_data),
             'sector_summary': sector_summary,
             'final_report': final_report,
             'api_calls_used': total_api_calls,
-            'input_tokens': total_input_tokens,
-            'output_tokens': total_output_tokens,
+            **self.token_budget.summary(),
             'analysis_timestamp': datetime.now().isoformat()
         }
     
@@ -271,10 +270,15 @@ Use bullet points with clear company names and specific details. Keep each point
                 }
             ],
             "temperature": 0.3,
-            "max_tokens": 800,  # Shorter responses
+            "max_tokens": self.max_output_tokens,
             "top_p": 0.8
         }
         
+        input_tokens = count_message_tokens(payload["messages"], self.model)
+        if not self.token_budget.can_afford(input_tokens, self.max_output_tokens):
+            logger.error("Token budget exhausted, skipping call")
+            return "Error: Token budget exhausted"
+        
         for attempt in range(max_retries):
             try:
                 response = requests.post(self.base_url, headers=self.headers, json=payload, timeout=60)
@@ -282,7 +286,11 @@ Use bullet points with clear company names and specific details. Keep each point
                 if response.status_code == 200:
                     result = response.json()
                     if 'choices' in result and len(result['choices']) > 0:
-                        return result['choices'][0]['message']['content'].strip()
+                        content = result['choices'][0]['message']['content'].strip()
+                        usage = result.get('usage', {})
+                        self.token_budget.record(usage.get('prompt_tokens', input_tokens),
+                                                 usage.get('completion_tokens', count_tokens(content, self.model)))
+                        return content
                 
                 elif response.status_code == 429:
                     wait_time = 15 * (attempt + 1)
@@ -0,0 +1,145 @@
+import json
+import logging
+from typing import List, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Allowed values for a record's "action" field, mapped to the report section they feed
+ACTION_SECTIONS = {
+    'buy': 'Buy/Sell Opportunities',
+    'sell': 'Buy/Sell Opportunities',
+    'hold': 'Buy/Sell Opportunities',
+    'earnings': 'Corporate Actions',
+    'dividend': 'Corporate Actions',
+    'corporate': 'Corporate Actions',
+    'policy': 'Macro Implications',
+    'macro': 'Macro Implications',
+    'trend': 'Key Sector Trends',
+}
+
+# Field name -> (expected type, required)
+INSIGHT_SCHEMA = {
+    'sector': (str, True),
+    'ticker': (str, True),
+    'action': (str, True),
+    'figures': (list, False),
+    'summary': (str, True),
+    'source': (int, True),
+}
+
+MAX_SUMMARY_CHARS = 160
+MAX_FIGURES = 4
+
+
+def schema_prompt() -> str:
+    """Describe the record schema for the model."""
+    return (
+        'Return a JSON object {"records": [...]} where each record is:\n'
+        '{"sector": "banking|technology|pharma|power|auto|fmcg|metals|oil_gas|realty|aviation|general", '
+        '"ticker": "NSE symbol or company name, or MARKET for macro items", '
+        f'"action": "{"|".join(ACTION_SECTIONS)}", '
+        '"figures": ["₹1,496 crore", "+19%"], '
+        f'"summary": "one factual sentence under {MAX_SUMMARY_CHARS} characters", '
+        '"source": <news item number>}'
+    )
+
+
+def validate_record(record: Dict, batch_size: int) -> Optional[Dict]:
+    """Validate and normalise one record, returning None if it is unusable.
+
+    Raises ValueError when "figures" is neither a list nor null: the model
+    misread the schema, so the whole response is retried like invalid JSON.
+    """
+    if not isinstance(record, dict):
+        return None
+    figures = record.get('figures') or []
+    if not isinstance(figures, list):
+        raise ValueError(f"'figures' must be a list, got {type(figures).__name__}")
+    record['figures'] = figures
+    for name, (expected, required) in INSIGHT_SCHEMA.items():
+        value = record.get(name)
+        if value is None:
+            if required:
+                return None
+            continue
+        if expected is int and isinstance(value, str) and value.strip().isdigit():
+            value = int(value)
+        if not isinstance(value, expected) or isinstance(value, bool):
+            return None
+        record[name] = value
+
+    action = record['action'].strip().lower()
+    if action not in ACTION_SECTIONS or not 1 <= record['source'] <= batch_size:
+        return None
+
+    return {
+        'sector': record['sector'].strip().lower() or 'general',
+        'ticker': record['ticker'].strip().upper(),
+        'action': action,
+        'figures': [str(f).strip() for f in figures if str(f).strip()][:MAX_FIGURES],
+        'summary': record['summary'].strip()[:MAX_SUMMARY_CHARS],
+        'source': record['source'],
+    }
+
+
+def parse_batch_records(response: str, batch_size: int, offset: int = 0) -> Tuple[List[Dict], int]:
+    """Parse a JSON-mode response into validated records.
+
+    Returns the valid records (with "source" rebased to the global item index)
+    and the number of rejected ones. Raises ValueError if the response is
+    not the expected JSON object at all.
+    """
+    try:
+        payload = json.loads(response)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"response is not valid JSON: {e}")
+    raw_records = payload.get('records') if isinstance(payload, dict) else payload
+    if not isinstance(raw_records, list):
+        raise ValueError("response has no 'records' list")
+
+    records = []
+    for raw in raw_records:
+        record = validate_record(raw, batch_size)
+        if record:
+            record['source'] += offset
+            records.append(record)
+    rejected = len(raw_records) - len(records)
+    if rejected:
+        logger.warning(f"Rejected {rejected} invalid insight records")
+    return records, rejected
+
+
+def merge_records(records: List[Dict]) -> List[Dict]:
+    """Merge records deterministically by (ticker, action).
+
+    Records are assumed to be ordered by news priority; the first summary
+    wins, figures and sources are unioned in order of appearance.
+    """
+    merged = {}
+    for record in records:
+        key = (record['ticker'], record['action'])
+        if key not in merged:
+            merged[key] = {**record, 'figures': list(record['figures']), 'sources': [record['source']]}
+            del merged[key]['source']
+            continue
+        entry = merged[key]
+        entry['figures'].extend(f for f in record['figures'] if f not in entry['figures'])
+        entry['figures'] = entry['figures'][:MAX_FIGURES]
+        if record['source'] not in entry['sources']:
+            entry['sources'].append(record['source'])
+
+    return sorted(merged.values(),
+                  key=lambda r: (list(ACTION_SECTIONS).index(r['action']), min(r['sources'])))
+
+
+def format_merged_summary(merged: List[Dict]) -> str:
+    """Render merged records as a compact, section-grouped prompt block."""
+    lines_by_section = {}
+    for record in merged:
+        section = ACTION_SECTIONS[record['action']]
+        figures = f" [{'; '.join(record['figures'])}]" if record['figures'] else ""
+        lines_by_section.setdefault(section, []).append(
+            f"- {record['ticker']} ({record['sector']}, {record['action']}): {record['summary']}{figures}")
+
+    return "\n\n".join(f"{section.upper()}:\n" + "\n".join(lines)
+                       for section, lines in lines_by_section.items())
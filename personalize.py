@@ -0,0 +1,240 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import logging
+import argparse
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Callable
+
+from alerts import WATCHLISTS_FILE
+from entity_extractor import DEFAULT_SYMBOLS, SECTOR_KEYWORDS, classify_sector, load_symbol_aliases
+from insight_schema import ACTION_SECTIONS
+from prompts import Prompt, personal_prompt
+from report_renderer import Report, Section, Bullet, SECTION_EMOJIS
+from storage import atomic_write_json, read_json
+from token_budget import MODEL_PRICING
+
+logger = logging.getLogger(__name__)
+
+SHARED_ANALYSIS_FILE = os.path.join('data', 'shared_analysis.json')
+PROFILE_NOTES_FILE = os.path.join('data', 'profile_notes.json')
+MAX_HEADLINES = 8
+
+
+@dataclass
+class Profile:
+    """What one subscriber follows. Subscribers with equal profiles share one personalized report."""
+    tickers: List[str] = field(default_factory=list)
+    sectors: List[str] = field(default_factory=list)
+    keywords: List[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        self.tickers = sorted({t.upper() for t in self.tickers})
+        self.sectors = sorted({s.lower() for s in self.sectors})
+        self.keywords = sorted({k.lower() for k in self.keywords})
+
+    @property
+    def key(self) -> str:
+        canonical = json.dumps([self.tickers, self.sectors, self.keywords], separators=(',', ':'))
+        return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:16]
+
+    def describe(self) -> str:
+        parts = self.tickers + [s.title() for s in self.sectors] + [f'"{k}"' for k in self.keywords]
+        return ", ".join(parts)
+
+
+def load_profiles(path: str = WATCHLISTS_FILE) -> Dict[str, Profile]:
+    """Profile per chat from the watchlists file: its "profile" entry, else the union of its alert rules."""
+    try:
+        config = read_json(path)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not load watchlists from {path}: {e}")
+        return {}
+    profiles = {}
+    for watchlist in config.get('watchlists', []):
+        spec = watchlist.get('profile')
+        if spec is None:
+            rules = watchlist.get('rules', [])
+            spec = {name: [v for rule in rules for v in rule.get(name, [])] for name in ('tickers', 'sectors', 'keywords')}
+        profile = Profile(spec.get('tickers', []), spec.get('sectors', []), spec.get('keywords', []))
+        if profile.tickers or profile.sectors or profile.keywords:
+            profiles[str(watchlist['chat_id'])] = profile
+    return profiles
+
+
+def build_shared_analysis(results: Dict, aliases: Optional[Dict[str, str]] = None) -> Dict:
+    """The run's analysis as structured per-item and per-record data that every subscriber's report is cut from."""
+    aliases = aliases if aliases is not None else load_symbol_aliases()
+    items = [{'headline': n.get('headline', ''), 'url': n.get('url', ''), 'sector': classify_sector(n),
+              'tickers': n.get('entities', {}).get('tickers', []), 'priority': n.get('priority', 0)}
+             for n in results.get('analyzed_news', [])]
+    records = []
+    for record in results.get('insight_records', []):
+        ticker = record['ticker'].strip()
+        symbol = aliases.get(ticker.lower(), ticker.upper())
+        # A record also covers the tickers of the items it came from
+        tickers = {symbol} | {t for s in record.get('sources', []) if 0 < s <= len(items) for t in items[s - 1]['tickers']}
+        records.append({**record, 'symbols': sorted(tickers)})
+    shared = {'generated': results.get('analysis_timestamp', ''), 'total_news_items': results.get('total_news_items', 0),
+              'records': records, 'items': items}
+    shared['analysis_id'] = hashlib.sha1(json.dumps(shared, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    return shared
+
+
+def save_shared_analysis(shared: Dict, path: str = SHARED_ANALYSIS_FILE):
+    atomic_write_json(path, shared)
+
+
+def _matches(profile: Profile, symbols: List[str], sector: str, text: str) -> bool:
+    return (any(s in profile.tickers for s in symbols) or sector in profile.sectors
+            or any(k in text for k in profile.keywords))
+
+
+def select(shared: Dict, profile: Profile) -> Dict[str, List[Dict]]:
+    """The shared records and headlines relevant to a profile (local filtering, no LLM)."""
+    records = [r for r in shared['records']
+               if _matches(profile, r['symbols'], r['sector'], r['summary'].lower())]
+    covered = {s for r in records for s in r.get('sources', [])}
+    items = [n for i, n in enumerate(shared['items'], 1)
+             if i not in covered and _matches(profile, n['tickers'], n['sector'], n['headline'].lower())]
+    items.sort(key=lambda n: n['priority'], reverse=True)
+    return {'records': records, 'items': items[:MAX_HEADLINES]}
+
+
+class Personalizer:
+    """Builds per-subscriber reports from one shared analysis.
+
+    Subscribers are grouped by profile hash, so each distinct profile is
+    filtered and rendered once and costs at most one small LLM call (its
+    personal take). Those notes are memoized per analysis in
+    PROFILE_NOTES_FILE, so re-sending the same analysis costs nothing.
+    """
+
+    def __init__(self, shared: Dict, complete: Optional[Callable[[Prompt], str]] = None,
+                 notes_path: str = PROFILE_NOTES_FILE):
+        self.shared = shared
+        self.complete = complete
+        self.notes_path = notes_path
+        self.notes = {}
+        try:
+            memo = read_json(notes_path)
+            if memo.get('analysis_id') == shared['analysis_id']:
+                self.notes = memo['notes']
+        except (OSError, ValueError):
+            pass
+        self.stats = {'subscribers': 0, 'profiles': 0, 'llm_calls': 0, 'memo_hits': 0, 'seconds': 0.0}
+
+    def note(self, profile: Profile, selection: Dict) -> List[str]:
+        """The profile's personal-take bullets, from the memo or one LLM call."""
+        if profile.key in self.notes:
+            self.stats['memo_hits'] += 1
+            return self.notes[profile.key]
+        if self.complete is None or not selection['records']:
+            return []
+        lines = [f"- {r['ticker']} ({r['sector']}, {r['action']}): {r['summary']}"
+                 + (f" [{'; '.join(r['figures'])}]" if r['figures'] else "") for r in selection['records']]
+        lines += [f"- {n['headline']}" for n in selection['items']]
+        response = self.complete(personal_prompt(profile.describe(), "\n".join(lines)))
+        self.stats['llm_calls'] += 1
+        if response.startswith(('Error:', 'API Error:')):
+            logger.warning(f"Personal note for profile {profile.key} failed: {response}")
+            return []
+        bullets = [line.strip()[1:].strip() for line in response.splitlines() if line.strip().startswith(('-', '•', '*'))
+                   and not line.strip().startswith('**')]
+        self.notes[profile.key] = bullets
+        return bullets
+
+    def build(self, profile: Profile) -> Optional[Report]:
+        selection = select(self.shared, profile)
+        if not selection['records'] and not selection['items']:
+            return None
+        sections = []
+        note = self.note(profile, selection)
+        if note:
+            sections.append(Section('Your Watchlist', SECTION_EMOJIS['Your Watchlist'], [Bullet(b) for b in note]))
+        by_section = {}
+        for r in selection['records']:
+            figures = f" [{'; '.join(r['figures'])}]" if r['figures'] else ""
+            by_section.setdefault(ACTION_SECTIONS[r['action']], []).append(Bullet(f"**{r['ticker']}**: {r['summary']}{figures}"))
+        for title in SECTION_EMOJIS:
+            if title in by_section:
+                sections.append(Section(title, SECTION_EMOJIS[title], by_section[title]))
+        if selection['items']:
+            sections.append(Section('Other News', SECTION_EMOJIS['Other News'],
+                                    [Bullet(n['headline']) for n in selection['items']]))
+        return Report(generated=self.shared['generated'][:19].replace('T', ' '),
+                      summary=f"Personalized for {profile.describe()}: {len(selection['records'])} insights and "
+                              f"{len(selection['items'])} more headlines from "
+                              f"{self.shared['total_news_items']} news items",
+                      sections=sections)
+
+    def build_all(self, subscribers: Dict[str, Profile]) -> Dict[str, Report]:
+        """Report per subscriber (chat id); subscribers with no matching news get none."""
+        start = time.perf_counter()
+        by_profile = {}
+        for chat_id, profile in subscribers.items():
+            by_profile.setdefault(profile.key, (profile, []))[1].append(chat_id)
+        reports = {}
+        for profile, chat_ids in by_profile.values():
+            report = self.build(profile)
+            if report is not None:
+                reports.update({chat_id: report for chat_id in chat_ids})
+        self.stats['subscribers'] += len(subscribers)
+        self.stats['profiles'] += len(by_profile)
+        self.stats['seconds'] += time.perf_counter() - start
+        return reports
+
+    def save(self):
+        atomic_write_json(self.notes_path, {'analysis_id': self.shared['analysis_id'], 'notes': self.notes})
+
+
+def synthetic_subscribers(count: int, seed: int = 47) -> Dict[str, Profile]:
+    """Subscribers drawn from a skewed set of popular profiles, for benchmarking."""
+    rng = random.Random(seed)
+    symbols = sorted(set(DEFAULT_SYMBOLS.values()))
+    popular = [Profile(rng.sample(symbols, rng.randint(1, 4)), rng.sample(list(SECTOR_KEYWORDS), rng.randint(0, 2)))
+               for _ in range(max(1, count // 20))]
+    weights = [1 / (rank + 1) for rank in range(len(popular))]
+    return {str(10_000 + i): rng.choices(popular, weights)[0] for i in range(count)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Personalized reports from the latest shared analysis")
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help="Estimate cost for this many synthetic subscribers instead of the watchlists file")
+    parser.add_argument('--model', default="meta-llama/llama-4-scout-17b-16e-instruct")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    try:
+        shared = read_json(SHARED_ANALYSIS_FILE)
+    except (OSError, ValueError):
+        print(f"No shared analysis in {SHARED_ANALYSIS_FILE}; run the analyzer first")
+        return
+    subscribers = synthetic_subscribers(args.synthetic) if args.synthetic else load_profiles()
+    # No model here: count the calls a run would make and price them from the prompt sizes
+    prompts = []
+
+    def complete(prompt: Prompt) -> str:
+        prompts.append(prompt)
+        return "- (personal note)"
+
+    personalizer = Personalizer(shared, complete, notes_path=os.devnull)
+    reports = personalizer.build_all(subscribers)
+    stats = personalizer.stats
+    input_price, output_price = MODEL_PRICING.get(args.model, (0.0, 0.0))
+    note_cost = sum(p.tokens(args.model) * input_price + 200 * output_price for p in prompts) / 1_000_000
+    print(f"{stats['subscribers']} subscribers, {stats['profiles']} distinct profiles, {len(reports)} reports built "
+          f"in {stats['seconds'] * 1000:.1f} ms")
+    print(f"LLM calls: {stats['llm_calls']} (one per distinct profile with insights), "
+          f"~${note_cost:.5f} on top of the one shared analysis")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,325 @@
+import time
+import asyncio
+import logging
+from typing import List, Dict, Optional, Tuple, Callable
+
+from backfill import RateLimiter
+from change_detector import item_key
+from entity_extractor import is_simple_corporate_action, build_corporate_actions_bullets
+from prioritizer import priority_score, prioritize
+from report_renderer import build_report, render_text
+from sentiment import SentimentSeries, format_sentiment_summary
+from sources import normalize_url
+from story_threads import StoryThreader, format_thread_bullets
+from summarizer import ExtractiveSummarizer
+
+logger = logging.getLogger(__name__)
+
+DONE = None  # end-of-stream marker passed down each queue
+
+
+class StageQueue(asyncio.Queue):
+    """Bounded queue between two stages that records its depth and how long each side waited.
+
+    put_stall is time producers spent blocked on a full queue (backpressure:
+    the consumer is the bottleneck); get_stall is time consumers spent idle on
+    an empty one (the producer is the bottleneck).
+    """
+
+    def __init__(self, name: str, maxsize: int):
+        super().__init__(maxsize)
+        self.name = name
+        self.stats = {'items': 0, 'max_depth': 0, 'depth_sum': 0, 'put_stall': 0.0, 'get_stall': 0.0}
+
+    async def put(self, item):
+        start = time.perf_counter()
+        await super().put(item)
+        self.stats['put_stall'] += time.perf_counter() - start
+        if item is not DONE:
+            depth = self.qsize()
+            self.stats['items'] += 1
+            self.stats['depth_sum'] += depth
+            self.stats['max_depth'] = max(self.stats['max_depth'], depth)
+
+    async def get(self):
+        start = time.perf_counter()
+        item = await super().get()
+        self.stats['get_stall'] += time.perf_counter() - start
+        return item
+
+    def summary(self) -> Dict:
+        return {'capacity': self.maxsize, 'items': self.stats['items'], 'max_depth': self.stats['max_depth'],
+                'mean_depth': round(self.stats['depth_sum'] / max(1, self.stats['items']), 2),
+                'put_stall': round(self.stats['put_stall'], 3), 'get_stall': round(self.stats['get_stall'], 3)}
+
+
+class StreamingPipeline:
+    """Scrape -> prepare -> LLM batches -> report -> delivery as asyncio stages joined by bounded queues.
+
+    The scraper runs in a thread and hands over each item as it is parsed;
+    when the item queue is full it blocks, so a slow analysis holds the
+    crawl back instead of buffering without limit. Items are deduplicated,
+    annotated and scored one at a time, and a batch goes to the LLM workers
+    as soon as it fills. The batch queue holds one batch per worker, and all
+    calls share one rate limiter. Delivery runs as its own stage, so the
+    preliminary note goes out while batches are still being analyzed.
+
+    Batches are formed in arrival order rather than global priority order,
+    so per-sector quotas and diff mode do not apply here.
+    """
+
+    def __init__(self, analyzer, scrape: Callable, on_item: Optional[Callable[[Dict], None]] = None,
+                 delivery=None, run_state=None, workers: int = 2, item_queue: int = 256,
+                 batch_queue: Optional[int] = None, requests_per_minute: float = 30):
+        self.analyzer = analyzer
+        self.scrape = scrape
+        self.on_item = on_item
+        self.delivery = delivery
+        self.run_state = run_state
+        self.workers = workers
+        self.items = StageQueue('items', item_queue)
+        self.batches = StageQueue('batches', batch_queue or workers)
+        self.deliveries = StageQueue('deliveries', 4)
+        self.limiter = RateLimiter(requests_per_minute)
+        self.summarizer = ExtractiveSummarizer(target_tokens=analyzer.summary_target_tokens, model=analyzer.model) \
+            if analyzer.local_summaries else None
+        if analyzer.story_threads:
+            analyzer.threader = StoryThreader(similarity=analyzer.thread_similarity,
+                                              max_age_days=analyzer.thread_max_age_days)
+
+        self.scraped = []
+        self.prepared = []
+        self.local_news = []
+        self.deferred = []
+        self.dispatched = []
+        self.seen = set()
+        self.batch_results = {}
+        self.failed = []
+        self.api_calls = 0
+        self.items_merged = 0
+        self.items_repeated = 0
+        # Worst-case tokens and USD of the batches dispatched but not finished
+        self.committed_tokens = 0
+        self.committed_dollars = 0.0
+        self.stage_seconds = {}
+        # Set once fast_lane_items items are prepared (or the crawl ended with fewer)
+        self.fast_lane_ready = asyncio.Event()
+        self.fast_lane_start = None  # seconds into the run when the fast lane started
+        self.started = time.perf_counter()
+
+    async def _scrape_stage(self, loop):
+        start = time.perf_counter()
+
+        def emit(news_item: Dict):
+            if self.on_item:
+                self.on_item(news_item)
+            # Blocks the scraper thread while the queue is full
+            asyncio.run_coroutine_threadsafe(self.items.put(news_item), loop).result()
+
+        try:
+            self.scraped = await loop.run_in_executor(None, self.scrape, emit) or []
+            if self.run_state and self.scraped:
+                self.run_state.save('scraped', self.scraped)
+        finally:
+            await self.items.put(DONE)
+            self.stage_seconds['scrape'] = time.perf_counter() - start
+
+    async def _prepare_stage(self):
+        start = time.perf_counter()
+        analyzer = self.analyzer
+        scheduler = analyzer.scheduler
+        consolidation_reserve = analyzer.consolidation_reserve()
+        buffer = []
+        accepted = 0
+        while True:
+            news_item = await self.items.get()
+            if news_item is DONE:
+                break
+            try:
+                keys = [k for k in (item_key(news_item), normalize_url(news_item.get('url', ''))) if k]
+                if any(k in self.seen for k in keys):
+                    continue
+                self.seen.update(keys)
+                analyzer.entity_extractor.annotate([news_item])
+                self.prepared.append(news_item)
+                if len(self.prepared) >= analyzer.fast_lane_items:
+                    self.fast_lane_ready.set()
+                if is_simple_corporate_action(news_item['entities']):
+                    self.local_news.append(news_item)
+                    continue
+                news_item['priority'] = priority_score(news_item)
+                if news_item['priority'] < scheduler.min_score or accepted >= scheduler.max_items:
+                    self.deferred.append(news_item)
+                    continue
+                buffer.append(news_item)
+                accepted += 1
+            except Exception as e:
+                logger.warning(f"Skipping item {news_item.get('headline', '')[:60]!r}: {e}")
+                continue
+            if len(buffer) >= analyzer.batch_size:
+                await self._dispatch(buffer, consolidation_reserve)
+                buffer = []
+        self.fast_lane_ready.set()
+        if buffer:
+            await self._dispatch(buffer, consolidation_reserve)
+        for _ in range(self.workers):
+            await self.batches.put(DONE)
+        self.stage_seconds['prepare'] = time.perf_counter() - start
+
+    async def _dispatch(self, batch: List[Dict], consolidation_reserve: Tuple[int, float]):
+        batch = sorted(batch, key=lambda n: n['priority'], reverse=True)
+        if self.summarizer:
+            kept = self.summarizer.summarize(batch)
+            self.items_merged += len(batch) - len(kept)
+            batch = kept
+        if self.analyzer.threader is not None:
+            self.analyzer.threader.assign(batch)
+            fresh = [n for n in batch if n.get('thread_status') != 'repeat']
+            self.items_repeated += len(batch) - len(fresh)
+            batch = fresh
+        if not batch:
+            return
+        # Keep what the batches in flight and the consolidation will need out of the token and cost budgets
+        estimate = self.analyzer.estimate_batch_cost(batch)
+        budget = self.analyzer.token_budget
+        if (estimate[0] + self.committed_tokens + consolidation_reserve[0] > budget.remaining_tokens() or
+                estimate[1] + self.committed_dollars + consolidation_reserve[1] > budget.remaining_cost()):
+            logger.warning(f"Budget reached, {len(batch)} items summarized locally instead")
+            self.deferred.extend(batch)
+            return
+        self.committed_tokens += estimate[0]
+        self.committed_dollars += estimate[1]
+        offset = sum(len(b) for b in self.dispatched)
+        self.dispatched.append(batch)
+        await self.batches.put((len(self.dispatched), offset, batch, estimate))
+
+    async def _llm_worker(self, loop, worker: int):
+        start = time.perf_counter()
+        while True:
+            job = await self.batches.get()
+            if job is DONE:
+                break
+            batch_num, offset, batch, estimate = job
+            await self.limiter.wait()
+            logger.info(f"Worker {worker}: batch {batch_num} ({len(batch)} items)")
+            result, api_calls = await loop.run_in_executor(None, self.analyzer.run_batch, batch, batch_num, 0, offset)
+            self.api_calls += api_calls
+            self.committed_tokens -= estimate[0]
+            self.committed_dollars -= estimate[1]
+            if result is None:
+                self.failed.append(job)
+            else:
+                self.batch_results[batch_num] = result
+        self.stage_seconds[f"llm_{worker}"] = time.perf_counter() - start
+
+    async def _fast_lane(self, loop):
+        # Starts on the first fast_lane_items items rather than waiting for the whole crawl
+        await self.fast_lane_ready.wait()
+        if not self.prepared or self.analyzer.fast_lane_items <= 0:
+            return
+        self.fast_lane_start = time.perf_counter() - self.started
+        logger.info(f"Fast lane started {self.fast_lane_start:.1f}s into the run, on {len(self.prepared)} items")
+        await self.limiter.wait()
+        preliminary = await loop.run_in_executor(None, self.analyzer.analyze_fast_lane, list(self.prepared))
+        if preliminary:
+            await self.deliveries.put(('preliminary', preliminary))
+
+    async def _delivery_stage(self, loop):
+        start = time.perf_counter()
+        while True:
+            job = await self.deliveries.get()
+            if job is DONE:
+                break
+            kind, payload = job
+            if kind == 'preliminary':
+                if await loop.run_in_executor(None, self.delivery.send_preliminary, payload):
+                    print(f"⚡ Preliminary note sent to Telegram {self.delivery.first_message_seconds:.1f}s "
+                          f"after the run started")
+            else:
+                print("\n📱 Sending report to Telegram...")
+                await loop.run_in_executor(None, self.delivery.send_full_report, payload)
+        self.stage_seconds['delivery'] = time.perf_counter() - start
+
+    def build_plan(self) -> Dict:
+        """The analysis plan of the streamed run, in the shape finish_analysis expects."""
+        analyzer = self.analyzer
+        analyzed = [n for batch in self.dispatched for n in batch]
+        deferred = prioritize(self.deferred)
+        return {
+            'prioritized_news': analyzed,
+            'analyze': list(range(len(analyzed))),
+            'unchanged': {},
+            'changes': None,
+            'sector_summary': {k: len(v) for k, v in analyzer.categorize_news_by_sector(analyzed).items()},
+            'sentiment': format_sentiment_summary(self.scraped or self.prepared, SentimentSeries()),
+            'local_actions': build_corporate_actions_bullets(prioritize(self.local_news)),
+            'other_news': analyzer.build_other_news_bullets(deferred),
+            'developing': format_thread_bullets(analyzed) if analyzer.threader is not None else [],
+            'local_items': len(self.local_news),
+            'merged_items': self.items_merged,
+            'items_deferred': len(deferred),
+            'items_repeated': self.items_repeated,
+            'items_dropped': 0,
+        }
+
+    async def run(self) -> Optional[Dict]:
+        """Run every stage; returns the analysis results, report and stats, or None if nothing was scraped."""
+        loop = asyncio.get_running_loop()
+        start = self.started = time.perf_counter()
+        prepare = asyncio.ensure_future(self._prepare_stage())
+        workers = [asyncio.ensure_future(self._llm_worker(loop, i)) for i in range(1, self.workers + 1)]
+        delivery = asyncio.ensure_future(self._delivery_stage(loop)) if self.delivery else None
+        fast_lane = asyncio.ensure_future(self._fast_lane(loop)) if self.delivery else None
+        await self._scrape_stage(loop)
+        await asyncio.gather(prepare, *workers)
+
+        news_data = self.scraped or self.prepared
+        if not news_data:
+            if delivery:
+                fast_lane.cancel()
+                await self.deliveries.put(DONE)
+                await delivery
+            return None
+
+        # Failed batches get one more try on their own, as in the sequential path
+        for job in self.failed:
+            if self.analyzer.budget_exhausted:
+                break
+            batch_num, offset, batch, _ = job
+            await self.limiter.wait()
+            result, api_calls = await loop.run_in_executor(None, self.analyzer.run_batch, batch, batch_num, 0, offset)
+            self.api_calls += api_calls
+            if result is not None:
+                self.batch_results[batch_num] = result
+
+        results = await loop.run_in_executor(None, self.analyzer.finish_analysis, news_data, self.build_plan(),
+                                             self.dispatched, self.batch_results, self.api_calls, self.run_state)
+        report_model = build_report(results)
+        if fast_lane:
+            await fast_lane
+            await self.deliveries.put(('report', report_model))
+        # The report is saved while it is being delivered
+        saved_file = await loop.run_in_executor(None, self.analyzer.save_report, render_text(report_model))
+        if delivery:
+            await self.deliveries.put(DONE)
+            await delivery
+        self.stage_seconds['total'] = time.perf_counter() - start
+        return {'news_data': news_data, 'results': results, 'report_model': report_model,
+                'saved_file': saved_file, 'stats': self.stats()}
+
+    def stats(self) -> Dict:
+        return {'queues': {q.name: q.summary() for q in (self.items, self.batches, self.deliveries)},
+                'stage_seconds': {k: round(v, 3) for k, v in self.stage_seconds.items()},
+                'fast_lane_start': round(self.fast_lane_start, 3) if self.fast_lane_start is not None else None,
+                'batches': len(self.dispatched),
+                'failed_batches': sum(1 for job in self.failed if job[0] not in self.batch_results)}
+
+
+def print_pipeline_stats(stats: Dict):
+    print("Pipeline queues (put stall = backpressure from the next stage, get stall = waiting on the previous):")
+    for name, q in stats['queues'].items():
+        print(f"  {name:<10} {q['items']:>4} items, depth max {q['max_depth']}/{q['capacity']} "
+              f"mean {q['mean_depth']}, put stall {q['put_stall']:.2f}s, get stall {q['get_stall']:.2f}s")
+    print("  stage wall time: " + ", ".join(f"{k} {v:.1f}s" for k, v in stats['stage_seconds'].items()))
+    if stats.get('fast_lane_start') is not None:
+        print(f"  fast lane started {stats['fast_lane_start']:.1f}s into the run")
@@ -0,0 +1,482 @@
+import io
+import os
+import csv
+import sys
+import glob
+import time
+import logging
+import argparse
+import tempfile
+from datetime import datetime, date, time as dt_time
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # CSV files need nothing extra
+    pq = None
+
+from entity_index import EntityIndex
+from sources import IST
+from storage import atomic_write_bytes, atomic_write_json, atomic_write_text, read_json
+
+logger = logging.getLogger(__name__)
+
+PRICES_DIR = os.path.join('data', 'prices')
+PRICE_STORE_DIR = os.path.join('data', 'price_store')
+EVENT_STUDY_FILE = os.path.join('data', 'event_study.csv')
+
+FIELDS = ['open', 'high', 'low', 'close', 'volume']
+# Accepted column names (lower-cased, spaces as underscores); NSE bhavcopies use TIMESTAMP and TOTTRDQTY
+COLUMN_ALIASES = {
+    'timestamp': ['timestamp', 'datetime', 'date', 'time'],
+    'open': ['open'],
+    'high': ['high'],
+    'low': ['low'],
+    'close': ['close', 'last'],
+    'volume': ['volume', 'vol', 'tottrdqty'],
+}
+DATE_FORMATS = ['%d-%b-%Y', '%d-%m-%Y', '%d/%m/%Y', '%Y%m%d']
+# Daily bars are stamped when their close is known, so news during the session maps to that day's bar
+MARKET_CLOSE = dt_time(15, 30)
+# Larger than any epoch-seconds timestamp, so (symbol rank, time) pairs sort as one int64 key
+SYMBOL_SPAN = 10 ** 10
+PULSE_TIME_FORMAT = '%I:%M %p, %d %b %Y'
+
+
+def parse_timestamp(value) -> int:
+    """Epoch seconds of a bar. Naive times are IST; date-only values are daily bars, stamped at the 15:30 close."""
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, date):
+        dt = datetime.combine(value, MARKET_CLOSE)
+    elif isinstance(value, (int, float, np.integer, np.floating)):
+        return int(value / 1000 if value > 1e11 else value)  # epoch milliseconds or seconds
+    else:
+        text = str(value).strip()
+        if text.replace('.', '', 1).isdigit() and len(text) != 8:
+            return parse_timestamp(float(text))
+        try:
+            dt = datetime.fromisoformat(text.replace('Z', '+00:00'))
+            if len(text) <= 10:
+                dt = datetime.combine(dt.date(), MARKET_CLOSE)
+        except ValueError:
+            for fmt in DATE_FORMATS:
+                try:
+                    dt = datetime.combine(datetime.strptime(text, fmt).date(), MARKET_CLOSE)
+                    break
+                except ValueError:
+                    continue
+            else:
+                raise ValueError(f"Unrecognized timestamp {text!r}")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=IST)
+    return int(dt.timestamp())
+
+
+def _number(value) -> float:
+    if value is None or value == '':
+        return np.nan
+    try:
+        return float(str(value).replace(',', ''))
+    except ValueError:
+        return np.nan
+
+
+def read_columns(path: str) -> Dict[str, list]:
+    """Columns of a CSV or Parquet file, keyed by normalized header name."""
+    if path.endswith('.parquet'):
+        if pq is None:
+            raise OSError(f"{path} needs the pyarrow package")
+        columns = pq.read_table(path).to_pydict()
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            rows = [row for row in csv.reader(f) if row]
+        if not rows:
+            return {}
+        columns = {name: [row[i] if i < len(row) else '' for row in rows[1:]] for i, name in enumerate(rows[0])}
+    return {name.strip().lower().replace(' ', '_'): values for name, values in columns.items()}
+
+
+def parse_bars(path: str) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """OHLCV bars per symbol from one file: (timestamps, (n, 5) open/high/low/close/volume).
+
+    The symbol comes from a "symbol" column, else from the file name
+    (TATASTEEL.csv). Only EQ rows are kept when there is a "series" column.
+    """
+    columns = read_columns(path)
+    names = {field: next((a for a in aliases if a in columns), None) for field, aliases in COLUMN_ALIASES.items()}
+    missing = [field for field in ('timestamp', 'close') if names[field] is None]
+    if missing:
+        raise ValueError(f"{path} has no {' or '.join(missing)} column")
+    count = len(columns[names['timestamp']])
+    ts = np.array([parse_timestamp(v) for v in columns[names['timestamp']]], dtype=np.int64)
+    ohlcv = np.full((count, len(FIELDS)), np.nan)
+    for j, field in enumerate(FIELDS):
+        if names[field]:
+            ohlcv[:, j] = [_number(v) for v in columns[names[field]]]
+    for j in range(3):  # close-only files: open, high and low default to the close
+        ohlcv[:, j] = np.where(np.isnan(ohlcv[:, j]), ohlcv[:, 3], ohlcv[:, j])
+
+    keep = ~np.isnan(ohlcv[:, 3])
+    if 'series' in columns:
+        keep &= np.array([str(s).strip().upper() in ('EQ', '') for s in columns['series']])
+    if 'symbol' in columns:
+        symbols = np.array([str(s).strip().upper() for s in columns['symbol']])
+    else:
+        symbols = np.full(count, os.path.basename(path).split('.')[0].upper())
+    ts, ohlcv, symbols = ts[keep], ohlcv[keep], symbols[keep]
+    names, inverse = np.unique(symbols, return_inverse=True)
+    return {str(name): (ts[inverse == i], ohlcv[inverse == i]) for i, name in enumerate(names)}
+
+
+class PriceStore:
+    """OHLCV bars per symbol, stored as .npy files and memory-mapped on first use.
+
+    Each symbol has an int64 array of bar timestamps (epoch seconds,
+    ascending) and a float64 (n, 5) array of open, high, low, close and
+    volume. Imports merge new rows into the existing bars, so files may
+    overlap; a re-imported bar replaces the stored one.
+    """
+
+    def __init__(self, store_dir: str = PRICE_STORE_DIR):
+        self.store_dir = store_dir
+        self.manifest_path = os.path.join(store_dir, 'manifest.json')
+        try:
+            self.manifest = read_json(self.manifest_path)
+        except (OSError, ValueError):
+            self.manifest = {'symbols': {}, 'sources': {}}
+        self._bars = {}
+
+    @property
+    def symbols(self) -> List[str]:
+        return sorted(self.manifest['symbols'])
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.manifest['symbols']
+
+    def _path(self, symbol: str, kind: str) -> str:
+        return os.path.join(self.store_dir, f"{symbol}.{kind}.npy")
+
+    def bars(self, symbol: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(timestamps, ohlcv) of a symbol, memory-mapped read-only."""
+        if symbol not in self._bars:
+            self._bars[symbol] = (np.load(self._path(symbol, 'ts'), mmap_mode='r'),
+                                  np.load(self._path(symbol, 'ohlcv'), mmap_mode='r'))
+        return self._bars[symbol]
+
+    def write(self, symbol: str, ts: np.ndarray, ohlcv: np.ndarray):
+        """Merge bars into a symbol's arrays (call save() afterwards to persist the manifest)."""
+        if symbol in self:
+            old_ts, old_ohlcv = self.bars(symbol)
+            ts, ohlcv = np.concatenate([ts, old_ts]), np.concatenate([ohlcv, old_ohlcv])
+        # np.unique keeps the first occurrence, so the new rows win
+        ts, first = np.unique(ts, return_index=True)
+        ohlcv = ohlcv[first]
+        self._bars.pop(symbol, None)
+        for kind, array in (('ts', ts), ('ohlcv', ohlcv)):
+            buffer = io.BytesIO()
+            np.save(buffer, array)
+            atomic_write_bytes(self._path(symbol, kind), buffer.getvalue())
+        self.manifest['symbols'][symbol] = {'bars': len(ts), 'first': int(ts[0]), 'last': int(ts[-1])}
+
+    def import_files(self, paths: List[str], force: bool = False) -> Dict[str, int]:
+        """Import CSV/Parquet files, skipping those unchanged since their last import. Returns rows per symbol."""
+        imported = {}
+        for path in paths:
+            stat = os.stat(path)
+            signature = [stat.st_mtime, stat.st_size]
+            if not force and self.manifest['sources'].get(path) == signature:
+                continue
+            try:
+                bars = parse_bars(path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping {path}: {e}")
+                continue
+            for symbol, (ts, ohlcv) in bars.items():
+                self.write(symbol, ts, ohlcv)
+                imported[symbol] = imported.get(symbol, 0) + len(ts)
+            self.manifest['sources'][path] = signature
+        self.save()
+        return imported
+
+    def import_dir(self, prices_dir: str = PRICES_DIR, force: bool = False) -> Dict[str, int]:
+        paths = sorted(glob.glob(os.path.join(prices_dir, '*.csv')) + glob.glob(os.path.join(prices_dir, '*.parquet')))
+        return self.import_files(paths, force)
+
+    def save(self):
+        atomic_write_json(self.manifest_path, self.manifest)
+
+
+class PricePanel:
+    """Bars of several symbols concatenated into flat arrays, for lookups across symbols at once.
+
+    Symbols sit one after another in the same arrays, and a (symbol rank,
+    timestamp) int64 key sorted the same way lets a single searchsorted place
+    thousands of (symbol, time) events. Windows around those positions are
+    then one fancy-indexing gather, masked where they cross a symbol boundary.
+    """
+
+    def __init__(self, store: PriceStore, symbols: List[str], market: Optional[str] = None):
+        self.symbols = [s for s in dict.fromkeys(symbols) if s in store]
+        self.rank = {symbol: i for i, symbol in enumerate(self.symbols)}
+        parts = [store.bars(symbol) for symbol in self.symbols]
+        lengths = np.array([len(ts) for ts, _ in parts], dtype=np.int64)
+        self.ends = np.cumsum(lengths)
+        self.starts = self.ends - lengths
+        self.ts = np.concatenate([ts for ts, _ in parts]) if parts else np.zeros(0, dtype=np.int64)
+        ohlcv = np.concatenate([bars for _, bars in parts]) if parts else np.zeros((0, len(FIELDS)))
+        self.high, self.low, self.close = ohlcv[:, 1], ohlcv[:, 2], ohlcv[:, 3]
+        self.key = np.repeat(np.arange(len(self.symbols), dtype=np.int64), lengths) * SYMBOL_SPAN + self.ts
+        self.returns = self._returns(self.close, self.starts)
+
+        # Market returns on the same bars (matched by timestamp), for the market model
+        self.market_returns = np.full(len(self.ts), np.nan)
+        if market and market in store and len(self.ts):
+            market_ts, market_bars = store.bars(market)
+            market_returns = self._returns(np.asarray(market_bars[:, 3]), np.zeros(1, dtype=np.int64))
+            j = np.minimum(np.searchsorted(market_ts, self.ts), len(market_ts) - 1)
+            same = market_ts[j] == self.ts
+            self.market_returns[same] = market_returns[j[same]]
+
+    @staticmethod
+    def _returns(close: np.ndarray, starts: np.ndarray) -> np.ndarray:
+        previous = np.empty_like(close)
+        previous[1:] = close[:-1]
+        previous[starts] = np.nan  # no return across a symbol boundary
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return close / previous - 1
+
+    def locate(self, symbols: List[str], times: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(position, symbol rank, found) of the first bar at or after each event time."""
+        ranks = np.array([self.rank.get(symbol, -1) for symbol in symbols], dtype=np.int64)
+        if not self.symbols:
+            return np.zeros(len(ranks), dtype=np.int64), ranks, np.zeros(len(ranks), dtype=bool)
+        known = np.maximum(ranks, 0)
+        pos = np.searchsorted(self.key, known * SYMBOL_SPAN + np.asarray(times, dtype=np.int64), side='left')
+        return pos, ranks, (ranks >= 0) & (pos < self.ends[known])
+
+    def window(self, values: np.ndarray, pos: np.ndarray, ranks: np.ndarray, found: np.ndarray,
+               offsets: np.ndarray) -> np.ndarray:
+        """values at pos + offset for every event and offset (events x offsets), NaN outside the symbol's bars."""
+        idx = pos[:, None] + np.asarray(offsets)[None, :]
+        known = np.maximum(ranks, 0)
+        inside = found[:, None] & (idx >= self.starts[known][:, None]) & (idx < self.ends[known][:, None]) \
+            if self.symbols else np.zeros(idx.shape, dtype=bool)
+        out = np.full(idx.shape, np.nan)
+        out[inside] = values[idx[inside]]
+        return out
+
+
+def event_study(panel: PricePanel, symbols: List[str], times: np.ndarray, window: Tuple[int, int] = (-1, 5),
+                estimation: int = 60, gap: int = 5, min_obs: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """Abnormal returns around every (symbol, time) event, all events at once.
+
+    Bar 0 is the first bar at or after the news. Expected returns come from a
+    market model fitted by OLS over the `estimation` bars ending `gap` bars
+    before the window, or from the symbol's mean return there when the market
+    series is missing. Events whose window runs past the available bars get a
+    NaN CAR.
+    """
+    lo, hi = window
+    offsets = np.arange(lo, hi + 1)
+    est_offsets = np.arange(lo - gap - estimation, lo - gap)
+    min_obs = min_obs or max(2, estimation // 2)
+    pos, ranks, found = panel.locate(symbols, times)
+    returns = panel.window(panel.returns, pos, ranks, found, offsets)
+    market = panel.window(panel.market_returns, pos, ranks, found, offsets)
+    est_returns = panel.window(panel.returns, pos, ranks, found, est_offsets)
+    est_market = panel.window(panel.market_returns, pos, ranks, found, est_offsets)
+
+    # Market model, vectorized over events: beta = cov(m, r) / var(m) on the jointly observed bars
+    both = np.isfinite(est_returns) & np.isfinite(est_market)
+    n = both.sum(axis=1)
+    mean_m = np.where(both, est_market, 0).sum(axis=1) / np.maximum(n, 1)
+    mean_r = np.where(both, est_returns, 0).sum(axis=1) / np.maximum(n, 1)
+    dm = np.where(both, est_market - mean_m[:, None], 0)
+    dr = np.where(both, est_returns - mean_r[:, None], 0)
+    var_m = (dm * dm).sum(axis=1)
+    market_model = (n >= min_obs) & (var_m > 0) & np.isfinite(market).all(axis=1)
+    beta = np.where(market_model, (dm * dr).sum(axis=1) / np.where(var_m > 0, var_m, 1), 0.0)
+    alpha = np.where(market_model, mean_r - beta * mean_m, 0.0)
+
+    # Mean-adjusted fallback: the symbol's own average estimation-window return
+    own = np.isfinite(est_returns)
+    own_n = own.sum(axis=1)
+    own_mean = np.where(own, est_returns, 0).sum(axis=1) / np.maximum(own_n, 1)
+    alpha = np.where(market_model, alpha, own_mean)
+
+    expected = alpha[:, None] + beta[:, None] * np.where(market_model[:, None], market, 0)
+    abnormal = returns - expected
+    est_expected = alpha[:, None] + beta[:, None] * np.where(market_model[:, None], est_market, 0)
+    residuals = np.where(np.where(market_model[:, None], both, own), est_returns - est_expected, 0)
+    dof = np.where(market_model, n - 2, own_n - 1)
+    sigma = np.sqrt((residuals * residuals).sum(axis=1) / np.maximum(dof, 1))
+
+    complete = found & np.isfinite(abnormal).all(axis=1) & (np.where(market_model, n, own_n) >= min_obs)
+    car = np.where(complete, np.where(np.isfinite(abnormal), abnormal, 0).sum(axis=1), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tstat = car / (sigma * np.sqrt(len(offsets)))
+    return {
+        'offsets': offsets,
+        'abnormal': abnormal,
+        'car': car,
+        'tstat': np.where(sigma > 0, tstat, np.nan),
+        'alpha': alpha,
+        'beta': beta,
+        'market_model': market_model,
+        'bar_time': np.where(found, panel.ts[np.minimum(pos, len(panel.ts) - 1)] if len(panel.ts) else -1, -1),
+    }
+
+
+def summarize(result: Dict[str, np.ndarray]) -> Dict:
+    """Cross-sectional average abnormal returns and CAR, with the t-statistic of the mean CAR."""
+    measured = np.isfinite(result['car'])
+    car = result['car'][measured]
+    count = len(car)
+    mean_car = float(car.mean()) if count else float('nan')
+    t_stat = float(mean_car / (car.std(ddof=1) / np.sqrt(count))) if count > 1 and car.std(ddof=1) > 0 else float('nan')
+    caar = result['abnormal'][measured].mean(axis=0) if count else np.full(len(result['offsets']), np.nan)
+    return {'events': len(result['car']), 'measured': count, 'mean_car': mean_car, 't_stat': t_stat,
+            'positive': float((car > 0).mean()) if count else float('nan'),
+            'market_model': int(result['market_model'][measured].sum()),
+            'caar': dict(zip(result['offsets'].tolist(), caar.tolist()))}
+
+
+def news_timestamp(news_item: Dict, fallback: float) -> int:
+    """Publication time of a news item (Pulse format, IST), or the fallback when unknown."""
+    try:
+        return int(datetime.strptime(news_item.get('time', ''), PULSE_TIME_FORMAT).replace(tzinfo=IST).timestamp())
+    except ValueError:
+        return int(fallback)
+
+
+def news_events(index: EntityIndex, store: PriceStore) -> Dict[str, np.ndarray]:
+    """One event per (indexed article, priced ticker), timed by publication or else by indexing time."""
+    article_ids, symbols, times = [], [], []
+    for article in index.articles:
+        for ticker in article['tickers']:
+            if ticker in store:
+                article_ids.append(article['id'])
+                symbols.append(ticker)
+                times.append(news_timestamp(article, article['indexed_at']))
+    return {'article_id': np.array(article_ids, dtype=np.int64), 'symbol': np.array(symbols, dtype=object),
+            'time': np.array(times, dtype=np.int64)}
+
+
+def join_events(events: Dict[str, np.ndarray], result: Dict[str, np.ndarray], index: EntityIndex) -> List[Dict]:
+    """Measured events joined back to their articles."""
+    rows = []
+    for i in np.flatnonzero(np.isfinite(result['car'])):
+        article = index.articles[events['article_id'][i]]
+        rows.append({'article_id': int(events['article_id'][i]), 'symbol': events['symbol'][i],
+                     'news_time': int(events['time'][i]), 'bar_time': int(result['bar_time'][i]),
+                     'car': float(result['car'][i]), 'tstat': float(result['tstat'][i]),
+                     'headline': article['headline'], 'url': article['url']})
+    return rows
+
+
+def write_rows(path: str, rows: List[Dict]):
+    buffer = io.StringIO()
+    if rows:
+        writer = csv.DictWriter(buffer, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    atomic_write_text(path, buffer.getvalue())
+
+
+def synthetic_store(store_dir: str, symbols: int, bars: int, seed: int = 49) -> PriceStore:
+    """Random-walk daily bars for `symbols` symbols plus a NIFTY market series, for benchmarking."""
+    rng = np.random.default_rng(seed)
+    store = PriceStore(store_dir)
+    ts = parse_timestamp('2015-01-01') + 86400 * np.arange(bars, dtype=np.int64)
+    market = rng.normal(0.0003, 0.01, bars)
+    for i in range(symbols):
+        returns = rng.normal(0, 0.012, bars) + rng.uniform(0.5, 1.5) * market
+        close = 100 * np.cumprod(1 + returns)
+        store.write(f"SYM{i:04d}", ts, np.column_stack([close, close * 1.01, close * 0.99, close, np.full(bars, 1e5)]))
+    close = 100 * np.cumprod(1 + market)
+    store.write('NIFTY', ts, np.column_stack([close, close, close, close, np.zeros(bars)]))
+    store.save()
+    return store
+
+
+def benchmark(symbols: int = 500, bars: int = 2500, events: int = 10_000) -> Dict:
+    with tempfile.TemporaryDirectory() as store_dir:
+        store = synthetic_store(store_dir, symbols, bars)
+        rng = np.random.default_rng(7)
+        event_symbols = [f"SYM{i:04d}" for i in rng.integers(0, symbols, events)]
+        first, last = store.manifest['symbols']['NIFTY']['first'], store.manifest['symbols']['NIFTY']['last']
+        times = rng.integers(first, last, events)
+        start = time.perf_counter()
+        panel = PricePanel(PriceStore(store_dir), event_symbols, market='NIFTY')
+        load_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        summary = summarize(event_study(panel, event_symbols, times))
+        study_seconds = time.perf_counter() - start
+    return {'symbols': symbols, 'bars': bars, 'events': events, 'load_ms': load_seconds * 1000,
+            'study_ms': study_seconds * 1000, **summary}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OHLC price store and news event study")
+    parser.add_argument('--import', dest='import_dir', nargs='?', const=PRICES_DIR,
+                        help=f"Import CSV/Parquet OHLC files (default directory: {PRICES_DIR})")
+    parser.add_argument('--force', action='store_true', help="Re-import files that have not changed")
+    parser.add_argument('--study', action='store_true', help="Event study of the indexed news against the store")
+    parser.add_argument('--market', default=os.getenv('PRICE_MARKET_SYMBOL', 'NIFTY'),
+                        help="Market index symbol for the market model")
+    parser.add_argument('--pre', type=int, default=1, help="Bars before the news bar in the event window")
+    parser.add_argument('--post', type=int, default=5, help="Bars after the news bar in the event window")
+    parser.add_argument('--estimation', type=int, default=60, help="Bars in the estimation window")
+    parser.add_argument('--gap', type=int, default=5, help="Bars between the estimation and event windows")
+    parser.add_argument('--out', default=EVENT_STUDY_FILE, help="CSV of per-event results")
+    parser.add_argument('--benchmark', action='store_true', help="Time the study on synthetic prices")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.benchmark:
+        for events in (1_000, 10_000, 100_000):
+            r = benchmark(events=events)
+            print(f"{r['events']:>7} events over {r['symbols']} symbols x {r['bars']} bars: panel {r['load_ms']:.0f} ms, "
+                  f"study {r['study_ms']:.0f} ms (mean CAR {r['mean_car']:+.4%}, t={r['t_stat']:.2f})")
+        return
+    store = PriceStore()
+    if args.import_dir:
+        imported = store.import_dir(args.import_dir, args.force)
+        print(f"Imported {sum(imported.values())} bars for {len(imported)} symbols; "
+              f"{len(store.symbols)} symbols in {store.store_dir}")
+    if not args.study:
+        if not args.import_dir:
+            print(f"{len(store.symbols)} symbols in {store.store_dir}")
+        return
+
+    index = EntityIndex()
+    events = news_events(index, store)
+    if not len(events['symbol']):
+        print("No indexed news mentions a symbol in the price store")
+        return
+    start = time.perf_counter()
+    panel = PricePanel(store, list(events['symbol']), market=args.market)
+    result = event_study(panel, list(events['symbol']), events['time'], (-args.pre, args.post),
+                         args.estimation, args.gap)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    summary = summarize(result)
+    rows = join_events(events, result, index)
+    write_rows(args.out, rows)
+    print(f"{summary['measured']}/{summary['events']} events measured in {elapsed_ms:.0f} ms "
+          f"({summary['market_model']} with the {args.market} market model)")
+    print(f"Mean CAR[{-args.pre},{args.post}]: {summary['mean_car']:+.3%} (t={summary['t_stat']:.2f}), "
+          f"{summary['positive']:.0%} positive")
+    print("CAAR by bar: " + ", ".join(f"{k:+d}: {v:+.3%}" for k, v in summary['caar'].items()))
+    for row in sorted(rows, key=lambda r: abs(r['car']), reverse=True)[:10]:
+        print(f"  {row['car']:+7.2%} {row['symbol']:<12} {row['headline'][:80]}")
+    print(f"\n💾 Per-event results saved to {args.out}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(0)
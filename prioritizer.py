@@ -0,0 +1,142 @@
+import heapq
+from typing import List, Dict, Tuple
+
+from entity_extractor import has_figures, classify_sector
+
+# High impact keywords (+3 each)
+HIGH_IMPACT_WORDS = [
+    # Corporate Actions
+    'results', 'earnings', 'profit', 'loss', 'merger', 'acquisition',
+    'ipo', 'dividend', 'buyback', 'split', 'delisting', 'rating',
+    'upgrade', 'downgrade', 'target', 'recommendation',
+
+    # Financial Metrics
+    'revenue', 'growth', 'margin', 'ebitda', 'pat', 'eps',
+    'guidance', 'forecast', 'outlook', 'projection',
+
+    # Corporate Events
+    'launch', 'expansion', 'investment', 'capex', 'order', 'contract',
+    'deal', 'partnership', 'collaboration', 'venture',
+
+    # Market Actions
+    'circuit', 'upper circuit', 'lower circuit', 'breakout', 'breakdown',
+    'surge', 'plunge', 'rally', 'correction', 'volatility',
+
+    # Analyst Actions
+    'initiate', 'maintain', 'retain', 'revise', 'cut', 'raise',
+    'bullish', 'bearish', 'neutral', 'outperform', 'underperform'
+]
+
+# Market moving events (+2 each)
+MARKET_MOVERS = [
+    # Existing terms
+    'fii', 'dii', 'rbi', 'sebi', 'government', 'policy', 'tax',
+    'interest rate', 'inflation', 'gdp', 'budget',
+
+    # Market Structure
+    'sensex', 'nifty', 'bullish', 'bearish', 'correction', 'rally',
+    'volatility', 'consolidation',
+
+    # Technical Analysis
+    'sma', 'ema', 'resistance', 'support', 'breakout', 'breakdown',
+    'volume', 'technical', 'pattern',
+
+    # Corporate Actions
+    'merger', 'acquisition', 'm&a', 'dividend', 'buyback',
+    'earnings', 'results', 'quarterly', 'guidance', 'outlook',
+
+    # Sectors
+    'banking', 'finance', 'it', 'auto', 'pharma', 'realty',
+    'infrastructure', 'cement', 'energy', 'power', 'oil',
+    'defense', 'aerospace',
+
+    # Global Markets
+    'futures', 'dow', 'nasdaq', 'asian', 'european',
+    'tariff', 'trade', 'commodity', 'gold', 'crude'
+]
+
+
+def priority_score(news_item: Dict) -> int:
+    """Market-impact score of an annotated news item (higher is more important)."""
+    combined_text = f"{news_item.get('headline', '').lower()} {news_item.get('description', '').lower()}"
+
+    score = 3 * sum(1 for word in HIGH_IMPACT_WORDS if word in combined_text)
+    score += 2 * sum(1 for word in MARKET_MOVERS if word in combined_text)
+
+    # Financial figures
+    if has_figures(news_item['entities']):
+        score += 2
+
+    # Recent news gets higher priority
+    if 'may 2025' in news_item.get('time', '').lower():
+        score += 1
+
+    return score
+
+
+def prioritize(news_items: List[Dict]) -> List[Dict]:
+    """Score annotated items (under 'priority') and sort them, highest first (stable for equal scores)."""
+    for news_item in news_items:
+        news_item['priority'] = priority_score(news_item)
+    return sorted(news_items, key=lambda n: n['priority'], reverse=True)
+
+
+def top_k(news_items: List[Dict], k: int) -> List[Dict]:
+    """The k highest-priority items, best first, in O(n log k); ties keep input order."""
+    ranked = heapq.nlargest(k, enumerate(news_items), key=lambda pair: (pair[1]['priority'], -pair[0]))
+    return [news_item for _, news_item in ranked]
+
+
+class BudgetedScheduler:
+    """Chooses which items get LLM analysis when there are more than the budget allows.
+
+    Items scoring below min_score never reach the model. The max_items slots
+    are split across sectors in proportion to their eligible items, with at
+    least min_per_sector each (less when there are too many sectors for the
+    floors to fit in max_items), and every sector keeps its own top-k. Slots a
+    sector cannot use go to the best remaining items overall. Everything not
+    selected is deferred to the cheap local-summary tier.
+    """
+
+    def __init__(self, max_items: int = 240, min_score: int = 1, min_per_sector: int = 2,
+                 sector_keywords: Dict[str, List[str]] = None):
+        self.max_items = max_items
+        self.min_score = min_score
+        self.min_per_sector = min_per_sector
+        self.sector_keywords = sector_keywords
+
+    def allocate(self, sector_counts: Dict[str, int]) -> Dict[str, int]:
+        """Slots per sector: a floor of min_per_sector, the rest proportional to eligible items."""
+        total = sum(sector_counts.values())
+        if total <= self.max_items:
+            return dict(sector_counts)
+        # Floors that would overrun max_items are scaled down to an equal share
+        floor = min(self.min_per_sector, self.max_items // len(sector_counts))
+        quotas = {sector: min(count, floor) for sector, count in sector_counts.items()}
+        remaining = self.max_items - sum(quotas.values())
+        spare = {sector: count - quotas[sector] for sector, count in sector_counts.items()}
+        spare_total = sum(spare.values())
+        for sector, count in spare.items():
+            quotas[sector] += min(count, remaining * count // spare_total) if spare_total else 0
+        return quotas
+
+    def select(self, news_items: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """Split scored items into (selected for the LLM, best first) and (deferred, best first)."""
+        for news_item in news_items:
+            news_item.setdefault('priority', priority_score(news_item))
+        eligible = [n for n in news_items if n['priority'] >= self.min_score]
+        if len(eligible) <= self.max_items:
+            selected = top_k(eligible, len(eligible))
+        else:
+            by_sector = {}
+            for news_item in eligible:
+                by_sector.setdefault(classify_sector(news_item, self.sector_keywords), []).append(news_item)
+            quotas = self.allocate({sector: len(items) for sector, items in by_sector.items()})
+            chosen = {id(n) for sector, items in by_sector.items() for n in top_k(items, quotas[sector])}
+            leftovers = [n for n in eligible if id(n) not in chosen]
+            chosen.update(id(n) for n in top_k(leftovers, self.max_items - len(chosen)))
+            selected = top_k([n for n in eligible if id(n) in chosen], len(chosen))
+
+        chosen = {id(n) for n in selected}
+        deferred = top_k([n for n in news_items if id(n) not in chosen], len(news_items) - len(selected))
+        return selected, deferred
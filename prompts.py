@@ -0,0 +1,309 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from dataclasses import dataclass
+from typing import List, Dict, Optional
+
+import requests
+
+from insight_schema import schema_prompt
+from token_budget import count_tokens, count_message_tokens, cached_tokens, CACHE_DISCOUNT, MESSAGE_OVERHEAD_TOKENS
+
+logger = logging.getLogger(__name__)
+
+ANALYST_ROLE = "You are a senior financial analyst. Provide concise, actionable trading insights."
+
+INSIGHTS_TASK = ("Extract structured insights from the news batch in the user message. "
+                 "Focus on specific companies, sectors, and actionable information.")
+
+INSIGHTS_FORMAT = """Extract and organize in EXACTLY this format:
+
+**Key Sector Trends** 🌍📈
+- List sector-specific developments with company names and concrete details
+- Include actual numbers and percentages where available
+- Focus on market-moving news
+
+**Buy/Sell Opportunities** 💰🔍
+- Buy: List specific stocks with clear reasoning and target prices
+- Sell/Avoid: List stocks to avoid with specific reasons
+- Include analyst recommendations and technical levels
+
+**Macro Implications** 🏦📉
+- List government policies and regulatory changes
+- Include economic indicators and market sentiment
+- Focus on items affecting overall market direction
+
+**Corporate Actions** 🗓️🏢
+- List earnings results with specific numbers
+- Include dividend announcements and business updates
+- Mention upcoming corporate events
+
+Keep each point concise but include specific company names, figures, and concrete details."""
+
+RECORDS_TASK = "Extract market-relevant facts from the numbered news items in the user message as JSON."
+
+RECORDS_RULES = """Rules:
+- One record per company/action; skip items with no market relevance
+- "source" is the number of the news item the record comes from
+- Copy figures exactly as written (₹ amounts, crore, %, targets)
+- Use "buy"/"sell"/"hold" only for explicit analyst calls or recommendations"""
+
+REPORT_TASK = ("Create a structured report from the news insights in the user message "
+               "in the EXACT format shown below.")
+
+REPORT_FORMAT = """FORMAT YOUR RESPONSE EXACTLY LIKE THIS:
+
+**Key Sector Trends** 🌍📈
+- Sector name: Brief description of trend/development with specific company names and details mentioned in the news
+- Another sector: Description with company names and specific developments
+- Continue for all major sectors with news
+
+**Buy/Sell Opportunities** 💰🔍
+- Buy: List specific stock names with brief reasoning (technical breakouts, earnings, analyst recommendations)
+- Sell/Avoid: List stocks to avoid with reasoning
+- Include specific targets/levels where mentioned
+
+**Macro Implications** 🏦📉
+- List broader economic/policy impacts that affect markets
+- Include government policies, international developments, regulatory changes
+- Focus on items that impact overall market sentiment
+
+**Corporate Actions** 🗓️🏢
+- List specific companies with earnings results, dividend announcements, business updates
+- Include actual numbers (revenue growth %, profit figures, etc.) where available
+- Mention upcoming earnings/events
+
+Use bullet points with clear company names and specific details. Keep each point concise but informative with actual data from the news."""
+
+MOVERS_TASK = ("Write a preliminary 'top movers' note from the highest-priority news items in the user message. "
+               "The full report follows later, so cover only what a trader must know now.")
+
+MOVERS_FORMAT = """FORMAT YOUR RESPONSE EXACTLY LIKE THIS:
+
+**Top Movers** ⚡
+- Company or index: what happened, with the figures from the news, and the likely direction (bullish/bearish)
+
+At most 6 bullets, most market-moving first. No other sections."""
+
+PERSONAL_TASK = ("Write a short personal take for a subscriber from today's analysis. The user message lists what "
+                 "they follow and the insights that concern it; use only those insights.")
+
+PERSONAL_FORMAT = """FORMAT YOUR RESPONSE EXACTLY LIKE THIS:
+
+- What it means for their holdings or sectors, with the figures from the insights
+
+At most 3 bullets. No headings."""
+
+# Static system prompt per task. These must stay byte-identical between calls
+# (no dates, counts or batch numbers) so the provider can reuse its cached prefix.
+PREFIXES = {
+    'insights': f"{ANALYST_ROLE}\n\n{INSIGHTS_TASK}\n\n{INSIGHTS_FORMAT}",
+    'records': f"{ANALYST_ROLE}\n\n{RECORDS_TASK}\n\n{schema_prompt()}\n\n{RECORDS_RULES}",
+    'report': f"{ANALYST_ROLE}\n\n{REPORT_TASK}\n\n{REPORT_FORMAT}",
+    'movers': f"{ANALYST_ROLE}\n\n{MOVERS_TASK}\n\n{MOVERS_FORMAT}",
+    'personal': f"{ANALYST_ROLE}\n\n{PERSONAL_TASK}\n\n{PERSONAL_FORMAT}",
+    'custom': ANALYST_ROLE,
+}
+
+
+@dataclass
+class Prompt:
+    """A chat prompt split into a static prefix (system message) and the per-call content (user message)."""
+    prefix: str
+    content: str
+
+    def messages(self) -> List[Dict]:
+        return [{"role": "system", "content": self.prefix}, {"role": "user", "content": self.content}]
+
+    def tokens(self, model: Optional[str] = None) -> int:
+        return count_message_tokens(self.messages(), model)
+
+
+def format_news_line(index: int, news: Dict) -> str:
+    """Format a single news item as one prompt line."""
+    headline = news.get('headline', '')[:80]
+    if news.get('new_developments'):
+        # Follow-up to a known story: only what the earlier coverage did not say
+        description = news['new_developments'][:300]
+    elif news.get('summary'):
+        # Extractive summary of the item (or its duplicate cluster), already within its token target
+        description = news['summary']
+    elif news.get('body_summary'):
+        # Enriched items carry a compressed article summary that is worth a few more tokens
+        description = news['body_summary'][:300]
+    else:
+        description = news.get('description', '')[:100]
+    if news.get('cluster_size', 1) > 1:
+        description += f" [{news['cluster_size']} reports]"
+    if news.get('thread_status') == 'follow_up':
+        description += f" [follow-up to: {news['thread_headline'][:60]}]"
+    return f"{index}. {headline} - {description}\n"
+
+
+def format_batch(news_items: List[Dict]) -> str:
+    return "".join(format_news_line(i, news) for i, news in enumerate(news_items, 1))
+
+
+def insights_prompt(news_summary: str, batch_num: int, total_batches: int) -> Prompt:
+    """total_batches is 0 when it is not known yet (streaming pipeline)."""
+    label = f"{batch_num}/{total_batches}" if total_batches else f"{batch_num}"
+    return Prompt(PREFIXES['insights'], f"NEWS BATCH {label}:\n{news_summary}")
+
+
+def records_prompt(news_summary: str) -> Prompt:
+    return Prompt(PREFIXES['records'], f"NEWS ITEMS:\n{news_summary}")
+
+
+def report_prompt(all_insights: str, sector_text: str, total_items: int) -> Prompt:
+    return Prompt(PREFIXES['report'], f"SECTOR DISTRIBUTION: {sector_text}\nTOTAL NEWS ANALYZED: {total_items}\n\n"
+                                      f"ALL BATCH INSIGHTS:\n{all_insights}")
+
+
+def movers_prompt(news_summary: str) -> Prompt:
+    return Prompt(PREFIXES['movers'], f"TOP NEWS ITEMS:\n{news_summary}")
+
+
+def personal_prompt(profile: str, insights: str) -> Prompt:
+    return Prompt(PREFIXES['personal'], f"FOLLOWS: {profile}\n\nRELEVANT INSIGHTS:\n{insights}")
+
+
+def legacy_prompt(task: str, prompt: Prompt) -> Prompt:
+    """The same prompt in the old layout (short system message, variable data before the instructions).
+
+    Only used by the benchmark, as the baseline.
+    """
+    if task == 'insights':
+        content = f"{INSIGHTS_TASK}\n\n{prompt.content}\n\n{INSIGHTS_FORMAT}"
+    elif task == 'records':
+        content = f"{RECORDS_TASK}\n\n{schema_prompt()}\n\n{RECORDS_RULES}\n\n{prompt.content}"
+    else:
+        header, insights = prompt.content.split("\n\n", 1)
+        content = f"{ANALYST_ROLE} {REPORT_TASK}\n\n{header}\n\n{insights}\n\n{REPORT_FORMAT}"
+    return Prompt(ANALYST_ROLE, content)
+
+
+def shared_prefix_tokens(a: Prompt, b: Prompt, model: Optional[str] = None) -> int:
+    """Tokens of the longest common prefix of two prompts, as the provider serialises them."""
+    text_a = "\x00".join(m["content"] for m in a.messages())
+    text_b = "\x00".join(m["content"] for m in b.messages())
+    n = 0
+    for x, y in zip(text_a, text_b):
+        if x != y:
+            break
+        n += 1
+    return count_tokens(text_a[:n].replace("\x00", ""), model) + (MESSAGE_OVERHEAD_TOKENS if n else 0)
+
+
+def simulate_cache(prompts: List[Prompt], model: Optional[str] = None, min_cached: int = 0,
+                   block: int = 1) -> Dict:
+    """Input tokens a prefix-caching provider would bill for this call sequence.
+
+    Each call is served from the longest prefix it shares with an earlier
+    call, rounded down to `block` tokens and only once it reaches `min_cached`.
+    """
+    total = cached = 0
+    for i, prompt in enumerate(prompts):
+        tokens = prompt.tokens(model)
+        hit = max((shared_prefix_tokens(prompt, earlier, model) for earlier in prompts[:i]), default=0)
+        hit = min(tokens, hit // block * block)
+        if hit < min_cached:
+            hit = 0
+        total += tokens
+        cached += hit
+    return {'calls': len(prompts), 'input_tokens': total, 'cached_tokens': cached,
+            'billed_tokens': total - cached * CACHE_DISCOUNT}
+
+
+def measure_call(url: str, headers: Dict, payload: Dict, timeout: float = 60) -> Dict:
+    """Time to first token of one streamed completion, with the provider's usage figures."""
+    body = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+    start = time.perf_counter()
+    first = None
+    usage = {}
+    with requests.post(url, headers=headers, json=body, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        if not response.headers.get('Content-Type', '').startswith('text/event-stream'):
+            # Endpoint ignored "stream": the whole body is the first token
+            usage = response.json().get('usage') or {}
+            first = time.perf_counter()
+        else:
+            for line in response.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                chunk = json.loads(data)
+                if first is None and any(c.get('delta', {}).get('content') for c in chunk.get('choices', [])):
+                    first = time.perf_counter()
+                usage = chunk.get('usage') or chunk.get('x_groq', {}).get('usage') or usage
+    return {'ttft': (first or time.perf_counter()) - start, 'prompt_tokens': usage.get('prompt_tokens', 0),
+            'cached_tokens': cached_tokens(usage)}
+
+
+def benchmark_prompts(news_items: List[Dict], batch_size: int = 15, max_batches: int = 16) -> Dict[str, List]:
+    """(task, Prompt) call sequences of one run, free-form and JSON-records paths, in the new layout."""
+    batches = [news_items[i:i + batch_size] for i in range(0, len(news_items), batch_size)][:max_batches]
+    summaries = [format_batch(batch) for batch in batches]
+    # Stand-in for the batch outputs the report call consolidates
+    insights = "\n\n".join(f"BATCH {i} INSIGHTS:\n{s[:1500]}" for i, s in enumerate(summaries, 1))
+    report = ('report', report_prompt(insights, "Banking(12), Technology(9), General(40)", len(news_items)))
+    return {
+        'free-form': [('insights', insights_prompt(s, i, len(batches))) for i, s in enumerate(summaries, 1)] + [report],
+        'records': [('records', records_prompt(s)) for s in summaries] + [report],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the old and cache-friendly prompt layouts")
+    parser.add_argument('--model', default="meta-llama/llama-4-scout-17b-16e-instruct")
+    parser.add_argument('--min-cached', type=int, default=0,
+                        help="Smallest prefix the provider caches, in tokens (1024 for OpenAI-style caches)")
+    parser.add_argument('--block', type=int, default=1, help="Cache granularity in tokens (128 for OpenAI-style)")
+    parser.add_argument('--live', action='store_true',
+                        help="Also send every call (max_tokens=16) and report TTFT and provider-cached tokens")
+    parser.add_argument('--url', default="https://api.groq.com/openai/v1/chat/completions")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    from storage import find_snapshots, read_json
+    from sources import dedup_items
+    from entity_extractor import EntityExtractor
+    from prioritizer import prioritize
+
+    snapshots = find_snapshots()
+    if not snapshots:
+        print("No archived snapshots to build prompts from")
+        return
+    news_items = prioritize(EntityExtractor().annotate(dedup_items(read_json(snapshots[-1]))))
+    headers = {}
+    if args.live:
+        from dotenv import load_dotenv
+        load_dotenv()
+        headers = {"Authorization": f"Bearer {os.getenv('GROQ_API_KEY', '')}", "Content-Type": "application/json"}
+
+    print(f"{len(news_items)} items from {snapshots[-1]}, cached input billed at {1 - CACHE_DISCOUNT:.0%}")
+    for flow, calls in benchmark_prompts(news_items).items():
+        for layout in ('old', 'new'):
+            prompts = [legacy_prompt(task, p) if layout == 'old' else p for task, p in calls]
+            sim = simulate_cache(prompts, args.model, args.min_cached, args.block)
+            print(f"{flow:>9} {layout}: {sim['calls']} calls, {sim['input_tokens']} input tokens, "
+                  f"{sim['cached_tokens']} cacheable, {sim['billed_tokens']:.0f} billed")
+            if args.live:
+                results = [measure_call(args.url, headers, {"model": args.model, "messages": p.messages(),
+                                                            "max_tokens": 16, "temperature": 0.3})
+                           for p in prompts]
+                ttfts = sorted(r['ttft'] for r in results)
+                print(f"{'':>9} {layout}: TTFT median {ttfts[len(ttfts) // 2] * 1000:.0f} ms, "
+                      f"provider reported {sum(r['cached_tokens'] for r in results)} cached of "
+                      f"{sum(r['prompt_tokens'] for r in results)} prompt tokens")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(0)
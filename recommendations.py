@@ -0,0 +1,362 @@
+import os
+import re
+import sys
+import glob
+import time
+import sqlite3
+import logging
+import argparse
+import tempfile
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+from entity_extractor import EntityExtractor, TARGET_RE, RATING_RE
+from prices import PriceStore, PricePanel, synthetic_store
+from report_renderer import Bullet, parse_report_text
+from sources import IST
+from storage import DATA_DIR, COMPRESSED_SUFFIXES, read_text, strip_suffixes
+
+logger = logging.getLogger(__name__)
+
+LEDGER_DB = os.path.join('data', 'recommendations.db')
+REPORT_PATTERNS = ['zerodha_news_report_*.txt', 'trading_report_*.txt']
+REPORT_NAME_TIMES = [(re.compile(r'\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}'), '%Y-%m-%d_%H-%M-%S'),
+                     (re.compile(r'\d{8}_\d{6}'), '%Y%m%d_%H%M%S')]
+CALL_SECTION = 'Buy/Sell Opportunities'
+HORIZONS = [1, 5, 20]
+
+# "Buy:", "**Sell/Avoid**:", "Hold/Sell:" -> the side of the bullet and of the bullets nested under it
+SIDE_WORDS = r'(?:buy|sell|avoid|hold|accumulate|reduce)'
+SIDE_RE = re.compile(rf'^\W*(?P<side>{SIDE_WORDS}(?:\s*/\s*{SIDE_WORDS})*)\b\W*', re.IGNORECASE)
+SIDES = {'buy': 'buy', 'accumulate': 'buy', 'add': 'buy', 'upgrade': 'buy', 'outperform': 'buy', 'overweight': 'buy',
+         'sell': 'sell', 'avoid': 'sell', 'reduce': 'sell', 'downgrade': 'sell', 'underperform': 'sell',
+         'underweight': 'sell', 'hold': 'hold', 'neutral': 'hold'}
+# "downgraded to 'Hold'", "upgrades Infosys to buy": the new rating, not the direction, is the call
+RATING_CHANGE_RE = re.compile(r'\b(?:up|down)grad(?:e|ed|es|ing)\s+(?:[\w&.-]+\s+){0,3}?to\s+[\'‘"]?'
+                              r'(?P<to>buy|sell|hold|neutral|reduce|add|accumulate|outperform|underperform|'
+                              r'overweight|underweight)\b', re.IGNORECASE)
+NO_CALL_RE = re.compile(r'^\W*(?:none|no|nothing)\b', re.IGNORECASE)
+LEADING_NAME_RE = re.compile(r'^\W*(?P<name>[A-Za-z][\w&.\' -]*?)\s*(?:[:(\-–]|$)')
+SIGN = {'buy': 1.0, 'sell': -1.0}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    report TEXT PRIMARY KEY,
+    path TEXT,
+    generated INTEGER,
+    calls INTEGER
+);
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY,
+    report TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    ticker TEXT NOT NULL,
+    side TEXT NOT NULL,
+    target REAL,
+    resolved INTEGER NOT NULL,
+    text TEXT,
+    UNIQUE (report, ticker, side)
+);
+CREATE INDEX IF NOT EXISTS calls_ticker_ts ON calls (ticker, ts);
+CREATE INDEX IF NOT EXISTS calls_ts ON calls (ts);
+"""
+
+
+def report_paths(data_dir: str = DATA_DIR) -> List[str]:
+    """Saved reports, plain or compressed, oldest name first."""
+    paths = []
+    for pattern in REPORT_PATTERNS:
+        for suffix in ('',) + COMPRESSED_SUFFIXES:
+            paths += glob.glob(os.path.join(data_dir, pattern + suffix))
+    return sorted(paths)
+
+
+def report_time(path: str, generated: str) -> int:
+    """Epoch seconds a report was generated (IST), from its header or else its file name."""
+    try:
+        return int(datetime.strptime(generated, '%Y-%m-%d %H:%M:%S').replace(tzinfo=IST).timestamp())
+    except ValueError:
+        pass
+    name = os.path.basename(path)
+    for pattern, fmt in REPORT_NAME_TIMES:
+        match = pattern.search(name)
+        if match:
+            return int(datetime.strptime(match.group(0), fmt).replace(tzinfo=IST).timestamp())
+    return int(os.path.getmtime(path))
+
+
+def rating_side(text: str) -> Optional[str]:
+    """The side a rating in the text implies: the new rating of a change, else the rating word."""
+    change = RATING_CHANGE_RE.search(text)
+    if change:
+        return SIDES[change.group('to').lower()]
+    rating = RATING_RE.search(text)
+    if rating is None:
+        return None
+    return SIDES.get((rating.group('change') or rating.group('quoted') or rating.group('call')).lower())
+
+
+def _target(text: str) -> Optional[float]:
+    match = TARGET_RE.search(text)
+    return float(match.group('value').replace(',', '')) if match else None
+
+
+def parse_calls(bullets: List[Bullet], extractor: EntityExtractor) -> List[Dict]:
+    """Structured calls from the bullets of a Buy/Sell section.
+
+    A bullet's side comes from its own "Buy:"/"Sell:" prefix, from the
+    nearest such bullet above it at a lower nesting level, or from a rating
+    in its text ("'buy' rating", "downgrade"). Bullets with no side are not
+    calls. A target price is kept only when the bullet names one company.
+    """
+    calls = []
+    context = []  # (level, side) of the enclosing "Buy:"/"Sell:" bullets
+    for bullet in bullets:
+        text = bullet.text.replace('**', '')
+        while context and context[-1][0] >= bullet.level:
+            context.pop()
+        prefix = SIDE_RE.match(text)
+        if prefix:
+            # A mixed heading takes its most bearish side: "Hold/Sell" is a sell call
+            sides = {SIDES[word.strip()] for word in prefix.group('side').lower().split('/')}
+            side = next(s for s in ('sell', 'hold', 'buy') if s in sides)
+            context.append((bullet.level, side))
+            text = text[prefix.end():]
+        if not text.strip() or NO_CALL_RE.match(text):
+            continue
+        side = context[-1][1] if context else None
+        if not prefix:
+            side = rating_side(text) or side
+        if side is None:
+            continue
+        tickers = extractor.extract(text)['tickers']
+        resolved = bool(tickers)
+        if not tickers:
+            # Unknown company: keep its name as a symbol guess ("NHPC: ..." -> NHPC); add an alias to resolve it
+            match = LEADING_NAME_RE.match(text)
+            if not match:
+                continue
+            tickers = [re.sub(r'[^A-Z0-9&]', '', match.group('name').upper())]
+        target = _target(text) if len(tickers) == 1 else None
+        calls.extend({'ticker': ticker, 'side': side, 'target': target, 'resolved': resolved, 'text': text.strip()}
+                     for ticker in tickers if ticker)
+    return calls
+
+
+class RecommendationLedger:
+    """Buy/Sell calls parsed from saved reports, in SQLite indexed by ticker and time.
+
+    Reports are keyed by name without compression suffix, so a report that
+    retention later gzips is not ingested twice.
+    """
+
+    def __init__(self, db_path: str = LEDGER_DB, extractor: Optional[EntityExtractor] = None):
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        self.extractor = extractor or EntityExtractor()
+
+    def close(self):
+        self.conn.close()
+
+    def ingest(self, paths: List[str], force: bool = False) -> int:
+        """Parse reports not yet in the ledger. Returns the number of calls added."""
+        known = {row['report'] for row in self.conn.execute("SELECT report FROM reports")}
+        added = 0
+        for path in paths:
+            name = strip_suffixes(os.path.basename(path))
+            if name in known and not force:
+                continue
+            try:
+                report = parse_report_text(read_text(path))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping {path}: {e}")
+                continue
+            generated = report_time(path, report.generated)
+            section = report.section(CALL_SECTION)
+            calls = parse_calls(section.bullets, self.extractor) if section else []
+            with self.conn:
+                self.conn.execute("DELETE FROM calls WHERE report = ?", (name,))
+                cursor = self.conn.executemany(
+                    "INSERT OR IGNORE INTO calls (report, ts, ticker, side, target, resolved, text) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(name, generated, c['ticker'], c['side'], c['target'], int(c['resolved']), c['text'])
+                     for c in calls])
+                self.conn.execute("INSERT OR REPLACE INTO reports (report, path, generated, calls) VALUES (?, ?, ?, ?)",
+                                  (name, path, generated, max(cursor.rowcount, 0)))
+            added += max(cursor.rowcount, 0)
+            known.add(name)
+        return added
+
+    def calls(self, ticker: Optional[str] = None, since: Optional[float] = None,
+              until: Optional[float] = None) -> List[Dict]:
+        """Calls matching all given filters, oldest first."""
+        clauses, params = [], []
+        if ticker:
+            clauses.append("ticker = ?")
+            params.append(ticker.upper())
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(int(since))
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(int(until))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return [dict(row) for row in self.conn.execute(f"SELECT * FROM calls {where} ORDER BY ts, id", params)]
+
+    def arrays(self, sides: Tuple[str, ...] = ('buy', 'sell')) -> Dict[str, np.ndarray]:
+        """Columns of the scoreable calls, for the backtester. Hold calls have no direction to score."""
+        unknown = set(sides) - set(SIGN)
+        if unknown:
+            raise ValueError(f"Only buy and sell calls can be backtested, not {', '.join(sorted(unknown))}")
+        rows = self.conn.execute(f"SELECT id, ts, ticker, side, target FROM calls WHERE side IN "
+                                 f"({', '.join('?' * len(sides))}) ORDER BY ts, id", sides).fetchall()
+        return {'id': np.array([r['id'] for r in rows], dtype=np.int64),
+                'ts': np.array([r['ts'] for r in rows], dtype=np.int64),
+                'ticker': np.array([r['ticker'] for r in rows], dtype=object),
+                'sign': np.array([SIGN[r['side']] for r in rows]),
+                'target': np.array([np.nan if r['target'] is None else r['target'] for r in rows])}
+
+    def stats(self) -> Dict:
+        row = self.conn.execute("SELECT COUNT(*) AS calls, COUNT(DISTINCT ticker) AS tickers, "
+                                "SUM(resolved) AS resolved, SUM(target IS NOT NULL) AS targets FROM calls").fetchone()
+        return {'reports': self.conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0],
+                **{key: row[key] or 0 for key in row.keys()}}
+
+
+def dedupe(calls: Dict[str, np.ndarray], days: float) -> Dict[str, np.ndarray]:
+    """Drop calls that repeat a ticker and side within `days` of the previous such call.
+
+    Consecutive reports restate the same calls, which would otherwise be
+    counted once per report.
+    """
+    if days <= 0 or not len(calls['ts']):
+        return calls
+    order = np.lexsort((calls['ts'], calls['sign'], calls['ticker'].astype(str)))
+    ticker, sign, ts = calls['ticker'][order], calls['sign'][order], calls['ts'][order]
+    same = np.zeros(len(order), dtype=bool)
+    same[1:] = (ticker[1:] == ticker[:-1]) & (sign[1:] == sign[:-1]) & (ts[1:] - ts[:-1] < days * 86400)
+    keep = np.sort(order[~same])
+    return {key: values[keep] for key, values in calls.items()}
+
+
+def backtest(panel: PricePanel, calls: Dict[str, np.ndarray], horizons: List[int] = HORIZONS) -> Dict[int, Dict]:
+    """Signed returns of every call over each horizon (in bars), all calls at once.
+
+    A call is entered at the close of the first bar at or after its report,
+    so nothing the report could not have known is used. Sell calls score the
+    fall in price. Excess return nets out the market over the same bars, and
+    a target counts as hit when the high (buys) or low (sells) reaches it
+    within the horizon.
+    """
+    longest = max(horizons)
+    pos, ranks, found = panel.locate(list(calls['ticker']), calls['ts'])
+    closes = panel.window(panel.close, pos, ranks, found, np.arange(longest + 1))
+    highs = panel.window(panel.high, pos, ranks, found, np.arange(1, longest + 1))
+    lows = panel.window(panel.low, pos, ranks, found, np.arange(1, longest + 1))
+    market = panel.window(panel.market_returns, pos, ranks, found, np.arange(1, longest + 1))
+    # Running best high/low and market growth, so each horizon is one column lookup
+    best_high = np.maximum.accumulate(np.where(np.isfinite(highs), highs, -np.inf), axis=1)
+    best_low = np.minimum.accumulate(np.where(np.isfinite(lows), lows, np.inf), axis=1)
+    market_growth = np.cumprod(1 + market, axis=1)
+    sign, target = calls['sign'], calls['target']
+    results = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for h in horizons:
+            raw = closes[:, h] / closes[:, 0] - 1
+            reached = np.where(sign > 0, best_high[:, h - 1] >= target, best_low[:, h - 1] <= target)
+            results[h] = {'return': sign * raw, 'excess': sign * (raw - (market_growth[:, h - 1] - 1)),
+                          'target_hit': np.where(np.isfinite(target) & np.isfinite(raw), reached, np.nan)}
+    return results
+
+
+def summarize(results: Dict[int, Dict]) -> List[Dict]:
+    rows = []
+    for h, r in results.items():
+        measured = np.isfinite(r['return'])
+        excess = r['excess'][np.isfinite(r['excess'])]
+        targets = r['target_hit'][np.isfinite(r['target_hit'])]
+        rows.append({'horizon': h, 'measured': int(measured.sum()),
+                     'hit_rate': float((r['return'][measured] > 0).mean()) if measured.any() else float('nan'),
+                     'mean_return': float(r['return'][measured].mean()) if measured.any() else float('nan'),
+                     'mean_excess': float(excess.mean()) if len(excess) else float('nan'),
+                     'targets': len(targets), 'target_rate': float(targets.mean()) if len(targets) else float('nan')})
+    return rows
+
+
+def print_summary(rows: List[Dict], calls: int):
+    for row in rows:
+        targets = f", targets hit {row['target_rate']:.0%} of {row['targets']}" if row['targets'] else ""
+        print(f"  {row['horizon']:>3} bars: {row['measured']}/{calls} calls priced, hit rate {row['hit_rate']:.0%}, "
+              f"mean {row['mean_return']:+.2%}, vs market {row['mean_excess']:+.2%}{targets}")
+
+
+def benchmark(calls: int = 100_000, symbols: int = 500, bars: int = 2500) -> Dict:
+    """Time a backtest of synthetic calls over synthetic prices."""
+    with tempfile.TemporaryDirectory() as store_dir:
+        store = synthetic_store(store_dir, symbols, bars)
+        rng = np.random.default_rng(50)
+        first, last = store.manifest['symbols']['NIFTY']['first'], store.manifest['symbols']['NIFTY']['last']
+        arrays = {'id': np.arange(calls), 'ts': rng.integers(first, last, calls),
+                  'ticker': np.array([f"SYM{i:04d}" for i in rng.integers(0, symbols, calls)], dtype=object),
+                  'sign': rng.choice([1.0, -1.0], calls), 'target': np.full(calls, np.nan)}
+        start = time.perf_counter()
+        arrays = dedupe(arrays, 1)
+        panel = PricePanel(PriceStore(store_dir), list(arrays['ticker']), market='NIFTY')
+        rows = summarize(backtest(panel, arrays))
+        seconds = time.perf_counter() - start
+    return {'calls': len(arrays['id']), 'seconds': seconds, 'rows': rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ledger and backtest of the reports' Buy/Sell calls")
+    parser.add_argument('--rebuild', action='store_true', help="Re-parse every report, not just new ones")
+    parser.add_argument('--stock', help="List the calls for one ticker")
+    parser.add_argument('--horizons', type=int, nargs='+', default=HORIZONS, help="Holding periods in bars")
+    parser.add_argument('--market', default=os.getenv('PRICE_MARKET_SYMBOL', 'NIFTY'))
+    parser.add_argument('--dedupe-days', type=float, default=1.0,
+                        help="Count a repeated ticker/side call once within this many days (0 keeps all)")
+    parser.add_argument('--benchmark', action='store_true', help="Time a backtest of 100k synthetic calls")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.benchmark:
+        r = benchmark()
+        print(f"{r['calls']} synthetic calls backtested in {r['seconds']:.2f}s")
+        print_summary(r['rows'], r['calls'])
+        return
+
+    ledger = RecommendationLedger()
+    added = ledger.ingest(report_paths(), force=args.rebuild)
+    stats = ledger.stats()
+    print(f"📒 {added} new calls; ledger holds {stats['calls']} calls on {stats['tickers']} tickers from "
+          f"{stats['reports']} reports ({stats['resolved']} resolved to known symbols, {stats['targets']} with targets)")
+    if args.stock:
+        for call in ledger.calls(args.stock):
+            when = datetime.fromtimestamp(call['ts'], IST).strftime('%Y-%m-%d %H:%M')
+            target = f" → ₹{call['target']:g}" if call['target'] else ""
+            print(f"  [{when}] {call['side'].upper():<4} {call['ticker']}{target}: {call['text'][:100]}")
+        ledger.close()
+        return
+
+    calls = dedupe(ledger.arrays(), args.dedupe_days)
+    ledger.close()
+    store = PriceStore()
+    if not store.symbols:
+        print("No prices to backtest against; import OHLC files with `python prices.py --import`")
+        return
+    start = time.perf_counter()
+    panel = PricePanel(store, list(calls['ticker']), market=args.market)
+    rows = summarize(backtest(panel, calls, args.horizons))
+    print(f"\n📈 Backtest of {len(calls['id'])} buy/sell calls ({time.perf_counter() - start:.2f}s):")
+    print_summary(rows, len(calls['id']))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,296 @@
+import re
+import html
+from dataclasses import dataclass, field
+from datetime import datetime
+from string import Template
+from typing import List, Dict, Optional
+
+# Telegram caps messages at 4096 characters; UTF-8 bytes are always >= characters
+TELEGRAM_MAX_BYTES = 4000
+
+# Report sections in display order, with their emoji suffixes
+SECTION_EMOJIS = {
+    'Your Watchlist': '🎯',
+    'Top Movers': '⚡',
+    'What Changed': '🔄',
+    'Developing Stories': '🧵',
+    'Key Sector Trends': '🌍📈',
+    'Buy/Sell Opportunities': '💰🔍',
+    'Macro Implications': '🏦📉',
+    'Corporate Actions': '🗓️🏢',
+    'Other News': '📰',
+}
+
+HEADER_RE = re.compile(r'^(?:[*-]\s+)?\*\*(?P<title>[^*]+?)\*\*:?\s*(?P<rest>.*)$')
+# "### Buy/Sell Opportunities 💰🔍": Markdown headings, with the trailing emoji split off
+MD_HEADER_RE = re.compile(r'^#{2,6}\s+(?P<title>[^#]+?):?\s*(?P<rest>[^\x00-\x7F\s]*)$')
+EMPTY_SECTION_TEXT = 'No specific insights for this section'
+BULLET_RE = re.compile(r'^(?P<indent>\s*)(?:[-*+•]|\d+\.)\s+(?P<text>.*)$')
+BOLD_RE = re.compile(r'\*\*(.+?)\*\*')
+BOX_CHARS = ('╔', '║', '╚')
+HTML_TAG_RE = re.compile(r'<(?P<close>/?)(?P<name>[a-z]+)[^>]*>', re.IGNORECASE)
+TAG_RESERVE_BYTES = 64  # room for the closing tags appended to a split line
+
+TEXT_TEMPLATE = Template("""
+╔══════════════════════════════════════════════════════════════════╗
+║                📈 STRUCTURED FINANCIAL NEWS REPORT 📈            ║
+║                        $generated                      ║
+╚══════════════════════════════════════════════════════════════════╝
+
+📊 **Analysis Summary**: $summary
+
+$sections
+
+📌 *$footer*
+""")
+TEXT_SECTION = Template("**$title** $emoji\n$bullets")
+HTML_HEADER = Template("<b>📊 FINANCIAL NEWS REPORT</b>\n<b>Generated:</b> $generated\n\n$summary")
+HTML_SECTION = Template("<b>$title</b> $emoji\n$bullets")
+HTML_PART = Template("<b>📊 Financial News Report (Part $part/$total)</b>\n\n$body")
+MARKDOWN_TEMPLATE = Template("# 📈 Structured Financial News Report\n\n_${generated}_\n\n"
+                             "📊 **Analysis Summary**: $summary\n\n$sections\n\n> $footer\n")
+MARKDOWN_SECTION = Template("## $title $emoji\n\n$bullets")
+
+
+@dataclass
+class Bullet:
+    text: str
+    level: int = 0
+
+
+@dataclass
+class Section:
+    title: str
+    emoji: str = ''
+    bullets: List[Bullet] = field(default_factory=list)
+
+
+@dataclass
+class Report:
+    generated: str
+    summary: str
+    sections: List[Section] = field(default_factory=list)
+    footer: str = ''
+
+    def section(self, title: str) -> Optional[Section]:
+        """Find a section by title (case-insensitive)."""
+        for section in self.sections:
+            if section.title.lower() == title.lower():
+                return section
+        return None
+
+
+def parse_sections(markdown: str) -> List[Section]:
+    """Parse LLM or saved-report Markdown into sections of bullets.
+
+    A title that appears twice (e.g. in a report whose model output nested a
+    second copy of the format) is one section with the bullets of both.
+    """
+    sections = {}
+    current = None
+    for raw_line in markdown.splitlines():
+        line = raw_line.rstrip()
+        stripped = line.strip()
+        if not stripped or stripped.startswith(BOX_CHARS) or stripped.startswith('📌') \
+                or stripped.startswith('📊 **Analysis Summary**'):
+            continue
+
+        header = HEADER_RE.match(stripped) or MD_HEADER_RE.match(stripped)
+        # Top-level "**Title**" lines start a section; "- **Buy**:" inside one is a bullet
+        if header and (not BULLET_RE.match(line) or header.group('title').strip() in SECTION_EMOJIS):
+            title = header.group('title').strip().rstrip(':')
+            current = sections.setdefault(title, Section(title=title, emoji=SECTION_EMOJIS.get(
+                title, header.group('rest').strip())))
+            continue
+
+        if current is None:
+            current = sections.setdefault('Highlights', Section(title='Highlights'))
+
+        bullet = BULLET_RE.match(line)
+        if bullet:
+            level = len(bullet.group('indent').expandtabs(4)) // 2
+            current.bullets.append(Bullet(bullet.group('text').strip(), min(level, 2)))
+        else:
+            current.bullets.append(Bullet(stripped))
+
+    for section in sections.values():
+        # Placeholders only stay when the section has nothing else
+        section.bullets = [b for b in section.bullets if b.text != EMPTY_SECTION_TEXT] or section.bullets
+    return [s for s in sections.values() if s.bullets]
+
+
+def build_report(results: Dict, generated: Optional[str] = None) -> Report:
+    """Build the report model once from analysis results."""
+    sector_text = " | ".join(f"{sector.title()}: {count}"
+                             for sector, count in results['sector_summary'].items() if count > 0)
+    report = Report(
+        generated=generated or datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        summary=f"{results['total_news_items']} news items analyzed across sectors: {sector_text}",
+        sections=parse_sections(results['final_report']),
+        footer=f"Note: Analysis based on {results['total_news_items']} items processed through "
+               f"{results['api_calls_used']} AI analysis calls for comprehensive coverage.",
+    )
+
+    # Sections built locally (without the LLM) are merged into their LLM counterparts
+    for title, bullets in results.get('local_sections', {}).items():
+        if not bullets:
+            continue
+        section = report.section(title)
+        if section is None:
+            section = Section(title=title, emoji=SECTION_EMOJIS.get(title, ''))
+            order = list(SECTION_EMOJIS)
+            rank = order.index(title) if title in order else len(order)
+            position = next((i for i, s in enumerate(report.sections)
+                             if s.title in order and order.index(s.title) > rank), len(report.sections))
+            report.sections.insert(position, section)
+        section.bullets.extend(Bullet(text) for text in bullets)
+    return report
+
+
+def parse_report_text(text: str) -> Report:
+    """Rebuild a report model from a saved text report."""
+    generated = ''
+    summary = ''
+    footer = ''
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('║') and not generated:
+            match = re.search(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}', stripped)
+            generated = match.group(0) if match else ''
+        elif stripped.startswith('📊 **Analysis Summary**:'):
+            summary = stripped.split(':', 1)[1].strip()
+        elif stripped.startswith('📌'):
+            footer = stripped.lstrip('📌 ').strip('*')
+    return Report(generated=generated, summary=summary, sections=parse_sections(text), footer=footer)
+
+
+def _indent(level: int, marker: str) -> str:
+    return '  ' * level + marker
+
+
+def render_text(report: Report) -> str:
+    """Render the boxed plain-text report saved under data/."""
+    sections = "\n\n".join(
+        TEXT_SECTION.substitute(
+            title=s.title, emoji=s.emoji,
+            bullets="\n".join(f"{_indent(b.level, '-')} {b.text}" for b in s.bullets))
+        for s in report.sections)
+    return TEXT_TEMPLATE.substitute(generated=report.generated, summary=report.summary,
+                                    sections=sections, footer=report.footer)
+
+
+def _html_inline(text: str) -> str:
+    return BOLD_RE.sub(r'<b>\1</b>', html.escape(text, quote=False))
+
+
+def render_html_blocks(report: Report) -> List[str]:
+    """Render the report as Telegram HTML, one block per section."""
+    blocks = [HTML_HEADER.substitute(generated=html.escape(report.generated),
+                                     summary=_html_inline(report.summary))]
+    for s in report.sections:
+        bullets = "\n".join(f"{_indent(b.level, '•' if b.level == 0 else '◦')} {_html_inline(b.text)}"
+                            for b in s.bullets)
+        blocks.append(HTML_SECTION.substitute(title=html.escape(s.title.upper()), emoji=s.emoji, bullets=bullets))
+    if report.footer:
+        blocks.append(f"<i>{html.escape(report.footer)}</i>")
+    return blocks
+
+
+def render_markdown(report: Report) -> str:
+    """Render the report as GitHub-flavoured Markdown."""
+    sections = "\n\n".join(
+        MARKDOWN_SECTION.substitute(
+            title=s.title, emoji=s.emoji,
+            bullets="\n".join(f"{_indent(b.level, '-')} {b.text}" for b in s.bullets))
+        for s in report.sections)
+    return MARKDOWN_TEMPLATE.substitute(generated=report.generated, summary=report.summary,
+                                        sections=sections, footer=report.footer)
+
+
+def _byte_len(text: str) -> int:
+    return len(text.encode('utf-8'))
+
+
+def _utf8_prefix(text: str, max_bytes: int) -> int:
+    """Length in characters of the longest prefix of text that fits max_bytes in UTF-8."""
+    encoded = text.encode('utf-8')[:max_bytes]
+    return len(encoded.decode('utf-8', errors='ignore'))
+
+
+def split_long_line(line: str, max_bytes: int) -> List[str]:
+    """Split one line over max_bytes into parts that each fit, preferring spaces.
+
+    Cuts fall on UTF-8 character boundaries and never inside an HTML tag or
+    entity; tags still open at a cut are closed there and reopened in the
+    next part, so every part is valid Telegram HTML on its own.
+    """
+    parts = []
+    limit = max(1, max_bytes - min(TAG_RESERVE_BYTES, max_bytes // 2))
+    while _byte_len(line) > max_bytes:
+        cut = _utf8_prefix(line, limit)
+        head = line[:cut]
+        # Back off out of a tag or entity the cut fell into
+        for opener, closer in (('<', '>'), ('&', ';')):
+            start = head.rfind(opener)
+            if start > head.rfind(closer):
+                cut = start
+        space = line.rfind(' ', 0, cut)
+        if space > cut // 2:
+            cut = space + 1
+        if cut == 0:
+            cut = _utf8_prefix(line, limit) or 1
+        head = line[:cut]
+        open_tags = []
+        for match in HTML_TAG_RE.finditer(head):
+            if not match.group('close'):
+                open_tags.append((match.group('name').lower(), match.group(0)))
+            elif open_tags and open_tags[-1][0] == match.group('name').lower():
+                open_tags.pop()
+        parts.append(head.rstrip() + ''.join(f"</{name}>" for name, _ in reversed(open_tags)))
+        line = ''.join(tag for _, tag in open_tags) + line[cut:]
+    parts.append(line)
+    return parts
+
+
+def chunk_blocks(blocks: List[str], max_bytes: int = TELEGRAM_MAX_BYTES, separator: str = "\n\n") -> List[str]:
+    """Pack rendered blocks into chunks that stay under max_bytes when encoded."""
+    sep_len = _byte_len(separator)
+    pieces = []
+    for block in blocks:
+        if _byte_len(block) <= max_bytes:
+            pieces.append(block)
+            continue
+        # Oversized section: fall back to line boundaries
+        line_chunk, size = [], 0
+        lines = [part for line in block.split("\n") for part in
+                 (split_long_line(line, max_bytes) if _byte_len(line) > max_bytes else [line])]
+        for line in lines:
+            line_len = _byte_len(line) + 1
+            if line_chunk and size + line_len > max_bytes:
+                pieces.append("\n".join(line_chunk))
+                line_chunk, size = [], 0
+            line_chunk.append(line)
+            size += line_len
+        if line_chunk:
+            pieces.append("\n".join(line_chunk))
+
+    chunks, current, size = [], [], 0
+    for piece in pieces:
+        piece_len = _byte_len(piece)
+        if current and size + sep_len + piece_len > max_bytes:
+            chunks.append(separator.join(current))
+            current, size = [], 0
+        size += piece_len + (sep_len if current else 0)
+        current.append(piece)
+    if current:
+        chunks.append(separator.join(current))
+    return chunks
+
+
+def render_telegram_messages(report: Report, max_bytes: int = TELEGRAM_MAX_BYTES) -> List[str]:
+    """Render the report as ready-to-send Telegram HTML messages."""
+    header_reserve = _byte_len(HTML_PART.substitute(part=99, total=99, body=''))
+    chunks = chunk_blocks(render_html_blocks(report), max_bytes - header_reserve)
+    if len(chunks) == 1:
+        return chunks
+    return [HTML_PART.substitute(part=i, total=len(chunks), body=chunk) for i, chunk in enumerate(chunks, 1)]
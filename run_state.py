@@ -0,0 +1,74 @@
+import os
+import json
+import time
+import shutil
+import logging
+from datetime import datetime
+from typing import List, Optional, Any
+
+from storage import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+RUNS_DIR = os.path.join('data', 'runs')
+COMPLETE_MARKER = 'COMPLETE'
+
+
+class RunState:
+    """Durable per-stage checkpoints of one pipeline run, under data/runs/<run_id>/.
+
+    Each stage is one JSON file written atomically (temp file + rename), so a
+    crash leaves either the previous checkpoint or the new one, never half a
+    file. A run is complete once mark_complete() writes its marker.
+    """
+
+    def __init__(self, run_id: Optional[str] = None, runs_dir: str = RUNS_DIR):
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.run_dir = os.path.join(runs_dir, self.run_id)
+        os.makedirs(self.run_dir, exist_ok=True)
+
+    @classmethod
+    def resume_latest(cls, runs_dir: str = RUNS_DIR, max_age_hours: float = 6) -> Optional['RunState']:
+        """The most recent incomplete run, if it started within max_age_hours."""
+        for run_id in sorted(list_runs(runs_dir), reverse=True):
+            run_dir = os.path.join(runs_dir, run_id)
+            if os.path.exists(os.path.join(run_dir, COMPLETE_MARKER)):
+                return None
+            if time.time() - os.path.getmtime(run_dir) > max_age_hours * 3600:
+                return None
+            return cls(run_id, runs_dir)
+        return None
+
+    def _path(self, stage: str) -> str:
+        return os.path.join(self.run_dir, f"{stage}.json")
+
+    def save(self, stage: str, data: Any):
+        atomic_write_json(self._path(stage), data)
+
+    def load(self, stage: str) -> Optional[Any]:
+        try:
+            with open(self._path(stage), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def completed_stages(self) -> List[str]:
+        return sorted(name[:-5] for name in os.listdir(self.run_dir) if name.endswith('.json'))
+
+    def mark_complete(self):
+        with open(os.path.join(self.run_dir, COMPLETE_MARKER), 'w', encoding='utf-8') as f:
+            f.write(datetime.now().isoformat())
+
+
+def list_runs(runs_dir: str = RUNS_DIR) -> List[str]:
+    if not os.path.isdir(runs_dir):
+        return []
+    return [name for name in os.listdir(runs_dir) if os.path.isdir(os.path.join(runs_dir, name))]
+
+
+def prune_runs(runs_dir: str = RUNS_DIR, keep: int = 10):
+    """Delete all but the newest `keep` completed runs."""
+    completed = sorted(run_id for run_id in list_runs(runs_dir)
+                       if os.path.exists(os.path.join(runs_dir, run_id, COMPLETE_MARKER)))
+    for run_id in completed[:-keep] if keep > 0 else completed:
+        shutil.rmtree(os.path.join(runs_dir, run_id), ignore_errors=True)
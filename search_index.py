@@ -0,0 +1,174 @@
+import os
+import re
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+from typing import List, Dict, Optional, Iterable
+
+from storage import read_json, find_snapshots, snapshot_timestamp
+from change_detector import item_key
+
+logger = logging.getLogger(__name__)
+
+SEARCH_DB = os.path.join('data', 'news_index', 'search.db')
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+# Words too common in market news to be useful search terms
+STOP_WORDS = {
+    'the', 'a', 'an', 'of', 'to', 'in', 'on', 'for', 'and', 'or', 'at', 'by', 'with', 'from', 'as',
+    'is', 'are', 'was', 'its', 'after', 'over', 'into', 'up', 'down', 'stock', 'stocks', 'share',
+    'shares', 'market', 'news', 'today', 'india', 'indian', 'q4', 'q3', 'q2', 'q1', 'fy25', 'fy26',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    url TEXT UNIQUE,
+    key TEXT,
+    headline TEXT NOT NULL,
+    description TEXT,
+    source TEXT,
+    time TEXT,
+    indexed_at REAL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+    headline, description, content='articles', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS articles_ai AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts(rowid, headline, description) VALUES (new.id, new.headline, new.description);
+END;
+"""
+KEY_INDEX = "CREATE UNIQUE INDEX IF NOT EXISTS articles_key ON articles(key)"
+
+
+def build_match_query(text: str, max_terms: int = 8) -> str:
+    """Turn free text into an FTS5 OR-query of quoted terms."""
+    terms = []
+    for term in TERM_RE.findall(text.lower()):
+        if len(term) > 1 and term not in STOP_WORDS and term not in terms:
+            terms.append(term)
+    return ' OR '.join(f'"{t}"' for t in terms[:max_terms])
+
+
+class SearchIndex:
+    """BM25-ranked full-text search over archived headlines and descriptions (SQLite FTS5)."""
+
+    def __init__(self, db_path: str = SEARCH_DB):
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self.conn.execute(KEY_INDEX)
+
+    def _migrate(self):
+        """Add item keys to an index built before articles were keyed, dropping URL-less duplicates."""
+        columns = [row['name'] for row in self.conn.execute("PRAGMA table_info(articles)")]
+        if 'key' in columns:
+            return
+        logger.info("Adding item keys to the search index")
+        with self.conn:
+            self.conn.execute("ALTER TABLE articles ADD COLUMN key TEXT")
+            seen = set()
+            for row in self.conn.execute("SELECT id, url, headline, description FROM articles ORDER BY id").fetchall():
+                key = item_key(dict(row))
+                if key in seen:
+                    self.conn.execute("INSERT INTO articles_fts(articles_fts, rowid, headline, description) "
+                                      "VALUES ('delete', ?, ?, ?)", (row['id'], row['headline'], row['description']))
+                    self.conn.execute("DELETE FROM articles WHERE id = ?", (row['id'],))
+                else:
+                    seen.add(key)
+                    self.conn.execute("UPDATE articles SET key = ? WHERE id = ?", (key, row['id']))
+
+    def close(self):
+        self.conn.close()
+
+    def add_items(self, news_items: Iterable[Dict], indexed_at: Optional[float] = None) -> int:
+        """Index new items; stories already present (by item_key) are skipped. Returns the number added."""
+        indexed_at = indexed_at or time.time()
+        rows = [(n.get('url') or None, item_key(n), n.get('headline', ''), n.get('description', ''),
+                 n.get('source', ''), n.get('time', ''), indexed_at)
+                for n in news_items if n.get('headline')]
+        with self.conn:
+            cursor = self.conn.executemany(
+                "INSERT OR IGNORE INTO articles (url, key, headline, description, source, time, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return max(cursor.rowcount, 0)
+
+    def search(self, query: str, limit: int = 10, exclude_url: Optional[str] = None,
+               before: Optional[float] = None) -> List[Dict]:
+        """Ranked matches for a free-text query, best first. Headlines weigh twice descriptions."""
+        match = build_match_query(query)
+        if not match:
+            return []
+        sql = ("SELECT a.*, bm25(articles_fts, 2.0, 1.0) AS score FROM articles_fts "
+               "JOIN articles a ON a.id = articles_fts.rowid WHERE articles_fts MATCH ?")
+        params = [match]
+        if exclude_url:
+            sql += " AND (a.url IS NULL OR a.url != ?)"
+            params.append(exclude_url)
+        if before is not None:
+            sql += " AND a.indexed_at < ?"
+            params.append(before)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+        try:
+            return [dict(row) for row in self.conn.execute(sql, params)]
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Search failed for {query!r}: {e}")
+            return []
+
+    def related(self, news_item: Dict, limit: int = 3, before: Optional[float] = None) -> List[Dict]:
+        """Earlier coverage of the same story/company, for background context."""
+        entities = news_item.get('entities', {})
+        query = ' '.join(entities.get('tickers', [])) + ' ' + news_item.get('headline', '')
+        return self.search(query, limit=limit, exclude_url=news_item.get('url'), before=before)
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+
+def rebuild_search_index(db_path: str = SEARCH_DB) -> SearchIndex:
+    """Rebuild the search index from every archived snapshot."""
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    index = SearchIndex(db_path)
+    for path in find_snapshots():
+        try:
+            news_items = read_json(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping {path}: {e}")
+            continue
+        added = index.add_items(news_items, indexed_at=snapshot_timestamp(path))
+        logger.info(f"Indexed {added} new articles from {path}")
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text search over archived news")
+    parser.add_argument('query', nargs='?', help="Search terms, e.g. 'LIC dividend'")
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--rebuild', action='store_true', help="Rebuild the index from all snapshots")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    index = rebuild_search_index() if args.rebuild else SearchIndex()
+    if not args.query:
+        print(f"{index.count()} articles indexed")
+        return
+
+    start = time.perf_counter()
+    results = index.search(args.query, args.limit)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    for row in results:
+        print(f"{row['score']:7.2f}  [{row['time']}] {row['headline']}\n         {row['url']}")
+    print(f"\n{len(results)} results ({elapsed_ms:.2f} ms)")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(0)
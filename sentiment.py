@@ -0,0 +1,269 @@
+import io
+import os
+import sys
+import time
+import logging
+import argparse
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+from search_index import TERM_RE
+from entity_extractor import SECTOR_KEYWORDS, classify_sector
+from storage import atomic_write_bytes, read_bytes, read_json, find_snapshots
+
+logger = logging.getLogger(__name__)
+
+SERIES_FILE = os.path.join('data', 'sentiment_series.npz')
+SERIES_NAMES = ['overall'] + list(SECTOR_KEYWORDS) + ['general']
+
+# Bucket width in seconds and ring-buffer length per resolution
+RESOLUTIONS = {
+    'minute': (60, 1440),      # one day
+    'hour': (3600, 24 * 14),   # two weeks
+    'day': (86400, 400),       # a bit over a year
+}
+
+# Market-news lexicon: term (word or two-word phrase) -> weight
+POSITIVE_TERMS = {
+    1.0: ['surge', 'surges', 'surged', 'soar', 'soars', 'soared', 'rally', 'rallies', 'rallied', 'upgrade',
+          'upgrades', 'upgraded', 'outperform', 'record high', 'upper circuit', 'beats estimates', 'bullish',
+          'multibagger', 'turns profitable'],
+    0.6: ['jump', 'jumps', 'jumped', 'gain', 'gains', 'gained', 'rise', 'rises', 'rose', 'climb', 'climbs',
+          'climbed', 'buy', 'accumulate', 'profit rises', 'growth', 'strong', 'robust', 'beat', 'beats',
+          'expansion', 'order win', 'wins', 'bags', 'approval', 'approves', 'dividend', 'bonus', 'buyback',
+          'recovers', 'rebound', 'rebounds', 'upside', 'week high', 'week highs', 'breakout', 'positive', 'optimistic',
+          'outlook raised', 'inflows'],
+    0.3: ['higher', 'up', 'advance', 'advances', 'improves', 'improved', 'steady', 'stable', 'support', 'boost',
+          'boosts'],
+}
+NEGATIVE_TERMS = {
+    1.0: ['plunge', 'plunges', 'plunged', 'crash', 'crashes', 'crashed', 'tank', 'tanks', 'tanked', 'slump',
+          'slumps', 'slumped', 'downgrade', 'downgrades', 'downgraded', 'underperform', 'lower circuit',
+          'misses estimates', 'bearish', 'fraud', 'default', 'defaults', 'bankruptcy', 'insolvency'],
+    0.6: ['fall', 'falls', 'fell', 'drop', 'drops', 'dropped', 'decline', 'declines', 'declined', 'slide',
+          'slides', 'slid', 'sell', 'reduce', 'loss', 'losses', 'weak', 'weakens', 'miss', 'misses', 'cut',
+          'cuts', 'penalty', 'probe', 'raid', 'ban', 'bans', 'tariff', 'tariffs', 'outflows', 'selloff',
+          'sell off', 'week low', 'week lows', 'breakdown', 'negative', 'concern', 'concerns', 'pressure', 'widens'],
+    0.3: ['lower', 'down', 'dips', 'dip', 'flat', 'volatile', 'volatility', 'uncertainty', 'caution',
+          'cautious', 'delay', 'delays'],
+}
+NEGATORS = {'not', 'no', 'never', 'without', 'fails', 'failed'}
+HEADLINE_WEIGHT = 2
+
+
+def _build_lexicon() -> Dict[str, float]:
+    lexicon = {}
+    for sign, groups in ((1.0, POSITIVE_TERMS), (-1.0, NEGATIVE_TERMS)):
+        for weight, terms in groups.items():
+            for term in terms:
+                lexicon[term] = sign * weight
+    return lexicon
+
+
+class SentimentScorer:
+    """Linear lexicon model: tanh of the summed term weights, scaled by text length.
+
+    Texts become one sparse term-count matrix and are scored together as a
+    single matrix-vector product. A negator just before a term flips it.
+    """
+
+    def __init__(self, lexicon: Optional[Dict[str, float]] = None, scale: float = 1.5):
+        lexicon = lexicon or _build_lexicon()
+        self.vocab = {term: i for i, term in enumerate(lexicon)}
+        self.weights = np.array(list(lexicon.values()), dtype=np.float32)
+        self.scale = scale
+
+    def score_texts(self, texts: List[str]) -> np.ndarray:
+        """Scores in [-1, 1], one per text."""
+        rows, cols, values = [], [], []
+        lengths = np.ones(len(texts), dtype=np.float32)
+        for i, text in enumerate(texts):
+            tokens = TERM_RE.findall(text.lower())
+            lengths[i] = max(1, len(tokens))
+            for j, token in enumerate(tokens):
+                for start, term in ((j, token), (j - 1, f"{tokens[j - 1]} {token}" if j else None)):
+                    column = self.vocab.get(term)
+                    if column is None:
+                        continue
+                    rows.append(i)
+                    cols.append(column)
+                    values.append(-1.0 if start > 0 and tokens[start - 1] in NEGATORS else 1.0)
+        counts = np.zeros((len(texts), len(self.vocab)), dtype=np.float32)
+        np.add.at(counts, (rows, cols), values)
+        return np.tanh(self.scale * (counts @ self.weights) / np.sqrt(lengths))
+
+    def score(self, news_items: List[Dict]) -> np.ndarray:
+        """Score items (in place, under 'sentiment'); the headline counts double."""
+        texts = [f"{' '.join([n.get('headline', '')] * HEADLINE_WEIGHT)} {n.get('description', '')}"
+                 for n in news_items]
+        scores = self.score_texts(texts)
+        for news_item, score in zip(news_items, scores.tolist()):
+            news_item['sentiment'] = round(score, 3)
+        return scores
+
+
+class SentimentSeries:
+    """Overall and per-sector sentiment in minute/hour/day ring buffers.
+
+    Each resolution keeps a fixed number of buckets holding score sums and
+    counts; a bucket is reused once its slot comes round again. Updates and
+    queries touch only the affected buckets, so both are instant.
+    """
+
+    def __init__(self, path: str = SERIES_FILE):
+        self.path = path
+        self.names = list(SERIES_NAMES)
+        self.buffers = {resolution: {'bucket': np.full(slots, -1, dtype=np.int64),
+                                     'sum': np.zeros((slots, len(self.names)), dtype=np.float64),
+                                     'count': np.zeros((slots, len(self.names)), dtype=np.int64)}
+                        for resolution, (_, slots) in RESOLUTIONS.items()}
+        try:
+            saved = np.load(io.BytesIO(read_bytes(path)))
+        except (OSError, ValueError, EOFError):
+            return
+        if list(saved['names']) != self.names:
+            logger.warning("Sentiment series has different sectors, starting afresh")
+            return
+        for resolution, buffer in self.buffers.items():
+            for key in buffer:
+                if saved[f"{resolution}_{key}"].shape == buffer[key].shape:
+                    buffer[key] = saved[f"{resolution}_{key}"]
+
+    def add(self, timestamps: np.ndarray, series: List[str], scores: np.ndarray):
+        """Add scores observed at timestamps to their series and to 'overall'."""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        scores = np.asarray(scores, dtype=np.float64)
+        columns = np.array([self.names.index(name) for name in series], dtype=np.int64)
+        for resolution, (width, slots) in RESOLUTIONS.items():
+            buffer = self.buffers[resolution]
+            buckets = (timestamps // width).astype(np.int64)
+            slot = buckets % slots
+            # Only the newest bucket per slot survives; older observations fell out of the window
+            newest = buffer['bucket'].copy()
+            np.maximum.at(newest, slot, buckets)
+            keep = buckets == newest[slot]
+            buckets, values, cols, slot = buckets[keep], scores[keep], columns[keep], slot[keep]
+            stale = np.unique(slot[buffer['bucket'][slot] != buckets])
+            buffer['sum'][stale] = 0
+            buffer['count'][stale] = 0
+            buffer['bucket'][slot] = buckets
+            for target in (cols, np.zeros_like(cols)):
+                np.add.at(buffer['sum'], (slot, target), values)
+                np.add.at(buffer['count'], (slot, target), 1)
+
+    def query(self, resolution: str = 'hour', name: str = 'overall', last: int = 24,
+              now: Optional[float] = None) -> List[Tuple[float, Optional[float], int]]:
+        """(bucket start, mean or None, count) for the last `last` buckets, oldest first."""
+        width, slots = RESOLUTIONS[resolution]
+        buffer = self.buffers[resolution]
+        current = int((now or time.time()) // width)
+        buckets = np.arange(current - min(last, slots) + 1, current + 1, dtype=np.int64)
+        slot = buckets % slots
+        valid = buffer['bucket'][slot] == buckets
+        column = self.names.index(name)
+        counts = np.where(valid, buffer['count'][slot, column], 0)
+        sums = np.where(valid, buffer['sum'][slot, column], 0.0)
+        return [(float(b * width), float(s / c) if c else None, int(c))
+                for b, s, c in zip(buckets.tolist(), sums.tolist(), counts.tolist())]
+
+    def latest(self, resolution: str = 'hour', name: str = 'overall', now: Optional[float] = None,
+               lookback: int = 24) -> Tuple[Optional[float], int]:
+        """Mean and count of the most recent non-empty bucket within lookback buckets."""
+        for _, mean, count in reversed(self.query(resolution, name, lookback, now)):
+            if count:
+                return mean, count
+        return None, 0
+
+    def save(self):
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, names=np.array(self.names),
+                            **{f"{resolution}_{key}": array for resolution, arrays in self.buffers.items()
+                               for key, array in arrays.items()})
+        atomic_write_bytes(self.path, buffer.getvalue())
+
+
+def record_sentiment(news_items: List[Dict], timestamp: Optional[float] = None,
+                     series: Optional[SentimentSeries] = None) -> SentimentSeries:
+    """Score a scrape and roll it into the persisted time series."""
+    series = series or SentimentSeries()
+    scores = SentimentScorer().score(news_items)
+    if len(news_items):
+        series.add(np.full(len(news_items), timestamp or time.time()),
+                   [classify_sector(n) for n in news_items], scores)
+        series.save()
+    return series
+
+
+def format_sentiment_summary(news_items: List[Dict], series: Optional[SentimentSeries] = None,
+                             min_items: int = 3) -> str:
+    """Compact numbers for the consolidation prompt: this run per sector, and the trend from the series."""
+    if not news_items:
+        return ""
+    if any('sentiment' not in n for n in news_items):
+        SentimentScorer().score(news_items)
+    by_sector = {}
+    for news_item in news_items:
+        by_sector.setdefault(classify_sector(news_item), []).append(news_item['sentiment'])
+    overall = np.mean([n['sentiment'] for n in news_items])
+    parts = [f"Overall {overall:+.2f} ({len(news_items)} items)"]
+    parts += [f"{sector.replace('_', ' ').title()} {np.mean(scores):+.2f} ({len(scores)})"
+              for sector, scores in sorted(by_sector.items(), key=lambda kv: -len(kv[1])) if len(scores) >= min_items]
+    text = ", ".join(parts)
+    if series is not None:
+        daily = [f"{mean:+.2f}" for _, mean, _ in series.query('day', 'overall', 7) if mean is not None]
+        if len(daily) > 1:
+            text += f"; overall daily means, last {len(daily)} days: {' '.join(daily)}"
+    return text
+
+
+def benchmark() -> Dict:
+    """Score every archived snapshot and fill a throwaway series, timing both."""
+    scorer = SentimentScorer()
+    series = SentimentSeries(path=os.devnull)
+    totals = {'items': 0, 'score_seconds': 0.0, 'series_seconds': 0.0, 'positive': 0, 'negative': 0}
+    for path in find_snapshots():
+        try:
+            news_items = read_json(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping {path}: {e}")
+            continue
+        start = time.perf_counter()
+        scores = scorer.score(news_items)
+        totals['score_seconds'] += time.perf_counter() - start
+        start = time.perf_counter()
+        series.add(np.full(len(news_items), time.time()), [classify_sector(n) for n in news_items], scores)
+        totals['series_seconds'] += time.perf_counter() - start
+        totals['items'] += len(news_items)
+        totals['positive'] += int(np.sum(scores > 0.1))
+        totals['negative'] += int(np.sum(scores < -0.1))
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Market sentiment from the local time series")
+    parser.add_argument('--resolution', choices=list(RESOLUTIONS), default='hour')
+    parser.add_argument('--last', type=int, default=24, help="Number of buckets to show")
+    parser.add_argument('--sector', default='overall', choices=SERIES_NAMES)
+    parser.add_argument('--benchmark', action='store_true', help="Time scoring over the archived snapshots")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.benchmark:
+        stats = benchmark()
+        items = max(1, stats['items'])
+        print(f"{stats['items']} items: scoring {stats['score_seconds'] * 1e6 / items:.0f} µs/item, "
+              f"series update {stats['series_seconds'] * 1e6 / items:.1f} µs/item; "
+              f"{stats['positive']} positive, {stats['negative']} negative")
+        return
+    series = SentimentSeries()
+    for start, mean, count in series.query(args.resolution, args.sector, args.last):
+        if count:
+            print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(start))}  {mean:+.2f}  ({count} items)")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,287 @@
+import os
+import re
+import sys
+import time
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Optional, Tuple, Callable
+from urllib.parse import urlsplit, urlunsplit
+from xml.etree import ElementTree
+
+import aiohttp
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+# Same browser-like headers the Pulse scraper has always sent
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+}
+
+# Publisher feeds behind most Pulse items: name -> RSS/Atom URL
+DEFAULT_FEEDS = {
+    'Economic Times': 'https://economictimes.indiatimes.com/markets/rssfeeds/1977021501.cms',
+    'Moneycontrol': 'https://www.moneycontrol.com/rss/marketreports.xml',
+    'Livemint': 'https://www.livemint.com/rss/markets',
+    'Business Standard': 'https://www.business-standard.com/rss/markets-106.rss',
+    'The Hindu BusinessLine': 'https://www.thehindubusinessline.com/markets/feeder/default.rss',
+}
+
+TAG_RE = re.compile(r'<[^>]+>')
+SPACE_RE = re.compile(r'\s+')
+NORMALIZE_RE = re.compile(r'[^a-z0-9]+')
+ATOM_NS = '{http://www.w3.org/2005/Atom}'
+
+
+def clean_text(text: Optional[str]) -> str:
+    """Strip markup and collapse whitespace."""
+    return SPACE_RE.sub(' ', TAG_RE.sub(' ', text or '')).strip()
+
+
+def format_pub_time(value: Optional[str]) -> str:
+    """Convert an RFC 822/ISO feed date to the Pulse format ("09:05 PM, 27 May 2025", IST)."""
+    if not value:
+        return "Unknown time"
+    try:
+        dt = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return "Unknown time"
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=IST)
+    return dt.astimezone(IST).strftime('%I:%M %p, %d %b %Y')
+
+
+def parse_pulse_html(html: str, on_item: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+    """Parse the Zerodha Pulse front page into news items, calling on_item for each as it is parsed."""
+    soup = BeautifulSoup(html, 'html.parser')
+    news_list = soup.find('ul', id='news')
+    if not news_list:
+        logger.warning("News list not found in the Pulse page")
+        return []
+
+    news_items = []
+    for idx, item in enumerate(news_list.find_all('li', class_='box item'), 1):
+        try:
+            headline_elem = item.select_one('h2.title a')
+            headline = headline_elem.get_text(strip=True) if headline_elem else ''
+            if not headline:
+                logger.debug(f"Skipping Pulse item {idx}: no headline")
+                continue
+
+            desc_elem = item.select_one('div.desc')
+            date_elem = item.select_one('div.date')
+            time_text = (date_elem.get('title', '') or date_elem.get_text(strip=True)) if date_elem else ''
+            source_elem = item.select_one('div.feed')
+            source = source_elem.get_text(strip=True).replace("—", "").strip() if source_elem else ''
+
+            news_items.append({
+                'headline': headline,
+                'description': desc_elem.get_text(strip=True) if desc_elem else "",
+                'source': source or "Unknown source",
+                'time': time_text or "Unknown time",
+                'url': headline_elem.get('href', ''),
+            })
+            if on_item:
+                on_item(news_items[-1])
+        except Exception as e:
+            logger.warning(f"Error processing Pulse item {idx}: {e}")
+    return news_items
+
+
+def parse_feed(xml_text: str, source: str) -> List[Dict]:
+    """Parse an RSS 2.0 or Atom feed into news items."""
+    try:
+        root = ElementTree.fromstring(xml_text)
+    except ElementTree.ParseError as e:
+        logger.warning(f"Could not parse {source} feed: {e}")
+        return []
+
+    news_items = []
+    for item in root.iter('item'):
+        news_items.append({
+            'headline': clean_text(item.findtext('title')),
+            'description': clean_text(item.findtext('description')),
+            'source': source,
+            'time': format_pub_time(item.findtext('pubDate')),
+            'url': (item.findtext('link') or '').strip(),
+        })
+    for entry in root.iter(f'{ATOM_NS}entry'):
+        link = entry.find(f'{ATOM_NS}link')
+        news_items.append({
+            'headline': clean_text(entry.findtext(f'{ATOM_NS}title')),
+            'description': clean_text(entry.findtext(f'{ATOM_NS}summary') or entry.findtext(f'{ATOM_NS}content')),
+            'source': source,
+            'time': format_pub_time(entry.findtext(f'{ATOM_NS}updated') or entry.findtext(f'{ATOM_NS}published')),
+            'url': link.get('href', '') if link is not None else '',
+        })
+    return [n for n in news_items if n['headline']]
+
+
+class SourceAdapter(ABC):
+    """A news source: the URLs to fetch and how to parse them."""
+
+    def __init__(self, name: str, urls: List[str]):
+        self.name = name
+        self.urls = urls
+
+    @abstractmethod
+    def parse(self, text: str, url: str) -> List[Dict]:
+        """News items from the body fetched from one of the adapter's URLs."""
+
+
+class PulseAdapter(SourceAdapter):
+    def __init__(self, url: str = "https://pulse.zerodha.com/"):
+        super().__init__('Zerodha Pulse', [url])
+
+    def parse(self, text: str, url: str) -> List[Dict]:
+        return parse_pulse_html(text)
+
+
+class FeedAdapter(SourceAdapter):
+    def __init__(self, name: str, url: str):
+        super().__init__(name, [url])
+
+    def parse(self, text: str, url: str) -> List[Dict]:
+        return parse_feed(text, self.name)
+
+
+def default_adapters() -> List[SourceAdapter]:
+    """Pulse plus publisher feeds; NEWS_FEEDS="Name=url,Name=url" overrides the feed list."""
+    feeds = DEFAULT_FEEDS
+    if os.getenv('NEWS_FEEDS'):
+        feeds = dict(pair.split('=', 1) for pair in os.getenv('NEWS_FEEDS').split(',') if '=' in pair)
+    return [PulseAdapter()] + [FeedAdapter(name, url) for name, url in feeds.items()]
+
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/'), '', ''))
+
+
+def dedup_keys(news_item: Dict) -> List[str]:
+    """The keys two copies of a story can share: normalized URL and normalized headline."""
+    return [k for k in (normalize_url(news_item.get('url', '')),
+                        NORMALIZE_RE.sub(' ', news_item.get('headline', '').lower()).strip()) if k]
+
+
+def dedup_items(news_items: List[Dict]) -> List[Dict]:
+    """Drop repeats by URL or normalized headline, filling unknown fields from later copies."""
+    by_key = {}
+    merged = []
+    for news_item in news_items:
+        keys = dedup_keys(news_item)
+        existing = next((by_key[k] for k in keys if k in by_key), None)
+        if existing is None:
+            existing = dict(news_item)
+            merged.append(existing)
+        else:
+            for field, unknown in (('source', 'Unknown source'), ('time', 'Unknown time'), ('description', '')):
+                if existing.get(field, unknown) == unknown and news_item.get(field, unknown) != unknown:
+                    existing[field] = news_item[field]
+        for k in keys:
+            by_key.setdefault(k, existing)
+    return merged
+
+
+class ScrapeEngine:
+    """Fetches all adapters concurrently with per-host connection and politeness limits."""
+
+    def __init__(self, adapters: List[SourceAdapter], per_host_limit: int = 2,
+                 min_host_interval: float = 1.0, timeout: float = 30.0,
+                 on_item: Optional[Callable[[Dict], None]] = None):
+        self.adapters = adapters
+        self.on_item = on_item
+        self.per_host_limit = per_host_limit
+        self.min_host_interval = min_host_interval
+        self.timeout = timeout
+        self._host_locks = {}
+        self._host_last = {}
+        self._handed_on = set()   # dedup keys of items already passed to on_item
+        self.stats = {}
+
+    async def _polite_wait(self, host: str):
+        """Space out requests to the same host by min_host_interval."""
+        lock = self._host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            wait = self._host_last.get(host, 0) + self.min_host_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._host_last[host] = time.monotonic()
+
+    async def _fetch_adapter(self, session: aiohttp.ClientSession, adapter: SourceAdapter) -> List[Dict]:
+        start = time.perf_counter()
+        stats = {'items': 0, 'bytes': 0, 'errors': 0}
+        news_items = []
+        for url in adapter.urls:
+            try:
+                await self._polite_wait(urlsplit(url).netloc)
+                async with session.get(url) as response:
+                    response.raise_for_status()
+                    body = await response.read()
+                stats['bytes'] += len(body)
+                parsed = adapter.parse(body.decode('utf-8', errors='replace'), url)
+                # Each page's items are handed on as soon as it arrives, before the other sources
+                # finish, so repeats across sources are dropped here rather than by dedup_items
+                if self.on_item:
+                    for news_item in parsed:
+                        keys = dedup_keys(news_item)
+                        if any(k in self._handed_on for k in keys):
+                            continue
+                        self._handed_on.update(keys)
+                        self.on_item(news_item)
+                news_items.extend(parsed)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                stats['errors'] += 1
+                logger.warning(f"{adapter.name}: failed to fetch {url}: {e}")
+        stats['items'] = len(news_items)
+        stats['seconds'] = round(time.perf_counter() - start, 3)
+        stats['items_per_sec'] = round(stats['items'] / stats['seconds'], 1) if stats['seconds'] else 0.0
+        self.stats[adapter.name] = stats
+        return news_items
+
+    async def run(self) -> List[Dict]:
+        """Fetch every adapter concurrently and return the deduplicated items."""
+        connector = aiohttp.TCPConnector(limit_per_host=self.per_host_limit)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=HEADERS) as session:
+            results = await asyncio.gather(*(self._fetch_adapter(session, a) for a in self.adapters))
+        all_items = [item for items in results for item in items]
+        news_items = dedup_items(all_items)
+        logger.info(f"Scraped {len(all_items)} items from {len(self.adapters)} sources, "
+                    f"{len(news_items)} after dedup")
+        return news_items
+
+
+def scrape_all_sources(adapters: Optional[List[SourceAdapter]] = None,
+                       on_item: Optional[Callable[[Dict], None]] = None) -> Tuple[List[Dict], Dict]:
+    """Scrape Pulse and publisher feeds concurrently. Returns (items, per-source stats)."""
+    engine = ScrapeEngine(adapters or default_adapters(), on_item=on_item)
+    news_items = asyncio.run(engine.run())
+    return news_items, engine.stats
+
+
+def print_source_stats(stats: Dict):
+    """Print per-source crawl throughput."""
+    for name, s in stats.items():
+        print(f"  {name:<24} {s['items']:>4} items  {s['bytes'] / 1024:>7.1f} KB  "
+              f"{s['seconds']:>6.2f}s  {s['items_per_sec']:>6.1f} items/s  {s['errors']} errors")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        items, source_stats = scrape_all_sources()
+        print(f"{len(items)} unique items")
+        print_source_stats(source_stats)
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,311 @@
+import os
+import sys
+import glob
+import gzip
+import json
+import time
+import logging
+import argparse
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Dict, Optional, Any, Iterator
+
+try:
+    import zstandard
+except ImportError:  # gzip is always available
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: manifest updates are not locked
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = 'data'
+MANIFEST_FILE = os.path.join(DATA_DIR, 'manifest.json')
+
+# Newest files kept per kind, and how many of those stay uncompressed
+RETENTION = {
+    'snapshot': {'keep': int(os.getenv('SNAPSHOT_KEEP', 500)), 'keep_plain': 0},
+    'report': {'keep': int(os.getenv('REPORT_KEEP', 1000)), 'keep_plain': 20},
+}
+
+COMPRESSED_SUFFIXES = ('.gz', '.zst')
+
+
+def default_codec() -> str:
+    return 'zst' if zstandard is not None else 'gz'
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == 'zst':
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=9)
+
+
+def read_bytes(path: str) -> bytes:
+    """Read a file, transparently decompressing .gz/.zst."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if path.endswith('.gz'):
+        return gzip.decompress(data)
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise OSError(f"{path} needs the zstandard package")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+
+def read_text(path: str) -> str:
+    return read_bytes(path).decode('utf-8')
+
+
+def read_json(path: str) -> Any:
+    return json.loads(read_bytes(path))
+
+
+def atomic_write_bytes(path: str, data: bytes):
+    """Write via a temp file in the same directory and rename, so readers never see a partial file.
+
+    Each write gets its own temp file, so concurrent writers to one path
+    never share one; the last rename wins. The directory is fsynced after
+    the rename so the new entry survives a crash.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except OSError:
+        mode = 0o644
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fchmod(f.fileno(), mode)
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_dir(directory)
+
+
+def _fsync_dir(directory: str):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:  # e.g. Windows, where directories cannot be opened
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_text(path: str, text: str):
+    atomic_write_bytes(path, text.encode('utf-8'))
+
+
+def atomic_write_json(path: str, data: Any, indent: Optional[int] = None):
+    atomic_write_text(path, json.dumps(data, ensure_ascii=False, indent=indent))
+
+
+def strip_suffixes(name: str) -> str:
+    """'pulse_news_20250527_213152.json.gz' -> 'pulse_news_20250527_213152'"""
+    for suffix in COMPRESSED_SUFFIXES:
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return os.path.splitext(name)[0]
+
+
+def snapshot_timestamp(path: str) -> float:
+    """Best-effort scrape time of a snapshot, from its filename or mtime."""
+    name = os.path.basename(path)
+    for fmt, start, length in (('%Y%m%d_%H%M%S', 11, 15), ('%Y-%m-%d_%H-%M-%S', 19, 19)):
+        try:
+            return datetime.strptime(name[start:start + length], fmt).timestamp()
+        except ValueError:
+            continue
+    return os.path.getmtime(path)
+
+
+def find_snapshots() -> List[str]:
+    """All archived news snapshots (plain or compressed), oldest first."""
+    paths = []
+    for pattern in ('*pulse_news_*.json', '*pulse_news_*.json.gz', '*pulse_news_*.json.zst'):
+        paths += glob.glob(os.path.join(DATA_DIR, pattern)) + glob.glob(pattern.lstrip('*'))
+    return sorted(paths, key=snapshot_timestamp)
+
+
+class Manifest:
+    """Index of stored files per kind ('snapshot', 'report'), oldest first, with a latest pointer."""
+
+    def __init__(self, path: str = MANIFEST_FILE):
+        self.path = path
+        self.files = {}
+        self.latest_paths = {}
+        try:
+            manifest = read_json(path)
+            self.files = manifest.get('files', {})
+            self.latest_paths = manifest.get('latest', {})
+        except (OSError, ValueError):
+            pass
+
+    def add(self, kind: str, path: str, created: Optional[float] = None):
+        entry = {'path': path, 'created': created or time.time(), 'bytes': os.path.getsize(path)}
+        self.files.setdefault(kind, []).append(entry)
+        self.latest_paths[kind] = path
+
+    def latest(self, kind: str) -> Optional[str]:
+        return self.latest_paths.get(kind)
+
+    def entries(self, kind: str) -> List[Dict]:
+        return self.files.get(kind, [])
+
+    def save(self):
+        atomic_write_json(self.path, {'latest': self.latest_paths, 'files': self.files}, indent=1)
+
+
+@contextmanager
+def locked_manifest(path: str = MANIFEST_FILE) -> Iterator[Manifest]:
+    """The manifest, read, modified and saved under an exclusive lock.
+
+    Without it two processes saving at once (a scheduled run and a backfill)
+    each rewrite the manifest they read, and one's new entry is lost.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(f"{path}.lock", 'a') as lock:
+        if fcntl:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        try:
+            manifest = Manifest(path)
+            yield manifest
+            manifest.save()
+        finally:
+            if fcntl:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def apply_retention(manifest: Manifest, kind: str):
+    """Compress all but the newest keep_plain files of a kind and delete all but the newest keep."""
+    policy = RETENTION[kind]
+    entries = manifest.entries(kind)
+    for entry in entries[:max(0, len(entries) - policy['keep'])]:
+        try:
+            os.remove(entry['path'])
+        except OSError:
+            pass
+    entries = entries[max(0, len(entries) - policy['keep']):]
+
+    for entry in entries[:max(0, len(entries) - policy['keep_plain'])]:
+        path = entry['path']
+        if path.endswith(COMPRESSED_SUFFIXES) or not os.path.exists(path):
+            continue
+        codec = default_codec()
+        compressed_path = f"{path}.{codec}"
+        with open(path, 'rb') as f:
+            atomic_write_bytes(compressed_path, compress(f.read(), codec))
+        os.remove(path)
+        entry['path'] = compressed_path
+        entry['bytes'] = os.path.getsize(compressed_path)
+        if manifest.latest_paths.get(kind) == path:
+            manifest.latest_paths[kind] = compressed_path
+    manifest.files[kind] = entries
+
+
+def save_snapshot(news_items: List[Dict], timestamp: Optional[str] = None) -> str:
+    """Store a scrape compressed, atomically, and register it in the manifest."""
+    timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+    codec = default_codec()
+    path = os.path.join(DATA_DIR, f"pulse_news_{timestamp}.json.{codec}")
+    atomic_write_bytes(path, compress(json.dumps(news_items, ensure_ascii=False).encode('utf-8'), codec))
+    with locked_manifest() as manifest:
+        manifest.add('snapshot', path)
+        apply_retention(manifest, 'snapshot')
+    return path
+
+
+def save_report(report: str, path: str) -> str:
+    """Store a text report atomically and register it in the manifest."""
+    atomic_write_text(path, report)
+    with locked_manifest() as manifest:
+        manifest.add('report', path)
+        apply_retention(manifest, 'report')
+    return path
+
+
+def latest_report(data_dir: str = DATA_DIR) -> Optional[str]:
+    """Path of the newest report: one manifest lookup, with a directory scan only for old archives."""
+    path = Manifest(os.path.join(data_dir, 'manifest.json')).latest('report')
+    if path and os.path.exists(path):
+        return path
+    reports = sorted(f for f in os.listdir(data_dir) if f.startswith('zerodha_news_report_') and f.endswith('.txt')) \
+        if os.path.isdir(data_dir) else []
+    return os.path.join(data_dir, reports[-1]) if reports else None
+
+
+def disk_usage(data_dir: str = DATA_DIR) -> Dict[str, int]:
+    """Bytes used by snapshots, reports and everything else under data_dir."""
+    usage = {'snapshots': 0, 'reports': 0, 'other': 0}
+    for root, _, names in os.walk(data_dir):
+        for name in names:
+            size = os.path.getsize(os.path.join(root, name))
+            if 'pulse_news_' in name:
+                usage['snapshots'] += size
+            elif name.startswith(('zerodha_news_report_', 'trading_report_')):
+                usage['reports'] += size
+            else:
+                usage['other'] += size
+    return usage
+
+
+def migrate(data_dir: str = DATA_DIR) -> Manifest:
+    """Register the existing archive in a fresh manifest, then compress/rotate it per RETENTION."""
+    with locked_manifest(os.path.join(data_dir, 'manifest.json')) as manifest:
+        manifest.files, manifest.latest_paths = {}, {}
+        snapshots = [p for p in find_snapshots() if os.path.dirname(p) == data_dir]
+        for path in snapshots:
+            manifest.add('snapshot', path, created=snapshot_timestamp(path))
+        reports = sorted(glob.glob(os.path.join(data_dir, 'zerodha_news_report_*.txt*')))
+        for path in reports:
+            manifest.add('report', path, created=os.path.getmtime(path))
+        for kind in RETENTION:
+            apply_retention(manifest, kind)
+    return manifest
+
+
+def _print_usage(label: str, usage: Dict[str, int]):
+    print(f"{label:<8} snapshots {usage['snapshots'] / 1024:8.1f} KB | reports {usage['reports'] / 1024:6.1f} KB | "
+          f"other {usage['other'] / 1024:8.1f} KB | total {sum(usage.values()) / 1024:8.1f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the data/ archive")
+    parser.add_argument('--migrate', action='store_true',
+                        help="Compress and rotate the existing archive and build the manifest")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    before = disk_usage()
+    if not args.migrate:
+        _print_usage('Usage', before)
+        return
+    manifest = migrate()
+    _print_usage('Before', before)
+    _print_usage('After', disk_usage())
+    print(f"Manifest: {len(manifest.entries('snapshot'))} snapshots, {len(manifest.entries('report'))} reports "
+          f"({default_codec()} compression)")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,287 @@
+import io
+import os
+import sys
+import time
+import zlib
+import hashlib
+import logging
+import argparse
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+from search_index import STOP_WORDS, TERM_RE
+from summarizer import split_sentences
+from sources import NORMALIZE_RE, dedup_items
+from entity_extractor import EntityExtractor
+from storage import atomic_write_bytes, atomic_write_json, read_bytes, read_json, find_snapshots, snapshot_timestamp
+
+logger = logging.getLogger(__name__)
+
+THREADS_FILE = os.path.join('data', 'story_threads.json')
+VECTORS_FILE = os.path.join('data', 'story_threads.npy')
+VECTOR_DIM = 1024
+MAX_FACTS = 100  # sentence fingerprints remembered per thread
+MAX_RECORDS = 10  # latest insight records remembered per thread
+
+# Feature weights: the same ticker is the strongest sign of the same story
+TICKER_WEIGHT = 3.0
+HEADLINE_WEIGHT = 2.0
+TEXT_WEIGHT = 1.0
+
+
+def _features(news_item: Dict) -> List[Tuple[str, float]]:
+    features = [(f"ticker:{t}", TICKER_WEIGHT) for t in news_item.get('entities', {}).get('tickers', [])]
+    for text, weight in ((news_item.get('headline', ''), HEADLINE_WEIGHT),
+                         (news_item.get('description', ''), TEXT_WEIGHT)):
+        features += [(t, weight) for t in TERM_RE.findall(text.lower()) if len(t) > 1 and t not in STOP_WORDS]
+    return features
+
+
+def hashed_vectors(news_items: List[Dict], dim: int = VECTOR_DIM) -> np.ndarray:
+    """L2-normalised signed feature-hashing vectors, one row per item; no vocabulary to store."""
+    rows, cols, values = [], [], []
+    for i, news_item in enumerate(news_items):
+        for feature, weight in _features(news_item):
+            h = zlib.crc32(feature.encode('utf-8'))
+            rows.append(i)
+            cols.append(h % dim)
+            values.append(weight if h & 0x80000000 else -weight)
+    matrix = np.zeros((len(news_items), dim), dtype=np.float32)
+    np.add.at(matrix, (rows, cols), values)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-9)
+
+
+def fact_key(sentence: str) -> str:
+    return hashlib.sha1(NORMALIZE_RE.sub(' ', sentence.lower()).strip().encode('utf-8')).hexdigest()[:12]
+
+
+class RandomProjectionLSH:
+    """Approximate cosine nearest-neighbour index.
+
+    Each of n_tables tables buckets a vector by the signs of n_bits random
+    projections. A query looks in its own bucket and, with multi-probe, in the
+    n_bits buckets one bit away, which keeps recall up with few tables.
+    """
+
+    def __init__(self, dim: int = VECTOR_DIM, n_tables: int = 12, n_bits: int = 10, seed: int = 41,
+                 multi_probe: bool = True):
+        rng = np.random.default_rng(seed)
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.planes = rng.standard_normal((dim, n_tables * n_bits)).astype(np.float32)
+        self.bit_values = 1 << np.arange(n_bits, dtype=np.int64)
+        self.multi_probe = multi_probe
+        self.tables = [{} for _ in range(n_tables)]
+        self.signatures_by_id = {}
+
+    def signatures(self, vectors: np.ndarray) -> np.ndarray:
+        """(n, n_tables) bucket keys for a batch of vectors."""
+        bits = (vectors @ self.planes > 0).reshape(len(vectors), self.n_tables, self.n_bits)
+        return bits.astype(np.int64) @ self.bit_values
+
+    def add(self, ids: List[int], vectors: np.ndarray):
+        for item_id, signature in zip(ids, self.signatures(vectors)):
+            self.remove(item_id)
+            self.signatures_by_id[item_id] = signature
+            for table, key in zip(self.tables, signature.tolist()):
+                table.setdefault(key, set()).add(item_id)
+
+    def remove(self, item_id: int):
+        signature = self.signatures_by_id.pop(item_id, None)
+        if signature is None:
+            return
+        for table, key in zip(self.tables, signature.tolist()):
+            table[key].discard(item_id)
+
+    def candidates(self, vector: np.ndarray) -> List[int]:
+        found = set()
+        flips = [0] + (self.bit_values.tolist() if self.multi_probe else [])
+        for table, key in zip(self.tables, self.signatures(vector[None, :])[0].tolist()):
+            for flip in flips:
+                found.update(table.get(key ^ flip, ()))
+        return sorted(found)
+
+
+class StoryThreader:
+    """Groups items into story threads that persist across runs.
+
+    Each thread keeps a centroid vector (in the LSH index) and fingerprints of
+    the sentences already seen. An incoming item joins the most similar thread
+    above `similarity`, or starts a new one. For a follow-up, only sentences
+    not seen before (the headline counts as one) are new developments; an
+    item with none is a repeat.
+    Threads also keep the latest insight records of their analyzed items, so a
+    repeat can be reported without analyzing it again.
+    """
+
+    def __init__(self, path: str = THREADS_FILE, vectors_path: str = VECTORS_FILE, similarity: float = 0.45,
+                 max_age_days: float = 7, dim: int = VECTOR_DIM):
+        self.path = path
+        self.vectors_path = vectors_path
+        self.similarity = similarity
+        self.max_age_days = max_age_days
+        self.dim = dim
+        self.threads = []
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        try:
+            threads = read_json(path)
+            vectors = np.load(io.BytesIO(read_bytes(vectors_path))).astype(np.float32)
+            if vectors.shape == (len(threads), dim):
+                self.threads, self.vectors = threads, vectors
+            else:
+                logger.warning("Story thread vectors do not match the threads, starting afresh")
+        except (OSError, ValueError):
+            pass
+        self.index = RandomProjectionLSH(dim)
+        self.index.add(list(range(len(self.threads))), self.vectors)
+        self.stats = {'threads': len(self.threads), 'new': 0, 'follow_ups': 0, 'repeats': 0, 'candidates': 0}
+        # Benchmarking: also run the exact search and count how often LSH finds the same thread
+        self.measure_recall = False
+
+    def _compatible(self, thread_ids: List[int], tickers: set) -> np.ndarray:
+        # Template headlines ("Q4 profit jumps...") about different companies are different stories
+        if not tickers:
+            return np.ones(len(thread_ids), dtype=bool)
+        return np.array([not self.threads[i]['tickers'] or bool(tickers & set(self.threads[i]['tickers']))
+                         for i in thread_ids], dtype=bool)
+
+    def nearest(self, vector: np.ndarray, tickers: set = frozenset()) -> Tuple[Optional[int], float]:
+        """The most similar compatible thread among the LSH candidates, if it clears the threshold."""
+        candidates = self.index.candidates(vector)
+        self.stats['candidates'] += len(candidates)
+        if self.measure_recall and len(self.threads):
+            scores = np.where(self._compatible(list(range(len(self.threads))), tickers), self.vectors @ vector, -1.0)
+            best = int(np.argmax(scores))
+            if scores[best] >= self.similarity:
+                self.stats['exact_matches'] = self.stats.get('exact_matches', 0) + 1
+                self.stats['lsh_matches'] = self.stats.get('lsh_matches', 0) + (best in candidates)
+        if not candidates:
+            return None, 0.0
+        scores = np.where(self._compatible(candidates, tickers), self.vectors[candidates] @ vector, -1.0)
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity:
+            return None, float(scores[best])
+        return candidates[best], float(scores[best])
+
+    def assign(self, news_items: List[Dict], now: Optional[float] = None) -> List[Dict]:
+        """Tag items (in place) with 'thread_id' and 'thread_status' ('new', 'follow_up' or 'repeat').
+
+        Follow-ups also get 'thread_headline', 'thread_updates' and 'new_developments'.
+        """
+        now = now or time.time()
+        vectors = hashed_vectors(news_items, self.dim)
+        for news_item, vector in zip(news_items, vectors):
+            # A follow-up often changes only the headline ("... record date set"), so it is a fact too
+            headline = news_item.get('headline', '').strip()
+            sentences = ([headline] if headline else []) + split_sentences(
+                f"{news_item.get('description', '')} {news_item.get('body_summary', '')}")
+            facts = [fact_key(s) for s in sentences]
+            tickers = set(news_item.get('entities', {}).get('tickers', []))
+            thread_id, _ = self.nearest(vector, tickers)
+            if thread_id is None:
+                thread_id = len(self.threads)
+                self.threads.append({'headline': news_item.get('headline', ''), 'started': now, 'updated': now,
+                                     'updates': 0, 'tickers': [], 'facts': []})
+                self.vectors = np.vstack([self.vectors, vector[None, :]])
+                news_item['thread_status'] = 'new'
+                self.stats['new'] += 1
+            else:
+                thread = self.threads[thread_id]
+                known = set(thread['facts'])
+                fresh = [s for s, key in zip(sentences, facts) if key not in known]
+                news_item['thread_headline'] = thread['headline']
+                if fresh:
+                    thread['updates'] += 1
+                    thread['updated'] = now
+                    news_item['thread_status'] = 'follow_up'
+                    news_item['thread_updates'] = thread['updates']
+                    news_item['new_developments'] = ' '.join(fresh)
+                    self.stats['follow_ups'] += 1
+                else:
+                    news_item['thread_status'] = 'repeat'
+                    self.stats['repeats'] += 1
+                # The centroid drifts towards the latest coverage
+                centroid = self.vectors[thread_id] + vector
+                self.vectors[thread_id] = centroid / max(np.linalg.norm(centroid), 1e-9)
+            thread = self.threads[thread_id]
+            thread['tickers'] = sorted(set(thread['tickers']) | tickers)
+            thread['facts'] = (thread['facts'] + [f for f in facts if f not in thread['facts']])[-MAX_FACTS:]
+            self.index.add([thread_id], self.vectors[thread_id][None, :])
+            news_item['thread_id'] = thread_id
+        self.stats['threads'] = len(self.threads)
+        return news_items
+
+    def remember(self, thread_id: int, records: List[Dict]):
+        """Keep a thread's latest insight records, one per (ticker, action)."""
+        latest = {}
+        for record in self.threads[thread_id].get('records', []) + records:
+            key = (record['ticker'], record['action'])
+            latest.pop(key, None)
+            latest[key] = record
+        self.threads[thread_id]['records'] = list(latest.values())[-MAX_RECORDS:]
+
+    def records(self, thread_id: int) -> List[Dict]:
+        return [dict(r) for r in self.threads[thread_id].get('records', [])]
+
+    def save(self, now: Optional[float] = None):
+        """Persist the threads, dropping those without updates for max_age_days."""
+        cutoff = (now or time.time()) - self.max_age_days * 86400
+        keep = [i for i, thread in enumerate(self.threads) if thread['updated'] >= cutoff]
+        buffer = io.BytesIO()
+        np.save(buffer, self.vectors[keep].astype(np.float16))  # half the size, ample for cosine
+        atomic_write_bytes(self.vectors_path, buffer.getvalue())
+        atomic_write_json(self.path, [self.threads[i] for i in keep])
+
+
+def format_thread_bullets(news_items: List[Dict], limit: int = 10) -> List[str]:
+    """Report bullets for stories that developed further this run."""
+    follow_ups = [n for n in news_items if n.get('thread_status') == 'follow_up']
+    bullets = [f"**{n['thread_headline']}** (update {n['thread_updates']}): {n.get('headline', '')}"
+               for n in follow_ups[:limit]]
+    repeats = sum(1 for n in news_items if n.get('thread_status') == 'repeat')
+    if repeats:
+        bullets.append(f"{repeats} items repeated known stories without new developments and were not re-analyzed")
+    return bullets
+
+
+def replay(similarity: float) -> Dict:
+    """Thread the archived snapshots in order, in memory, measuring LSH recall against exact search."""
+    threader = StoryThreader(path=os.devnull, vectors_path=os.devnull, similarity=similarity)
+    threader.measure_recall = True
+    extractor = EntityExtractor()
+    totals = {'snapshots': 0, 'items': 0}
+    for path in find_snapshots():
+        try:
+            news_items = extractor.annotate(dedup_items(read_json(path)))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping {path}: {e}")
+            continue
+        threader.assign(news_items, now=snapshot_timestamp(path))
+        totals['snapshots'] += 1
+        totals['items'] += len(news_items)
+    return {**totals, **threader.stats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay story threading over the archived snapshots")
+    parser.add_argument('--similarity', type=float, default=0.45)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    stats = replay(args.similarity)
+    items = max(1, stats['items'])
+    print(f"{stats['snapshots']} snapshots, {stats['items']} items -> {stats['threads']} threads "
+          f"({stats['follow_ups']} follow-ups, {stats['repeats']} repeats)")
+    print(f"LSH: {stats['candidates'] / items:.1f} candidates per item (of up to {stats['threads']} threads), "
+          f"recall {stats.get('lsh_matches', 0) / max(1, stats.get('exact_matches', 0)):.1%} "
+          f"of {stats.get('exact_matches', 0)} exact matches")
+    print(f"Items sent to the model: {stats['items'] - stats['repeats']} of {stats['items']}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(0)
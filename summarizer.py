@@ -0,0 +1,258 @@
+import re
+import sys
+import time
+import logging
+import argparse
+from typing import List, Dict, Optional
+
+import numpy as np
+
+from token_budget import count_tokens
+from enrichment import SENTENCE_RE, FIGURE_RE
+from search_index import STOP_WORDS, TERM_RE
+from storage import read_json, find_snapshots
+
+logger = logging.getLogger(__name__)
+
+NUMBER_RE = re.compile(r'\d[\d,]*(?:\.\d+)?')
+# "U.S.", "Rs.", "Ltd." end a split piece without ending the sentence
+ABBREVIATION_RE = re.compile(r'(?:\b[A-Z]\.|\b(?:Rs|Ltd|Co|Inc|vs|Mr|Ms|Dr|No|St)\.)$')
+
+
+def split_sentences(text: str) -> List[str]:
+    sentences = []
+    for piece in SENTENCE_RE.split(' '.join(text.split())):
+        if sentences and ABBREVIATION_RE.search(sentences[-1]):
+            sentences[-1] = f"{sentences[-1]} {piece}"
+        elif piece.strip():
+            sentences.append(piece.strip())
+    return sentences
+
+
+def _terms(text: str) -> List[str]:
+    return [t for t in TERM_RE.findall(text.lower()) if len(t) > 1 and t not in STOP_WORDS]
+
+
+def tfidf_matrix(texts: List[str]) -> np.ndarray:
+    """L2-normalised TF-IDF rows (one per text) over a shared vocabulary."""
+    vocab = {}
+    rows, cols = [], []
+    for i, text in enumerate(texts):
+        for term in _terms(text):
+            rows.append(i)
+            cols.append(vocab.setdefault(term, len(vocab)))
+    matrix = np.zeros((len(texts), max(1, len(vocab))), dtype=np.float32)
+    np.add.at(matrix, (rows, cols), 1.0)
+    df = np.count_nonzero(matrix, axis=0)
+    matrix *= np.log((1 + len(texts)) / (1 + df)) + 1.0
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-9)
+
+
+def textrank(similarity: np.ndarray, damping: float = 0.85, iterations: int = 30) -> np.ndarray:
+    """PageRank over a sentence similarity graph (power iteration)."""
+    n = len(similarity)
+    if n <= 1:
+        return np.ones(n, dtype=np.float32)
+    weights = similarity.copy()
+    np.fill_diagonal(weights, 0.0)
+    row_sums = weights.sum(axis=1, keepdims=True)
+    # Sentences sharing no terms with the rest link uniformly
+    transition = np.where(row_sums > 0, weights / np.maximum(row_sums, 1e-9), 1.0 / n)
+    scores = np.full(n, 1.0 / n, dtype=np.float32)
+    for _ in range(iterations):
+        updated = (1 - damping) / n + damping * (transition.T @ scores)
+        if np.abs(updated - scores).sum() < 1e-6:
+            return updated * n
+        scores = updated
+    return scores * n
+
+
+def cluster_duplicates(headline_vectors: np.ndarray, threshold: float) -> List[List[int]]:
+    """Group items whose headlines are near-duplicates (cosine >= threshold), keeping input order."""
+    n = len(headline_vectors)
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    similarity = headline_vectors @ headline_vectors.T
+    for i, j in zip(*np.nonzero(np.triu(similarity >= threshold, k=1))):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    clusters = {}
+    for i in range(n):
+        clusters.setdefault(find(i), []).append(i)
+    return sorted(clusters.values(), key=lambda members: members[0])
+
+
+def _trim_to_tokens(text: str, max_tokens: int, model: Optional[str]) -> str:
+    words = text.split()
+    while len(words) > 1 and count_tokens(' '.join(words), model) > max_tokens:
+        words = words[:-1]
+    return ' '.join(words)
+
+
+class ExtractiveSummarizer:
+    """Compresses each item, or each cluster of duplicate items, to a token budget before batching.
+
+    Sentences are ranked by TextRank centrality within the item/cluster plus
+    TF-IDF similarity to the headline, with a bonus for sentences carrying
+    figures (₹, crore, %), then taken greedily until the budget is spent.
+    """
+
+    def __init__(self, target_tokens: int = 26, cluster_target_tokens: int = 50,
+                 cluster_threshold: float = 0.6, figure_bonus: float = 0.5, model: Optional[str] = None):
+        self.target_tokens = target_tokens
+        self.cluster_target_tokens = cluster_target_tokens
+        self.cluster_threshold = cluster_threshold
+        self.figure_bonus = figure_bonus
+        self.model = model
+        self.stats = {'items_in': 0, 'items_out': 0, 'items_merged': 0}
+        self.last_clusters = []  # input indexes per kept item, from the latest call
+
+    def summarize(self, news_items: List[Dict]) -> List[Dict]:
+        """Set 'summary' on each kept item; duplicates are merged into their highest-priority copy.
+
+        Items are expected in priority order; the returned list keeps that order.
+        """
+        if not news_items:
+            return news_items
+        headline_vectors = tfidf_matrix([n.get('headline', '') for n in news_items])
+        clusters = cluster_duplicates(headline_vectors, self.cluster_threshold)
+        self.last_clusters = clusters
+
+        # One TF-IDF space for every sentence of the run, sliced per cluster
+        sentences, owners = [], []
+        for cluster_id, members in enumerate(clusters):
+            for i in members:
+                body = f"{news_items[i].get('description', '')} {news_items[i].get('body_summary', '')}"
+                for sentence in split_sentences(body):
+                    sentences.append(sentence)
+                    owners.append(cluster_id)
+        headline_base = len(sentences)
+        vectors = tfidf_matrix(sentences + [news_items[members[0]].get('headline', '') for members in clusters])
+        owners = np.array(owners, dtype=np.int32)
+        has_figure = np.array([bool(FIGURE_RE.search(s)) for s in sentences], dtype=np.float32)
+
+        kept = []
+        for cluster_id, members in enumerate(clusters):
+            representative = news_items[members[0]]
+            idx = np.nonzero(owners == cluster_id)[0]
+            budget = self.cluster_target_tokens if len(members) > 1 or representative.get('body_summary') \
+                else self.target_tokens
+            representative['summary'] = self._select(
+                [sentences[i] for i in idx], vectors[idx], vectors[headline_base + cluster_id],
+                has_figure[idx], budget)
+            if len(members) > 1:
+                representative['cluster_size'] = len(members)
+                representative['cluster_sources'] = list(dict.fromkeys(
+                    news_items[i].get('source', '') for i in members))
+            kept.append(representative)
+
+        self.stats['items_in'] += len(news_items)
+        self.stats['items_out'] += len(kept)
+        self.stats['items_merged'] += len(news_items) - len(kept)
+        return kept
+
+    def _select(self, sentences: List[str], vectors: np.ndarray, headline_vector: np.ndarray,
+                has_figure: np.ndarray, budget: int) -> str:
+        if not sentences:
+            return ''
+        similarity = vectors @ vectors.T
+        # Near-identical sentences from duplicate copies are ranked once
+        unique = np.ones(len(sentences), dtype=bool)
+        for i, j in zip(*np.nonzero(np.triu(similarity > 0.9, k=1))):
+            if unique[i]:
+                unique[j] = False
+        scores = textrank(similarity) + vectors @ headline_vector + self.figure_bonus * has_figure
+        scores[~unique] = -np.inf
+
+        chosen, used = [], 0
+        for i in np.argsort(-scores, kind='stable'):
+            if not unique[i]:
+                break
+            cost = count_tokens(sentences[i], self.model)
+            if used + cost <= budget:
+                chosen.append(i)
+                used += cost
+        if not chosen:
+            best = int(np.argmax(scores))
+            return _trim_to_tokens(sentences[best], budget, self.model)
+        return ' '.join(sentences[i] for i in sorted(chosen))
+
+
+def _figures(text: str) -> set:
+    return set(NUMBER_RE.findall(text))
+
+
+def benchmark(target_tokens: int = 26, truncate_chars: int = 100) -> Dict:
+    """Compare full, truncated and summarized description tokens over the archived snapshots."""
+    totals = {'snapshots': 0, 'items': 0, 'items_out': 0, 'full_tokens': 0, 'truncated_tokens': 0,
+              'summary_tokens': 0, 'figures': 0, 'truncated_figures': 0, 'summary_figures': 0, 'seconds': 0.0}
+    for path in find_snapshots():
+        try:
+            news_items = read_json(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping {path}: {e}")
+            continue
+        descriptions = [n.get('description', '') for n in news_items]
+
+        summarizer = ExtractiveSummarizer(target_tokens=target_tokens)
+        start = time.perf_counter()
+        kept = summarizer.summarize(news_items)
+        totals['seconds'] += time.perf_counter() - start
+
+        totals['snapshots'] += 1
+        totals['items'] += len(news_items)
+        totals['items_out'] += len(kept)
+        for description in descriptions:
+            totals['full_tokens'] += count_tokens(description)
+            totals['truncated_tokens'] += count_tokens(description[:truncate_chars])
+            figures = _figures(description)
+            totals['figures'] += len(figures)
+            totals['truncated_figures'] += len(figures & _figures(description[:truncate_chars]))
+        for news_item, members in zip(kept, summarizer.last_clusters):
+            totals['summary_tokens'] += count_tokens(news_item['summary'])
+            # A merged duplicate keeps its figures if they survive in the cluster summary
+            summary_figures = _figures(news_item['summary'])
+            totals['summary_figures'] += sum(len(_figures(descriptions[i]) & summary_figures) for i in members)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local extractive pre-summarization of news items")
+    parser.add_argument('--benchmark', action='store_true', help="Benchmark token savings over archived snapshots")
+    parser.add_argument('--target-tokens', type=int, default=26)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if not args.benchmark:
+        parser.print_help()
+        return
+
+    t = benchmark(args.target_tokens)
+    if not t['snapshots']:
+        print("No snapshots found")
+        return
+    print(f"{t['snapshots']} snapshots, {t['items']} items -> {t['items_out']} after merging duplicates")
+    print(f"Description tokens:  full {t['full_tokens']}  |  truncated[:100] {t['truncated_tokens']}  |  "
+          f"summarized {t['summary_tokens']}")
+    print(f"Savings:             {1 - t['summary_tokens'] / max(1, t['full_tokens']):.0%} vs full, "
+          f"{1 - t['summary_tokens'] / max(1, t['truncated_tokens']):.0%} vs truncated")
+    print(f"Figures retained:    truncated {t['truncated_figures']}/{t['figures']}  |  "
+          f"summarized {t['summary_figures']}/{t['figures']}")
+    print(f"Runtime:             {t['seconds'] * 1000:.1f} ms total, "
+          f"{t['seconds'] * 1000 / t['snapshots']:.1f} ms per snapshot")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(0)
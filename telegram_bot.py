@@ -1,14 +1,18 @@
 import os
+import time
 import requests
-from typing import List, Dict
+from typing import List, Dict, Optional
 import json
 import re
+from report_renderer import Report, parse_report_text, render_telegram_messages
+from storage import latest_report, read_text
 
 class TelegramBot:
     def __init__(self, token: str, chat_id: str):
         self.token = token
         self.chat_id = chat_id
-        self.base_url = f"https://api.telegram.org/bot{token}"
+        api_base = os.getenv('TELEGRAM_API_BASE', 'https://api.telegram.org')
+        self.base_url = f"{api_base.rstrip('/')}/bot{token}"
 
     def escape_markdown(self, text: str) -> str:
         """Escape special characters for Telegram Markdown."""
@@ -33,6 +37,21 @@ class TelegramBot:
         
         return f"{formatted_name}\n\n{content}"
 
+    def _call(self, method: str, data: Dict) -> Optional[Dict]:
+        """Call a Bot API method, returning its result or None on failure."""
+        try:
+            response = requests.post(f"{self.base_url}/{method}", json=data)
+            response.raise_for_status()
+        except Exception as e:
+            print(f"Error calling {method}: {e}")
+            if hasattr(e, 'response') and e.response is not None:
+                print(f"Response content: {e.response.text}")
+            return None
+        try:
+            return response.json().get('result') or {}
+        except ValueError:
+            return {}
+
     def send_message(self, text: str, parse_mode: str = "MarkdownV2") -> bool:
         """Send a message to the specified chat.
         
@@ -40,85 +59,80 @@ class TelegramBot:
             text (str): The message text to send
             parse_mode (str): The parse mode to use ("MarkdownV2" or "HTML")
         """
-        url = f"{self.base_url}/sendMessage"
-        data = {
-            "chat_id": self.chat_id,
-            "text": text,
-            "parse_mode": parse_mode
-        }
-        try:
-            response = requests.post(url, json=data)
-            response.raise_for_status()
-            return True
-        except Exception as e:
-            print(f"Error sending message: {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                print(f"Response content: {e.response.text}")
+        return self.post_message(text, parse_mode) is not None
+
+    def post_message(self, text: str, parse_mode: str = "MarkdownV2") -> Optional[int]:
+        """Send a message and return its message_id (0 if the API omits it), or None on failure."""
+        result = self._call("sendMessage", {"chat_id": self.chat_id, "text": text, "parse_mode": parse_mode})
+        return None if result is None else result.get('message_id', 0)
+
+    def edit_message(self, message_id: int, text: str, parse_mode: str = "MarkdownV2") -> bool:
+        """Replace the text of a message sent earlier."""
+        return self._call("editMessageText", {"chat_id": self.chat_id, "message_id": message_id,
+                                              "text": text, "parse_mode": parse_mode}) is not None
+
+class ReportDelivery:
+    """Sends a preliminary note first and later edits the full report into it, timing the first message."""
+
+    def __init__(self, bot: TelegramBot, started: Optional[float] = None):
+        self.bot = bot
+        self.started = started if started is not None else time.perf_counter()
+        self.preliminary_id = None
+        self.first_message_seconds = None
+        self.report_seconds = None
+
+    def _delivered(self):
+        if self.first_message_seconds is None:
+            self.first_message_seconds = time.perf_counter() - self.started
+
+    def send_preliminary(self, report: Report) -> bool:
+        self.preliminary_id = self.bot.post_message(render_telegram_messages(report)[0], parse_mode='HTML')
+        if self.preliminary_id is None:
             return False
+        self._delivered()
+        return True
+
+    def send_report(self, messages: List[str]) -> int:
+        """Send the report parts, the first replacing the preliminary note. Returns how many were delivered."""
+        delivered = 0
+        for i, message in enumerate(messages, 1):
+            try:
+                if i == 1 and self.preliminary_id and self.bot.edit_message(self.preliminary_id, message,
+                                                                            parse_mode='HTML'):
+                    print(f"✅ Replaced the preliminary note with part 1/{len(messages)}")
+                elif self.bot.send_message(message, parse_mode='HTML'):
+                    self._delivered()
+                    print(f"✅ Successfully sent part {i}/{len(messages)} to Telegram")
+                else:
+                    print(f"❌ Failed to send part {i}/{len(messages)} to Telegram")
+                    continue
+                delivered += 1
+            except Exception as e:
+                print(f"❌ Error sending part {i}/{len(messages)} to Telegram: {e}")
+        self.report_seconds = time.perf_counter() - self.started
+        return delivered
+
+    def send_full_report(self, report: Report) -> int:
+        """Send the final report; in diff mode only its What Changed section."""
+        changes_section = report.section('What Changed')
+        if changes_section:
+            report = Report(generated=report.generated, summary=report.summary, sections=[changes_section])
+        delivered = self.send_report(render_telegram_messages(report))
+        print("📱 Telegram notification complete!")
+        if self.first_message_seconds is not None:
+            print(f"⚡ First Telegram message after {self.first_message_seconds:.1f}s, "
+                  f"full report after {self.report_seconds:.1f}s")
+        return delivered
+
 
 def parse_news_report(file_path: str) -> Dict[str, str]:
     """Parse the news report file and extract different sections."""
-    sections = {
-        "Key Sector Trends": "",
-        "Buy Opportunities": "",
-        "Macro Implications": "",
-        "Earnings Results": "",
-        "Dividend Announcements": "",
-        "Business Updates": ""
-    }
-    
-    current_section = None
-    section_content = []
-    
-    with open(file_path, 'r', encoding='utf-8') as file:
-        for line in file:
-            line = line.strip()
-            
-            # Skip empty lines and decorative lines
-            if not line or line.startswith('╔') or line.startswith('║') or line.startswith('╚'):
-                continue
-                
-            # Check for section headers
-            if line.startswith('* **Key Sector Trends**'):
-                if current_section and section_content:
-                    sections[current_section] = '\n'.join(section_content)
-                current_section = "Key Sector Trends"
-                section_content = [line.replace('* **', '').replace('**', '')]  # Clean up markdown
-            elif line.startswith('* **Buy**'):
-                if current_section and section_content:
-                    sections[current_section] = '\n'.join(section_content)
-                current_section = "Buy Opportunities"
-                section_content = [line.replace('* **', '').replace('**', '')]  # Clean up markdown
-            elif line.startswith('* **Macro Implications**'):
-                if current_section and section_content:
-                    sections[current_section] = '\n'.join(section_content)
-                current_section = "Macro Implications"
-                section_content = [line.replace('* **', '').replace('**', '')]  # Clean up markdown
-            elif line.startswith('* **Earnings Results**'):
-                if current_section and section_content:
-                    sections[current_section] = '\n'.join(section_content)
-                current_section = "Earnings Results"
-                section_content = [line.replace('* **', '').replace('**', '')]  # Clean up markdown
-            elif line.startswith('* **Dividend Announcements**'):
-                if current_section and section_content:
-                    sections[current_section] = '\n'.join(section_content)
-                current_section = "Dividend Announcements"
-                section_content = [line.replace('* **', '').replace('**', '')]  # Clean up markdown
-            elif line.startswith('* **Business Updates**'):
-                if current_section and section_content:
-                    sections[current_section] = '\n'.join(section_content)
-                current_section = "Business Updates"
-                section_content = [line.replace('* **', '').replace('**', '')]  # Clean up markdown
-            elif current_section:
-                # Clean up bullet points and other markdown
-                line = line.replace('* ', '• ').replace('+ ', '• ')
-                section_content.append(line)
+    report = parse_report_text(read_text(file_path))
     
-    # Add the last section
-    if current_section and section_content:
-        sections[current_section] = '\n'.join(section_content)
-    
-    return sections
+    return {
+        section.title: '\n'.join(f"{'  ' * b.level}• {b.text.replace('**', '')}" for b in section.bullets)
+        for section in report.sections
+    }
 
 def main():
     # Get Telegram bot token and chat ID from environment variables
@@ -133,28 +147,23 @@ def main():
     bot = TelegramBot(token, chat_id)
     
     # Get the latest news report file
-    news_files = [f for f in os.listdir('data') if f.startswith('zerodha_news_report_') and f.endswith('.txt')]
-    if not news_files:
+    file_path = latest_report()
+    if not file_path:
         print("No news report files found in data directory")
         return
     
-    latest_file = sorted(news_files)[-1]
-    file_path = os.path.join('data', latest_file)
+    # Parse the news report and send it in as few messages as fit
+    report = parse_report_text(read_text(file_path))
     
-    # Parse the news report
-    sections = parse_news_report(file_path)
-    
-    # Send each section as a separate message
-    for section_name, content in sections.items():
-        if content:  # Only send non-empty sections
-            try:
-                message = bot.format_message(section_name, content)
-                if bot.send_message(message):
-                    print(f"Successfully sent {section_name} section")
-                else:
-                    print(f"Failed to send {section_name} section")
-            except Exception as e:
-                print(f"Error formatting/sending {section_name} section: {e}")
+    messages = render_telegram_messages(report)
+    for i, message in enumerate(messages, 1):
+        try:
+            if bot.send_message(message, parse_mode='HTML'):
+                print(f"Successfully sent part {i}/{len(messages)}")
+            else:
+                print(f"Failed to send part {i}/{len(messages)}")
+        except Exception as e:
+            print(f"Error sending part {i}/{len(messages)}: {e}")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,35 @@
+from alerts import AlertEngine, Rule
+
+ITEM = {'headline': "SEBI penalty on Infosys over disclosure lapse", 'description': '',
+        'url': 'https://example.com/infosys-penalty'}
+
+
+def engine(tmp_path, outcomes):
+    sent = []
+
+    def send(chat_id, text):
+        sent.append(chat_id)
+        return outcomes.pop(0)
+
+    rules = [Rule(chat_id='1', name='penalties', keywords=['penalty'])]
+    return AlertEngine(rules, send, state_path=str(tmp_path / 'alerts.json')), sent
+
+
+def test_failed_alert_is_retried(tmp_path):
+    alerts, sent = engine(tmp_path, [False, True, True])
+    alerts.on_item(dict(ITEM))
+    alerts._queue.join()
+    alerts.on_item(dict(ITEM))
+    alerts._queue.join()
+    alerts.on_item(dict(ITEM))
+    alerts.close()
+    assert sent == ['1', '1']
+    assert alerts.stats['failed'] == 1 and alerts.stats['alerts'] == 1
+
+
+def test_copies_queued_together_alert_once(tmp_path):
+    alerts, sent = engine(tmp_path, [True, True])
+    alerts.on_item(dict(ITEM))
+    alerts.on_item({**ITEM, 'source': 'Another feed'})
+    alerts.close()
+    assert sent == ['1']
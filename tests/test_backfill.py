@@ -0,0 +1,60 @@
+import asyncio
+import json
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import zerodha_news_analyzer as z
+from backfill import LLMStage, run_backfill
+
+NEWS = [{'headline': f"Company {i} reports quarterly results with revenue up {i}%",
+         'description': "Margins improved on lower input costs.", 'source': 'Test',
+         'time': '10:00 AM, 27 May 2025', 'url': f'https://example.com/{i}'} for i in range(3)]
+RECORD = {'sector': 'it', 'ticker': 'INFY', 'action': 'trend', 'figures': [], 'summary': 'Revenue up', 'source': 1}
+
+
+def test_bad_snapshot_does_not_abort_the_backfill(tmp_path):
+    good = tmp_path / 'pulse_news_20250527_215702.json'
+    good.write_text(json.dumps(NEWS), encoding='utf-8')
+    bad = tmp_path / 'pulse_news_20250528_215702.json'
+    bad.write_text('[{"headline": ', encoding='utf-8')
+
+    stats = asyncio.run(run_backfill([str(good), str(bad)], workers=1, out_dir=str(tmp_path / 'out')))
+    assert stats['prepared'] == 1 and stats['failed'] == 1
+    assert stats['shards_data'][0]['snapshot'] == str(good)
+
+
+def test_llm_stage_escalates_through_the_tiers(tmp_path, monkeypatch):
+    monkeypatch.setenv('GROQ_SMALL_MODEL', 'llama-3.1-8b-instant')
+    analyzer = z.StreamlinedFinancialNewsAnalyzer('gsk_test')
+    analyzer.token_budget.usage_file = str(tmp_path / 'usage.json')
+    models = []
+
+    async def completions(request):
+        model = (await request.json())['model']
+        models.append(model)
+        content = json.dumps({'records': [RECORD]}) if model == analyzer.model else "not json"
+        return web.json_response({'choices': [{'message': {'content': content}}],
+                                  'usage': {'prompt_tokens': 100, 'completion_tokens': 20}})
+
+    async def run():
+        app = web.Application()
+        app.router.add_post('/v1', completions)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            analyzer.base_url = str(server.make_url('/v1'))
+            stage = LLMStage(analyzer, str(tmp_path / 'out'), requests_per_minute=6000)
+            shard = {'snapshot': 'pulse_news_20250527_215702.json', 'news': NEWS, 'analyze': [0, 1, 2]}
+            async with aiohttp.ClientSession() as session:
+                return await stage.run_shard(session, shard)
+        finally:
+            await server.close()
+
+    result = asyncio.run(run())
+    assert models == ['llama-3.1-8b-instant', analyzer.model]
+    assert result['tiers'] == ['large'] and result['api_calls'] == 2
+    assert [r['ticker'] for r in result['records']] == ['INFY']
+    tiers = analyzer.token_budget.summary()['tiers']
+    assert tiers['small']['escalated'] == 1 and tiers['large']['calls'] == 1
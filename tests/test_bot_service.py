@@ -0,0 +1,105 @@
+import asyncio
+import os
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from bot_service import BotService, ReportCache
+from entity_extractor import EntityExtractor
+from entity_index import EntityIndex, INDEX_DIR
+from report_renderer import Bullet, Report, Section, render_text
+
+REPORT = Report(generated='2025-05-27 21:54:55', summary='2 items analyzed', sections=[
+    Section('Banking', '🏦', [Bullet("**SBIN**: Deposits grew 12%")]),
+    Section('Technology', '💻', [Bullet("**INFY**: Infosys board approves buyback")])])
+
+
+class FakeTelegram:
+    """getUpdates serves the queued polls in order; sendMessage records replies after the scripted failures."""
+
+    def __init__(self, polls, send_failures):
+        self.polls = list(polls)
+        self.send_failures = list(send_failures)
+        self.sent = []
+        self.get_calls = 0
+
+    async def get_updates(self, request):
+        self.get_calls += 1
+        updates = self.polls.pop(0) if self.polls else []
+        return web.json_response({'ok': True, 'result': updates})
+
+    async def send_message(self, request):
+        if self.send_failures:
+            failure = self.send_failures.pop(0)
+            if failure == 429:
+                return web.json_response({'ok': False, 'parameters': {'retry_after': 0}}, status=429)
+            return web.Response(text="<html>Bad gateway</html>", status=502, content_type='text/html')
+        payload = await request.json()
+        self.sent.append((payload['chat_id'], payload['text']))
+        return web.json_response({'ok': True, 'result': {}})
+
+
+def update(update_id, chat_id, text):
+    return {'update_id': update_id, 'message': {'chat': {'id': chat_id}, 'text': text}}
+
+
+def serve_bot(fake, cache, max_polls):
+    async def run():
+        app = web.Application()
+        app.router.add_post('/botTEST/getUpdates', fake.get_updates)
+        app.router.add_post('/botTEST/sendMessage', fake.send_message)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            service = BotService('TEST', cache, api_base=str(server.make_url('')), poll_timeout=0)
+            await service.run(max_polls=max_polls)
+            return service
+        finally:
+            await server.close()
+    return asyncio.run(run())
+
+
+def make_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data')
+    with open(os.path.join('data', 'zerodha_news_report_2025-05-27_21-54-55.txt'), 'w', encoding='utf-8') as f:
+        f.write(render_text(REPORT))
+    EntityIndex(INDEX_DIR, EntityExtractor(aliases={'state bank of india': 'SBIN'})).add_items(
+        [{'headline': "State Bank of India raises deposit rates", 'url': 'https://example.com/sbi'}])
+    return ReportCache('data')
+
+
+def test_commands_are_answered_through_retries(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, monkeypatch)
+    fake = FakeTelegram(polls=[[update(1, 10, '/latest')], [update(2, 10, '/sector banking'),
+                                                             update(3, 11, '/stock@pulse_bot SBIN')]],
+                        send_failures=[429, 'html'])
+    service = serve_bot(fake, cache, max_polls=2)
+
+    assert service.stats['updates'] == 3 and service.stats['errors'] == 0
+    assert fake.send_failures == []
+    by_chat = {}
+    for chat_id, text in fake.sent:
+        by_chat.setdefault(chat_id, []).append(text)
+    # The /latest reply waits out the retries, so /sector may be delivered first
+    assert len(by_chat[10]) == 2
+    sector = next(text for text in by_chat[10] if text.startswith('<b>Banking</b>'))
+    latest = next(text for text in by_chat[10] if text is not sector)
+    assert 'Infosys board approves buyback' in latest and 'Deposits grew 12%' in latest
+    assert '<b>Banking</b>' in sector and 'Deposits grew 12%' in sector and 'Infosys' not in sector
+    stock = by_chat[11][0]
+    assert '<b>SBIN</b>' in stock and 'https://example.com/sbi' in stock
+
+
+def test_answer_errors_are_contained(tmp_path, monkeypatch):
+    class Broken(ReportCache):
+        def answer(self, command, argument):
+            if command == '/stock':
+                raise RuntimeError("index unreadable")
+            return super().answer(command, argument)
+
+    make_cache(tmp_path, monkeypatch)
+    fake = FakeTelegram(polls=[[update(1, 10, '/stock SBIN'), update(2, 10, '/help')]], send_failures=[])
+    service = serve_bot(fake, Broken('data'), max_polls=1)
+    assert service.stats['errors'] == 1
+    assert [text.startswith('<b>Commands</b>') for _, text in fake.sent] == [True]
@@ -0,0 +1,24 @@
+from alerts import max_crore
+from entity_extractor import EntityExtractor
+
+
+def extract(text):
+    return EntityExtractor(aliases={}).extract(text)
+
+
+def test_rupee_amounts():
+    assert extract("Board approves Rs 500 crore buyback")['amounts'] == ["₹500 crore"]
+    assert extract("Order worth INR 1,200 cr")['amounts'] == ["₹1,200 crore"]
+    assert extract("Capex of ₹2.5 lakh crore planned")['amounts'] == ["₹2.5 lakh crore"]
+
+
+def test_rs_inside_words_is_not_a_currency():
+    assert extract("Sensex soars 10,000 points")['amounts'] == []
+    assert extract("Highest in years 2025 so far")['amounts'] == []
+    assert extract("Analysts see margins 12 quarters out")['amounts'] == []
+
+
+def test_alert_amount_ignores_rs_inside_words():
+    assert max_crore("Sensex soars 10,000 points") == 0.0
+    assert max_crore("Highest in years 2025 so far") == 0.0
+    assert max_crore("Board approves Rs 500 crore buyback") == 500.0
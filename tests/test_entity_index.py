@@ -0,0 +1,39 @@
+import json
+
+from entity_index import EntityIndex
+from entity_extractor import EntityExtractor
+
+ALIASES = {'infosys': 'INFY', 'tata steel': 'TATASTEEL'}
+
+
+def item(n, headline):
+    return {'headline': headline, 'description': '', 'url': f'https://example.com/{n}'}
+
+
+def test_reload_reposts_articles_missing_from_postings(tmp_path):
+    extractor = EntityExtractor(aliases=ALIASES)
+    index = EntityIndex(str(tmp_path), extractor)
+    index.add_items([item(0, "Infosys wins a large deal")])
+    postings = (tmp_path / 'postings.bin').read_bytes()
+    index.add_items([item(1, "Tata Steel raises prices"), item(2, "Infosys declares dividend")])
+
+    # Crash between the article log append and the postings rewrite
+    (tmp_path / 'postings.bin').write_bytes(postings)
+    reloaded = EntityIndex(str(tmp_path), extractor)
+    assert [a['id'] for a in reloaded.query(ticker='INFY')] == [2, 0]
+    assert [a['id'] for a in reloaded.query(ticker='TATASTEEL')] == [1]
+
+
+def test_torn_line_and_corrupt_postings(tmp_path):
+    extractor = EntityExtractor(aliases=ALIASES)
+    EntityIndex(str(tmp_path), extractor).add_items([item(0, "Infosys wins a large deal")])
+    with open(tmp_path / 'articles.jsonl', 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'id': 1, 'key': 'x'})[:10])
+    (tmp_path / 'postings.bin').write_bytes(b'garbage')
+
+    index = EntityIndex(str(tmp_path), extractor)
+    assert [a['id'] for a in index.query(ticker='INFY')] == [0]
+    index.add_items([item(1, "Tata Steel raises prices")])
+    reloaded = EntityIndex(str(tmp_path), extractor)
+    assert [a['id'] for a in reloaded.query(ticker='TATASTEEL')] == [1]
+    assert len(reloaded.articles) == 2
@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+from insight_schema import parse_batch_records
+
+RECORD = {'sector': 'banking', 'ticker': 'SBIN', 'action': 'trend', 'summary': 'Deposits grew', 'source': 1}
+
+
+def parse(**fields):
+    return parse_batch_records(json.dumps({'records': [{**RECORD, **fields}]}), batch_size=5, offset=10)
+
+
+def test_valid_record():
+    records, rejected = parse(figures=['₹1,496 crore', ' ', '+19%'])
+    assert rejected == 0
+    assert records == [{**RECORD, 'ticker': 'SBIN', 'figures': ['₹1,496 crore', '+19%'], 'source': 11}]
+
+
+def test_null_figures_are_empty():
+    records, _ = parse(figures=None)
+    assert records[0]['figures'] == []
+
+
+@pytest.mark.parametrize('figures', ['₹5 crore', 12, {'value': '₹5'}])
+def test_non_list_figures_reject_the_response(figures):
+    with pytest.raises(ValueError):
+        parse(figures=figures)
+
+
+def test_out_of_range_source_drops_the_record():
+    records, rejected = parse(source=9)
+    assert records == [] and rejected == 1
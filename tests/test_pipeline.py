@@ -0,0 +1,74 @@
+import asyncio
+import json
+import time
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+NEWS = [{'headline': f"{company} shares rise {n}% after strong quarterly results",
+         'description': f"{company} beat estimates as margins widened.", 'source': 'Test',
+         'time': '10:00 AM, 27 May 2025', 'url': f'https://example.com/{n}'}
+        for n, company in enumerate(['Infosys', 'Tata Steel', 'State Bank of India', 'Sun Pharma', 'NTPC',
+                                     'Wipro', 'HDFC Bank', 'Maruti Suzuki'], 1)]
+
+
+class Delivery:
+    first_message_seconds = 0.0
+
+    def __init__(self):
+        self.preliminary_at = None
+
+    def send_preliminary(self, report):
+        self.preliminary_at = time.monotonic()
+        return True
+
+    def send_full_report(self, report):
+        return True
+
+
+def test_fast_lane_starts_before_the_crawl_ends(tmp_path, monkeypatch):
+    import zerodha_news_analyzer as z
+    from pipeline import StreamingPipeline
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    for name, value in (('ENRICH_TOP_N', '0'), ('BACKGROUND_CONTEXT_ITEMS', '0'), ('FAST_LANE_ITEMS', '3')):
+        monkeypatch.setenv(name, value)
+    crawl_end = []
+
+    async def completions(request):
+        body = await request.json()
+        if body.get('response_format'):
+            content = json.dumps({'records': []})
+        else:
+            content = "**Top Movers** 🚀\n- Infosys up on results"
+        return web.json_response({'choices': [{'message': {'content': content}}],
+                                  'usage': {'prompt_tokens': 500, 'completion_tokens': 40}})
+
+    def scrape(emit):
+        for news_item in NEWS:
+            emit(dict(news_item))
+            time.sleep(0.1)
+        crawl_end.append(time.monotonic())
+        return [dict(n) for n in NEWS]
+
+    async def run():
+        app = web.Application()
+        app.router.add_post('/v1', completions)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            analyzer = z.StreamlinedFinancialNewsAnalyzer('gsk_test')
+            analyzer.base_url = str(server.make_url('/v1'))
+            analyzer.token_budget.usage_file = str(tmp_path / 'usage.json')
+            delivery = Delivery()
+            outcome = await StreamingPipeline(analyzer, scrape, delivery=delivery, requests_per_minute=6000).run()
+            return outcome, delivery
+        finally:
+            await server.close()
+
+    outcome, delivery = asyncio.run(run())
+    assert delivery.preliminary_at is not None
+    # Three items arrive in ~0.3s; the crawl of eight takes ~0.8s
+    assert 0 < outcome['stats']['fast_lane_start'] < 0.6
+    assert delivery.preliminary_at < crawl_end[0]
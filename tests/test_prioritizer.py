@@ -0,0 +1,23 @@
+from prioritizer import BudgetedScheduler
+
+SECTORS = ['banking', 'it', 'pharma', 'auto', 'energy', 'metals']
+
+
+def test_sector_floors_are_scaled_to_max_items():
+    scheduler = BudgetedScheduler(max_items=8, min_per_sector=2)
+    quotas = scheduler.allocate({sector: 5 for sector in SECTORS})
+    assert sum(quotas.values()) <= 8
+    assert all(quota >= 1 for quota in quotas.values())
+
+    scheduler = BudgetedScheduler(max_items=4, min_per_sector=2)
+    assert sum(scheduler.allocate({sector: 5 for sector in SECTORS}).values()) <= 4
+
+
+def test_select_never_exceeds_max_items():
+    keywords = {sector: [sector] for sector in SECTORS}
+    news = [{'headline': f"{sector} story {i}", 'description': '', 'entities': {}, 'priority': 10 - i}
+            for sector in SECTORS for i in range(5)]
+    scheduler = BudgetedScheduler(max_items=8, min_per_sector=2, sector_keywords=keywords)
+    selected, deferred = scheduler.select(news)
+    assert len(selected) == 8
+    assert len(selected) + len(deferred) == len(news)
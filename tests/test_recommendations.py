@@ -0,0 +1,29 @@
+import pytest
+
+from entity_extractor import EntityExtractor
+from recommendations import RecommendationLedger, parse_calls, rating_side
+from report_renderer import Bullet
+
+
+def sides(bullets):
+    return [(c['ticker'], c['side']) for c in parse_calls(bullets, EntityExtractor())]
+
+
+def test_rating_change_takes_the_new_rating():
+    assert rating_side("Nalco downgraded to 'Hold' by Motilal") == 'hold'
+    assert rating_side("Jefferies upgrades Infosys to buy") == 'buy'
+    assert rating_side("ITC: downgrade on weak margins") == 'sell'
+    assert rating_side("Results in line") is None
+
+
+def test_downgrade_to_hold_is_not_a_sell_call():
+    bullets = [Bullet('Sell:'), Bullet("Nalco downgraded to 'Hold'", level=1), Bullet("ITC: weak volumes", level=1)]
+    assert sides(bullets) == [('NATIONALUM', 'hold'), ('ITC', 'sell')]
+
+
+def test_hold_calls_cannot_be_backtested(tmp_path):
+    ledger = RecommendationLedger(str(tmp_path / 'calls.db'))
+    assert len(ledger.arrays()['sign']) == 0
+    with pytest.raises(ValueError):
+        ledger.arrays(('buy', 'hold'))
+    ledger.close()
@@ -0,0 +1,38 @@
+from html.parser import HTMLParser
+
+from report_renderer import chunk_blocks, split_long_line
+
+
+class TagBalance(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.stack = []
+
+    def handle_starttag(self, tag, attrs):
+        self.stack.append(tag)
+
+    def handle_endtag(self, tag):
+        assert self.stack and self.stack[-1] == tag, f"unbalanced </{tag}>"
+        self.stack.pop()
+
+
+def test_overlong_line_is_split_on_utf8_boundaries():
+    line = "<b>Infosys</b>: <b>" + "₹ लाभ &amp; growth " * 400 + "</b> <a href=\"https://example.com/a\">link</a>"
+    chunks = chunk_blocks(["<b>Section</b>\n" + line], 4000)
+    assert len(chunks) > 1
+    assert all(len(c.encode('utf-8')) <= 4000 for c in chunks)
+    assert "".join(c.replace("<b>", "").replace("</b>", "") for c in chunks).count("&amp;") == 400
+    for chunk in chunks:
+        parser = TagBalance()
+        parser.feed(chunk)
+        assert parser.stack == []
+
+
+def test_line_without_spaces_is_hard_split():
+    parts = split_long_line("₹" * 50, 20)
+    assert "".join(parts) == "₹" * 50
+    assert all(len(p.encode('utf-8')) <= 20 for p in parts)
+
+
+def test_short_blocks_are_packed_together():
+    assert chunk_blocks(["a", "b"], 100) == ["a\n\nb"]
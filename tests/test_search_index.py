@@ -0,0 +1,38 @@
+import sqlite3
+
+from search_index import SearchIndex
+
+ITEMS = [{'headline': "Infosys board approves buyback", 'description': "Rs 18,000 crore at a premium."},
+         {'headline': "Sensex ends higher led by banks", 'url': "https://example.com/sensex"}]
+
+
+def test_items_without_urls_are_not_reindexed(tmp_path):
+    index = SearchIndex(str(tmp_path / 'search.db'))
+    assert index.add_items(ITEMS) == 2
+    assert index.add_items(ITEMS) == 0
+    assert index.count() == 2
+    assert [r['headline'] for r in index.search("buyback")] == ["Infosys board approves buyback"]
+
+
+def test_keys_added_to_an_existing_index(tmp_path):
+    db = str(tmp_path / 'search.db')
+    conn = sqlite3.connect(db)
+    conn.executescript("""
+        CREATE TABLE articles (id INTEGER PRIMARY KEY, url TEXT UNIQUE, headline TEXT NOT NULL,
+                               description TEXT, source TEXT, time TEXT, indexed_at REAL);
+        CREATE VIRTUAL TABLE articles_fts USING fts5(
+            headline, description, content='articles', content_rowid='id', tokenize='porter unicode61');
+        CREATE TRIGGER articles_ai AFTER INSERT ON articles BEGIN
+            INSERT INTO articles_fts(rowid, headline, description) VALUES (new.id, new.headline, new.description);
+        END;
+    """)
+    for _ in range(3):
+        conn.execute("INSERT INTO articles (url, headline, description) VALUES (NULL, ?, ?)",
+                     (ITEMS[0]['headline'], ITEMS[0]['description']))
+    conn.commit()
+    conn.close()
+
+    index = SearchIndex(db)
+    assert index.count() == 1
+    assert len(index.search("buyback")) == 1
+    assert index.add_items(ITEMS) == 1
@@ -0,0 +1,22 @@
+from sentiment import SentimentSeries
+
+NEWS = [{'headline': "Infosys profit jumps 20% on strong deal wins", 'description': '', 'url': 'https://example.com/1'},
+        {'headline': "Tata Steel shares fall after weak Europe outlook", 'description': '', 'url': 'https://example.com/2'}]
+
+
+def day_count():
+    return sum(count for _, _, count in SentimentSeries().query('day', 'overall', 1))
+
+
+def test_repeated_scrapes_count_each_story_once(tmp_path, monkeypatch):
+    import zerodha_news_analyzer as z
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    z.store_scraped_news([dict(n) for n in NEWS])
+    assert day_count() == 2
+    z.store_scraped_news([dict(n) for n in NEWS])
+    assert day_count() == 2
+    later = {'headline': "NTPC commissions 500 MW solar capacity", 'description': '', 'url': 'https://example.com/3'}
+    z.store_scraped_news([dict(n) for n in NEWS] + [later])
+    assert day_count() == 3
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import time
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from sources import FeedAdapter, PulseAdapter, ScrapeEngine, SourceAdapter, dedup_items, parse_feed, parse_pulse_html
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def scrape(adapters, handlers, **engine_args):
+    """Serve the handlers on a local aiohttp server and scrape it. Returns (items, stats, base url)."""
+    async def run():
+        app = web.Application()
+        for path, handler in handlers.items():
+            app.router.add_get(path, handler)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            base = str(server.make_url('')).rstrip('/')
+            engine = ScrapeEngine([make(base) for make in adapters], **engine_args)
+            items = await engine.run()
+            return items, engine.stats
+        finally:
+            await server.close()
+    return asyncio.run(run())
+
+
+def serve(name, content_type):
+    async def handler(request):
+        return web.Response(text=fixture(name), content_type=content_type)
+    return handler
+
+
+def test_parse_pulse_html():
+    items = parse_pulse_html(fixture('pulse.html'))
+    assert [n['headline'] for n in items] == ["Infosys board approves Rs 18,000 crore buyback",
+                                              "Sensex ends higher led by banks"]
+    assert items[0]['source'] == "Economic Times"
+    assert items[0]['time'] == "09:05 PM, 27 May 2025"
+    assert items[1]['time'] == "Unknown time"
+    assert items[1]['url'] == "https://example.com/markets/sensex-close"
+
+
+def test_parse_rss_and_atom():
+    rss = parse_feed(fixture('feed.rss'), 'Livemint')
+    assert len(rss) == 3
+    assert rss[0]['description'] == "The IT major will buy back shares."
+    assert rss[0]['time'] == "09:05 PM, 27 May 2025"  # 15:35 UTC in IST
+    assert all(n['source'] == 'Livemint' for n in rss)
+
+    atom = parse_feed(fixture('feed.atom'), 'Business Standard')
+    assert atom == [{'headline': "NTPC commissions 500 MW solar capacity",
+                     'description': "The power major added capacity in Rajasthan.",
+                     'source': 'Business Standard', 'time': "12:00 PM, 27 May 2025",
+                     'url': "https://example.net/ntpc-solar"}]
+    assert parse_feed("<rss><channel>", 'Broken') == []
+
+
+def test_dedup_by_url_and_headline():
+    items = dedup_items(parse_pulse_html(fixture('pulse.html')) + parse_feed(fixture('feed.rss'), 'Livemint'))
+    # Infosys matches by URL (case and trailing slash aside), Sensex by normalized headline
+    assert [n['headline'] for n in items] == ["Infosys board approves Rs 18,000 crore buyback",
+                                              "Sensex ends higher led by banks",
+                                              "Tata Steel Q4 profit rises 12%"]
+    # The Pulse copy had no time for the Sensex story; the feed copy fills it in
+    assert items[1]['time'] != "Unknown time"
+    assert items[1]['source'] == "Moneycontrol"
+
+
+def test_scrape_engine_dedups_across_sources():
+    handlers = {'/': serve('pulse.html', 'text/html'),
+                '/rss': serve('feed.rss', 'application/rss+xml'),
+                '/atom': serve('feed.atom', 'application/atom+xml')}
+    adapters = [lambda base: PulseAdapter(base + '/'),
+                lambda base: FeedAdapter('Livemint', base + '/rss'),
+                lambda base: FeedAdapter('Business Standard', base + '/atom')]
+    handed_on = []
+    items, stats = scrape(adapters, handlers, min_host_interval=0, on_item=handed_on.append)
+    assert len(items) == 4
+    # The hook sees each story once, even though Pulse and the RSS feed both carry two of them
+    assert len(handed_on) == 4
+    assert {n['headline'] for n in handed_on} == {n['headline'] for n in items}
+    assert {n['headline'] for n in items} >= {"Tata Steel Q4 profit rises 12%", "NTPC commissions 500 MW solar capacity"}
+    assert stats['Zerodha Pulse']['items'] == 2
+    assert stats['Livemint']['items'] == 3
+    assert all(s['errors'] == 0 for s in stats.values())
+
+
+def test_scrape_engine_counts_failed_fetches():
+    async def broken(request):
+        raise web.HTTPInternalServerError()
+    items, stats = scrape([lambda base: FeedAdapter('Broken', base + '/rss')], {'/rss': broken}, min_host_interval=0)
+    assert items == []
+    assert stats['Broken']['errors'] == 1
+
+
+def test_per_host_connection_limit():
+    active = {'now': 0, 'max': 0}
+
+    async def slow(request):
+        active['now'] += 1
+        active['max'] = max(active['max'], active['now'])
+        await asyncio.sleep(0.05)
+        active['now'] -= 1
+        return web.Response(text=fixture('feed.atom'), content_type='application/atom+xml')
+
+    adapters = [lambda base, i=i: FeedAdapter(f'Feed {i}', f'{base}/feed/{i}') for i in range(6)]
+    items, stats = scrape(adapters, {'/feed/{n}': slow}, per_host_limit=2, min_host_interval=0)
+    assert len(stats) == 6 and all(s['items'] == 1 for s in stats.values())
+    assert active['max'] == 2
+
+
+def test_min_host_interval_spaces_requests():
+    starts = []
+
+    async def handler(request):
+        starts.append(time.monotonic())
+        return web.Response(text=fixture('feed.atom'), content_type='application/atom+xml')
+
+    adapters = [lambda base, i=i: FeedAdapter(f'Feed {i}', f'{base}/feed/{i}') for i in range(3)]
+    scrape(adapters, {'/feed/{n}': handler}, per_host_limit=4, min_host_interval=0.1)
+    gaps = [b - a for a, b in zip(starts, starts[1:])]
+    assert len(gaps) == 2 and min(gaps) >= 0.09
+
+
+def test_source_adapter_is_abstract():
+    with pytest.raises(TypeError):
+        SourceAdapter('Bare', [])
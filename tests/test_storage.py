@@ -0,0 +1,48 @@
+import os
+import threading
+
+import storage
+from storage import atomic_write_json, read_json
+
+
+def test_concurrent_atomic_writes(tmp_path):
+    path = str(tmp_path / 'usage.json')
+    errors = []
+
+    def write(writer):
+        for i in range(100):
+            try:
+                atomic_write_json(path, {'writer': writer, 'i': i, 'pad': 'x' * 1000 * writer})
+            except OSError as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    data = read_json(path)
+    assert data['i'] == 99 and len(data['pad']) == 1000 * data['writer']
+    assert os.listdir(tmp_path) == ['usage.json']
+
+
+def test_concurrent_manifest_updates_keep_every_entry(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, 'RETENTION', {'report': {'keep': 1000, 'keep_plain': 1000}})
+    manifest_path = str(tmp_path / 'manifest.json')
+
+    def add(writer):
+        for i in range(20):
+            path = str(tmp_path / f"report_{writer}_{i}.txt")
+            with open(path, 'w') as f:
+                f.write('report')
+            with storage.locked_manifest(manifest_path) as manifest:
+                manifest.add('report', path)
+                storage.apply_retention(manifest, 'report')
+
+    threads = [threading.Thread(target=add, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(storage.Manifest(manifest_path).entries('report')) == 80
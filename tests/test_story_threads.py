@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from story_threads import StoryThreader
+
+BUYBACK = {'headline': "Infosys board approves Rs 18,000 crore share buyback",
+           'description': "The IT major will buy back shares at a premium.", 'entities': {'tickers': ['INFY']}}
+RECORD_DATE = {'headline': "Infosys sets June 10 as record date for Rs 18,000 crore share buyback",
+               'description': "", 'entities': {'tickers': ['INFY']}}
+
+
+def test_headline_only_follow_up_is_new(tmp_path):
+    threader = StoryThreader(path=str(tmp_path / 'threads.json'), vectors_path=str(tmp_path / 'threads.npy'))
+    statuses = [threader.assign([dict(n)])[0] for n in (BUYBACK, BUYBACK, RECORD_DATE, RECORD_DATE)]
+    assert [n['thread_status'] for n in statuses] == ['new', 'repeat', 'follow_up', 'repeat']
+    assert {n['thread_id'] for n in statuses} == {0}
+    assert statuses[2]['new_developments'] == RECORD_DATE['headline']
+
+
+def test_streaming_pipeline_remembers_thread_records(tmp_path, monkeypatch):
+    import zerodha_news_analyzer as z
+    from pipeline import StreamingPipeline
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    for name, value in (('STORY_THREADS', '1'), ('ENRICH_TOP_N', '0'), ('BACKGROUND_CONTEXT_ITEMS', '0')):
+        monkeypatch.setenv(name, value)
+    news = [{'headline': f"{company} reports Q4 profit up {n}% on strong demand",
+             'description': f"{company} beat estimates as margins widened.", 'source': 'Test',
+             'time': '10:00 AM, 27 May 2025', 'url': f'https://example.com/{n}'}
+            for n, company in enumerate(['Infosys', 'Tata Steel', 'State Bank of India', 'Sun Pharma', 'NTPC'], 1)]
+
+    async def completions(request):
+        body = await request.json()
+        if body.get('response_format'):
+            content = json.dumps({'records': [{'sector': 'it', 'ticker': 'INFY', 'action': 'trend',
+                                               'summary': 'Infosys profit up', 'source': 1}]})
+        else:
+            content = "**Key Sector Trends** 🌍📈\n- IT: Infosys profit up"
+        return web.json_response({'choices': [{'message': {'content': content}}],
+                                  'usage': {'prompt_tokens': 500, 'completion_tokens': 40}})
+
+    def scrape(emit):
+        for news_item in news:
+            emit(dict(news_item))
+        return [dict(n) for n in news]
+
+    async def run_twice():
+        app = web.Application()
+        app.router.add_post('/v1', completions)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            outcomes = []
+            for _ in range(2):
+                analyzer = z.StreamlinedFinancialNewsAnalyzer('gsk_test')
+                analyzer.base_url = str(server.make_url('/v1'))
+                analyzer.token_budget.usage_file = str(tmp_path / 'usage.json')
+                outcomes.append(await StreamingPipeline(analyzer, scrape, requests_per_minute=6000).run())
+            return outcomes
+        finally:
+            await server.close()
+
+    first, second = asyncio.run(run_twice())
+    assert first['results']['items_analyzed'] == len(news)
+    threads = json.loads((tmp_path / 'data' / 'story_threads.json').read_text(encoding='utf-8'))
+    assert [t['records'] for t in threads if t.get('records')] == [
+        [{'sector': 'it', 'ticker': 'INFY', 'action': 'trend', 'figures': [], 'summary': 'Infosys profit up'}]]
+    assert second['results']['items_repeated'] == len(news)
@@ -0,0 +1,52 @@
+from datetime import datetime
+
+import token_budget
+from token_budget import TokenBudget
+
+
+def budget(tmp_path, **limits):
+    return TokenBudget('llama-3.3-70b-versatile', usage_file=str(tmp_path / 'usage.json'), **limits)
+
+
+def test_fit_items_respects_the_cost_budget(tmp_path):
+    b = budget(tmp_path, max_run_tokens=10**9, max_daily_tokens=10**9, max_run_cost=0.01, max_daily_cost=1.0)
+    items = [{'n': i} for i in range(10)]
+    kept = b.fit_items(items, lambda item: 10, item_dollars=lambda item: 0.003, fixed_dollars=0.001)
+    assert len(kept) == 3
+
+
+def test_daily_usage_rolls_over_at_midnight(tmp_path, monkeypatch):
+    class Clock(datetime):
+        day = datetime(2025, 5, 27, 23, 59)
+
+        @classmethod
+        def now(cls, tz=None):
+            return cls.day
+
+    monkeypatch.setattr(token_budget, 'datetime', Clock)
+    b = budget(tmp_path, max_daily_tokens=1000)
+    b.record(300, 100)
+    assert b.remaining_tokens() == 600
+    Clock.day = datetime(2025, 5, 28, 0, 1)
+    assert b.remaining_tokens() == 1000
+    b.record(50, 50)
+    assert b.summary()['daily_tokens'] == 100
+    assert TokenBudget('llama-3.3-70b-versatile', usage_file=str(tmp_path / 'usage.json')).daily_usage['date'] == \
+        '2025-05-28'
+
+
+def test_analyzer_fits_the_worst_case_escalation(tmp_path, monkeypatch):
+    import zerodha_news_analyzer as z
+
+    monkeypatch.setenv('GROQ_RUN_COST_BUDGET', '0.002')
+    analyzer = z.StreamlinedFinancialNewsAnalyzer('gsk_test')
+    analyzer.token_budget.usage_file = str(tmp_path / 'usage.json')
+    analyzer.token_budget.daily_usage = {'date': analyzer.token_budget.today, 'tokens': 0, 'cost': 0.0, 'calls': 0}
+    news = [{'headline': f"Company {i} reports quarterly results with revenue up {i}%",
+             'description': "Margins improved on lower input costs and steady demand across segments.",
+             'source': 'Test', 'time': '10:00 AM, 27 May 2025'} for i in range(200)]
+    kept = analyzer.fit_news_to_budget(news)
+    assert 0 < len(kept) < len(news)
+    batches = analyzer.split_into_batches(kept)
+    worst = sum(analyzer.estimate_batch_cost(batch)[1] for batch in batches) + analyzer.consolidation_reserve()[1]
+    assert worst <= 0.002
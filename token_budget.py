@@ -0,0 +1,235 @@
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+from functools import lru_cache
+from typing import List, Dict, Optional, Callable
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to the character heuristic
+    tiktoken = None
+
+from storage import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+# Llama models are not in tiktoken's registry; cl100k is a close enough proxy
+DEFAULT_ENCODING = "cl100k_base"
+
+# Per-message overhead for chat formatting (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Groq on-demand pricing in USD per 1M tokens: (input, output)
+MODEL_PRICING = {
+    "meta-llama/llama-4-scout-17b-16e-instruct": (0.11, 0.34),
+    "meta-llama/llama-4-maverick-17b-128e-instruct": (0.20, 0.60),
+    "llama-3.1-8b-instant": (0.05, 0.08),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+}
+
+# Share of the input price saved on prompt tokens served from the provider's prefix cache
+CACHE_DISCOUNT = float(os.getenv('GROQ_CACHE_DISCOUNT', 0.5))
+
+
+@lru_cache(maxsize=8)
+def get_encoding(model: Optional[str] = None):
+    """Load (once per model) the tokenizer encoding, or None if unavailable."""
+    if tiktoken is None:
+        return None
+    try:
+        if model:
+            try:
+                return tiktoken.encoding_for_model(model)
+            except KeyError:
+                pass
+        return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception as e:
+        logger.warning(f"tiktoken encoding unavailable, estimating tokens from length: {e}")
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Count tokens with tiktoken, falling back to ~4 characters per token."""
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: List[Dict], model: Optional[str] = None) -> int:
+    """Count the prompt tokens of a chat completion message list."""
+    return sum(count_tokens(m.get("content", ""), model) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+    """Estimate the USD cost of a call from token counts (cached_tokens is the cached part of input_tokens)."""
+    input_price, output_price = MODEL_PRICING.get(model, (0.0, 0.0))
+    billed_input = input_tokens - cached_tokens * CACHE_DISCOUNT
+    return (billed_input * input_price + output_tokens * output_price) / 1_000_000
+
+
+def cached_tokens(usage: Dict) -> int:
+    """Prompt tokens the provider served from its cache, from an OpenAI-style usage object."""
+    return (usage.get('prompt_tokens_details') or {}).get('cached_tokens') or 0
+
+
+class TokenBudget:
+    """Tracks token and cost spend against per-run and per-day limits."""
+
+    def __init__(self, model: str, max_run_tokens: int = 100_000, max_daily_tokens: int = 500_000,
+                 max_run_cost: float = 0.02, max_daily_cost: float = 0.10,
+                 usage_file: str = os.path.join('data', 'token_usage.json')):
+        self.model = model
+        self.max_run_tokens = max_run_tokens
+        self.max_daily_tokens = max_daily_tokens
+        self.max_run_cost = max_run_cost
+        self.max_daily_cost = max_daily_cost
+        self.usage_file = usage_file
+
+        self.run_input_tokens = 0
+        self.run_output_tokens = 0
+        self.run_cached_tokens = 0
+        self.run_cost = 0.0
+        self.run_calls = 0
+        # Per model tier: calls, tokens, cost, latency and escalations to the next tier
+        self.tier_usage = {}
+        self._lock = threading.Lock()  # the streaming pipeline records from several worker threads
+
+        self.daily_usage = self._load_daily_usage()
+
+    @classmethod
+    def from_env(cls, model: str) -> 'TokenBudget':
+        """Build a budget from GROQ_*_BUDGET environment variables."""
+        return cls(
+            model=model,
+            max_run_tokens=int(os.getenv('GROQ_RUN_TOKEN_BUDGET', 100_000)),
+            max_daily_tokens=int(os.getenv('GROQ_DAILY_TOKEN_BUDGET', 500_000)),
+            max_run_cost=float(os.getenv('GROQ_RUN_COST_BUDGET', 0.02)),
+            max_daily_cost=float(os.getenv('GROQ_DAILY_COST_BUDGET', 0.10)),
+        )
+
+    @property
+    def today(self) -> str:
+        # Read on every use: the bot and the pipeline run across midnight
+        return datetime.now().strftime('%Y-%m-%d')
+
+    def _daily(self) -> Dict:
+        """Today's usage, reloaded (or started afresh) when the date has changed since it was loaded."""
+        if self.daily_usage['date'] != self.today:
+            self.daily_usage = self._load_daily_usage()
+        return self.daily_usage
+
+    def _load_daily_usage(self) -> Dict:
+        """Load today's usage; older days are discarded."""
+        empty = {'date': self.today, 'tokens': 0, 'cost': 0.0, 'calls': 0}
+        try:
+            with open(self.usage_file, 'r', encoding='utf-8') as f:
+                usage = json.load(f)
+            return usage if usage.get('date') == self.today else empty
+        except (OSError, ValueError):
+            return empty
+
+    def _save_daily_usage(self):
+        """Persist today's usage so later runs see the same daily cap."""
+        try:
+            atomic_write_json(self.usage_file, self.daily_usage)
+        except OSError as e:
+            logger.warning(f"Could not save token usage: {e}")
+
+    def count(self, text: str) -> int:
+        """Count tokens for this budget's model."""
+        return count_tokens(text, self.model)
+
+    @property
+    def run_tokens(self) -> int:
+        return self.run_input_tokens + self.run_output_tokens
+
+    def remaining_tokens(self) -> int:
+        """Tokens still available under both the run and daily caps."""
+        return max(0, min(self.max_run_tokens - self.run_tokens,
+                          self.max_daily_tokens - self._daily()['tokens']))
+
+    def remaining_cost(self) -> float:
+        """USD still available under both the run and daily caps."""
+        return max(0.0, min(self.max_run_cost - self.run_cost,
+                            self.max_daily_cost - self._daily()['cost']))
+
+    def can_afford(self, input_tokens: int, max_output_tokens: int, model: Optional[str] = None) -> bool:
+        """Check whether a call of this size fits in the remaining budget."""
+        tokens = input_tokens + max_output_tokens
+        cost = estimate_cost(model or self.model, input_tokens, max_output_tokens)
+        return tokens <= self.remaining_tokens() and cost <= self.remaining_cost()
+
+    def _tier(self, tier: str) -> Dict:
+        return self.tier_usage.setdefault(tier, {'calls': 0, 'input_tokens': 0, 'output_tokens': 0, 'cost': 0.0,
+                                                 'seconds': 0.0, 'escalated': 0})
+
+    def record(self, input_tokens: int, output_tokens: int, model: Optional[str] = None, cached_tokens: int = 0,
+               tier: Optional[str] = None, seconds: float = 0.0):
+        """Record the tokens actually spent by a call (and its latency, per model tier)."""
+        cost = estimate_cost(model or self.model, input_tokens, output_tokens, cached_tokens)
+        with self._lock:
+            if tier:
+                usage = self._tier(tier)
+                usage['calls'] += 1
+                usage['input_tokens'] += input_tokens
+                usage['output_tokens'] += output_tokens
+                usage['cost'] += cost
+                usage['seconds'] += seconds
+            self.run_input_tokens += input_tokens
+            self.run_cached_tokens += cached_tokens
+            self.run_output_tokens += output_tokens
+            self.run_cost += cost
+            self.run_calls += 1
+
+            daily = self._daily()
+            daily['tokens'] += input_tokens + output_tokens
+            daily['cost'] += cost
+            daily['calls'] += 1
+            self._save_daily_usage()
+
+    def record_escalation(self, tier: str):
+        """Count a call whose output failed validation and was redone on a larger tier."""
+        with self._lock:
+            self._tier(tier)['escalated'] += 1
+
+    def fit_items(self, items: List[Dict], item_cost: Callable[[Dict], int], fixed_cost: int = 0,
+                  item_dollars: Optional[Callable[[Dict], float]] = None, fixed_dollars: float = 0.0) -> List[Dict]:
+        """Keep the longest priority-ordered prefix of items that fits the token and cost budgets.
+
+        item_cost gives an item's tokens and item_dollars (if given) its USD
+        cost. Items are expected to be sorted by priority, so the lowest-priority
+        items are the ones dropped when the budget is tight.
+        """
+        available = self.remaining_tokens() - fixed_cost
+        available_dollars = self.remaining_cost() - fixed_dollars
+        kept = []
+        for item in items:
+            cost = item_cost(item)
+            dollars = item_dollars(item) if item_dollars else 0.0
+            if cost > available or dollars > available_dollars:
+                break
+            available -= cost
+            available_dollars -= dollars
+            kept.append(item)
+
+        if len(kept) < len(items):
+            logger.warning(f"Budget: dropping {len(items) - len(kept)} lowest-priority items "
+                           f"({self.remaining_tokens()} tokens, ${self.remaining_cost():.4f} left)")
+        return kept
+
+    def summary(self) -> Dict:
+        """Usage figures for the current run and day."""
+        return {
+            'input_tokens': self.run_input_tokens,
+            'output_tokens': self.run_output_tokens,
+            'cached_tokens': self.run_cached_tokens,
+            'estimated_cost': round(self.run_cost, 6),
+            'daily_tokens': self._daily()['tokens'],
+            'daily_cost': round(self._daily()['cost'], 6),
+            'tiers': {tier: dict(usage, cost=round(usage['cost'], 6)) for tier, usage in self.tier_usage.items()},
+        }
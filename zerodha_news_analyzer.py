@@ -1,12 +1,11 @@
 import os
-import json
 import time
+import asyncio
 import logging
 import requests
-import re
 import sys
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple, Callable
 from selenium import webdriver
 from selenium.webdriver.safari.options import Options as SafariOptions
 from selenium.webdriver.common.by import By
@@ -14,8 +13,28 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import WebDriverException, TimeoutException
 from dotenv import load_dotenv
-from bs4 import BeautifulSoup
-from telegram_bot import TelegramBot
+from telegram_bot import TelegramBot, ReportDelivery
+from token_budget import TokenBudget, count_tokens, count_message_tokens, cached_tokens, estimate_cost
+from prompts import Prompt, insights_prompt, records_prompt, report_prompt, movers_prompt, format_batch, format_news_line
+from report_renderer import (Report, SECTION_EMOJIS, build_report, parse_sections, render_text,
+                             render_telegram_messages)
+from entity_extractor import EntityExtractor, SECTOR_KEYWORDS, classify_sector, is_simple_corporate_action, build_corporate_actions_bullets
+from prioritizer import BudgetedScheduler, prioritize
+from entity_index import EntityIndex
+from search_index import SearchIndex
+from sources import HEADERS as SOURCE_HEADERS, parse_pulse_html, scrape_all_sources, print_source_stats
+from enrichment import ArticleEnricher
+from summarizer import ExtractiveSummarizer
+from change_detector import AnalysisState, item_key, content_hash, format_change_bullets
+from run_state import RunState, prune_runs
+import storage
+from pipeline import StreamingPipeline, print_pipeline_stats
+from story_threads import StoryThreader, format_thread_bullets
+from sentiment import SentimentSeries, record_sentiment, format_sentiment_summary
+from alerts import AlertEngine, load_rules, WATCHLISTS_FILE
+from personalize import Personalizer, load_profiles, build_shared_analysis, save_shared_analysis
+from recommendations import RecommendationLedger
+from insight_schema import parse_batch_records, merge_records, format_merged_summary
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -49,6 +68,15 @@ def get_groq_token() -> Optional[str]:
     
     return token
 
+def is_error_response(text: str) -> bool:
+    """True for the error strings query_groq_model returns instead of raising."""
+    return text.startswith(('Error:', 'API Error:'))
+
+def is_valid_insights(text: str) -> bool:
+    """True when free-form batch insights have at least one known report section with bullets."""
+    return not is_error_response(text) and any(section.title in SECTION_EMOJIS and section.bullets
+                                               for section in parse_sections(text))
+
 def check_safari_setup():
     """Check if Safari is properly set up for automation"""
     print("Checking Safari setup...")
@@ -118,9 +146,11 @@ def is_within_last_12_hours(time_text: str) -> bool:
         logger.error(f"Error checking time range: {str(e)}")
         return False
 
-def scrape_pulse_zerodha():
+def scrape_pulse_zerodha(on_item=None):
     """
     Script to scrape Zerodha Pulse website using requests and BeautifulSoup
+
+    on_item, if given, is called with each item as soon as it is parsed.
     """
     print("Starting Zerodha Pulse scraper...")
     
@@ -130,9 +160,7 @@ def scrape_pulse_zerodha():
     try:
         # Make the request with proper headers
         headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
+            **SOURCE_HEADERS,
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1',
         }
@@ -141,90 +169,15 @@ def scrape_pulse_zerodha():
         response = requests.get(url, headers=headers, timeout=30)
         response.raise_for_status()
         
-        # Parse the HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Find the news list
-        news_items = []
-        news_list = soup.find('ul', id='news')
-        
-        if not news_list:
-            print("Warning: News list not found in the page")
-            return None
-            
-        items = news_list.find_all('li', class_='box item')
-        print(f"Found {len(items)} total news items")
-      
-        print(f"Processing latest {len(items)} news items")
-        
-        for idx, item in enumerate(items, 1):
-            try:
-                # Extract headline with safe navigation
-                headline_elem = item.select_one('h2.title a')
-                if not headline_elem:
-                    print(f"Skipping item {idx}: No headline found")
-                    continue
-                    
-                headline = headline_elem.get_text(strip=True)
-                if not headline:
-                    print(f"Skipping item {idx}: Empty headline")
-                    continue
-                
-                # Extract description with safe navigation
-                desc_elem = item.select_one('div.desc')
-                description = desc_elem.get_text(strip=True) if desc_elem else ""
-                
-                # Extract date with safe navigation
-                date_elem = item.select_one('div.date')
-                time_text = ""
-                if date_elem:
-                    time_text = date_elem.get('title', '') or date_elem.get_text(strip=True)
-                if not time_text:
-                    time_text = "Unknown time"
-                
-                # Extract source with safe navigation
-                source_elem = item.select_one('div.feed')
-                source = "Unknown source"
-                if source_elem:
-                    source = source_elem.get_text(strip=True).replace("—", "").strip()
-                
-                # Get URL with safe navigation
-                url = headline_elem.get('href', '')
-                
-                # Create news item
-                news_item = {
-                    'headline': headline,
-                    'description': description,
-                    'source': source,
-                    'time': time_text,
-                    'url': url
-                }
-                
-                news_items.append(news_item)
-                print(f"Article {len(news_items)}: {headline[:50]}...")
-                
-            except Exception as e:
-                print(f"Error processing article {idx}: {str(e)}")
-                continue
+        news_items = parse_pulse_html(response.text, on_item=on_item)
+        for idx, news_item in enumerate(news_items, 1):
+            print(f"Article {idx}: {news_item['headline'][:50]}...")
         
         if not news_items:
             print("Warning: No valid news items were found")
             return None
-            
-        # Create data directory if it doesn't exist
-        os.makedirs('data', exist_ok=True)
-            
-        # Save to JSON file in data directory
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = os.path.join('data', f"pulse_news_{timestamp}.json")
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(news_items, f, indent=4, ensure_ascii=False)
-        
-        print(f"\nSuccessfully scraped {len(news_items)} latest news items")
-        print(f"Data saved to {filename}")
         
-        return news_items
+        return store_scraped_news(news_items)
         
     except requests.exceptions.RequestException as e:
         print(f"Network error occurred: {str(e)}")
@@ -233,6 +186,59 @@ def scrape_pulse_zerodha():
         print(f"An unexpected error occurred: {str(e)}")
         return None
 
+def scrape_all_news(on_item=None):
+    """Scrape Pulse and the publisher RSS/Atom feeds concurrently, then merge and dedup."""
+    print("Starting multi-source scraper...")
+    
+    try:
+        news_items, stats = scrape_all_sources(on_item=on_item)
+    except Exception as e:
+        print(f"Multi-source scrape failed ({e}), falling back to Pulse only")
+        return scrape_pulse_zerodha(on_item=on_item)
+    
+    print("Crawl throughput per source:")
+    print_source_stats(stats)
+    
+    if not news_items:
+        print("Warning: No valid news items were found")
+        return None
+    
+    return store_scraped_news(news_items)
+
+def store_scraped_news(news_items: List[Dict]) -> List[Dict]:
+    """Save a scrape to data/ and add it to the news indexes."""
+    try:
+        entity_index = EntityIndex()
+    except Exception as e:
+        logger.warning(f"Could not load the entity index: {e}")
+        entity_index = None
+    
+    # Local sentiment per item, rolled into the minute/hour/day series. Pulse keeps a story up
+    # for many scrapes, so only stories the index has not seen yet are counted
+    try:
+        fresh = [n for n in news_items if not entity_index.is_indexed(n)] if entity_index else news_items
+        record_sentiment(fresh)
+    except Exception as e:
+        logger.warning(f"Could not record sentiment: {e}")
+    
+    # Compressed, written atomically and registered in the data/ manifest
+    filename = storage.save_snapshot(news_items)
+    
+    print(f"\nSuccessfully scraped {len(news_items)} latest news items")
+    print(f"Data saved to {filename}")
+    
+    # Keep the ticker/sector index current; a failure here must not lose the scrape
+    try:
+        added = (entity_index or EntityIndex()).add_items(news_items)
+        search_index = SearchIndex()
+        search_index.add_items(news_items)
+        search_index.close()
+        print(f"Indexed {added} new articles")
+    except Exception as e:
+        logger.warning(f"Could not update news indexes: {e}")
+    
+    return news_items
+
 class StreamlinedFinancialNewsAnalyzer:
     def __init__(self, groq_token: Optional[str] = None):
         """Initialize the Streamlined Financial News Analyzer"""
@@ -245,145 +251,441 @@ class StreamlinedFinancialNewsAnalyzer:
             "Content-Type": "application/json"
         } if groq_token else {}
         
-        # Use efficient model for batch analysis
-        self.model = "meta-llama/llama-4-scout-17b-16e-instruct"
-        self.max_context_tokens = 4000
-        self.max_output_tokens = 1500
+        # Model cascade: the small tier extracts per batch, the large tier writes the report and
+        # redoes any batch whose small-tier output fails validation
+        self.model = os.getenv('GROQ_LARGE_MODEL', "meta-llama/llama-4-scout-17b-16e-instruct")
+        self.max_context_tokens = 16000  # Consolidation of ~14 batch outputs needs ~12K
+        self.max_output_tokens = 800  # Shorter responses
+        self.tiers = {
+            'small': (os.getenv('GROQ_SMALL_MODEL', "llama-3.1-8b-instant"),
+                      int(os.getenv('SMALL_MAX_TOKENS', self.max_output_tokens))),
+            'large': (self.model, self.max_output_tokens),
+        }
         self.batch_size = 15  # Larger batches for efficiency
+        self.token_budget = TokenBudget.from_env(self.model)
+        self.budget_exhausted = False  # set once a call is refused for lack of budget
+        # Extract compact JSON records per batch instead of free-form Markdown
+        self.structured_output = os.getenv('STRUCTURED_INSIGHTS', '1') != '0'
+        self.entity_extractor = EntityExtractor()
+        # Earlier archived coverage for the top N stories, from the local search index
+        self.background_items = int(os.getenv('BACKGROUND_CONTEXT_ITEMS', 5))
+        # Optional article-body enrichment for the top N items, within a time budget
+        self.enrich_top_n = int(os.getenv('ENRICH_TOP_N', 0))
+        self.enrich_time_budget = float(os.getenv('ENRICH_TIME_BUDGET', 20))
+        # Local extractive summaries (and duplicate merging) instead of truncated descriptions
+        self.local_summaries = os.getenv('LOCAL_SUMMARIES', '1') != '0'
+        self.summary_target_tokens = int(os.getenv('SUMMARY_TARGET_TOKENS', 26))
+        # Differential mode: only stories new or changed since the last run are sent to the model
+        self.diff_mode = os.getenv('DIFF_MODE', '0') != '0'
+        self.diff_max_age_hours = float(os.getenv('DIFF_MAX_AGE_HOURS', 24))
+        # Story threading: follow-ups only send their new developments, repeats are not re-analyzed
+        self.story_threads = os.getenv('STORY_THREADS', '0') != '0'
+        self.thread_similarity = float(os.getenv('THREAD_SIMILARITY', 0.45))
+        self.thread_max_age_days = float(os.getenv('THREAD_MAX_AGE_DAYS', 7))
+        self.threader = None
         
         # Enhanced categorization
-        self.sector_keywords = {
-            'banking': ['bank', 'icici', 'hdfc', 'sbi', 'axis', 'kotak', 'npa', 'credit'],
-            'technology': ['tech', 'it', 'infosys', 'tcs', 'wipro', 'software', 'digital'],
-            'pharma': ['pharma', 'drug', 'medicine', 'fda', 'reddy', 'sun pharma', 'cipla'],
-            'power': ['power', 'ntpc', 'renewable', 'energy', 'coal', 'electricity'],
-            'auto': ['auto', 'car', 'motor', 'tata motors', 'hyundai', 'maruti'],
-            'fmcg': ['fmcg', 'consumer', 'itc', 'hindustan unilever', 'nestle'],
-            'metals': ['metal', 'steel', 'iron', 'copper', 'aluminum', 'tata steel'],
-            'oil_gas': ['oil', 'gas', 'petroleum', 'reliance', 'ongc', 'crude'],
-            'realty': ['real estate', 'property', 'construction', 'housing'],
-            'aviation': ['aviation', 'airline', 'aircraft', 'airport', 'indigo', 'air india']
-        }
+        self.sector_keywords = dict(SECTOR_KEYWORDS)
+        
+        # Only the top items (per-sector quotas, minimum score) go to the LLM; the rest are summarized locally
+        self.scheduler = BudgetedScheduler(max_items=int(os.getenv('MAX_ANALYZED_ITEMS', 240)),
+                                           min_score=int(os.getenv('MIN_PRIORITY_SCORE', 1)),
+                                           min_per_sector=int(os.getenv('MIN_ITEMS_PER_SECTOR', 2)),
+                                           sector_keywords=self.sector_keywords)
+        self.other_news_items = int(os.getenv('OTHER_NEWS_ITEMS', 10))
+        # Fast lane: a preliminary top-movers note from the top N items, sent before the full analysis
+        self.fast_lane_items = int(os.getenv('FAST_LANE_ITEMS', 10))
+        self.fast_lane_max_tokens = int(os.getenv('FAST_LANE_MAX_TOKENS', 300))
+
+    def analyze_all_news_consolidated(self, news_data: List[Dict], run_state: Optional[RunState] = None) -> Dict:
+        """Main analysis method that returns ONE FINAL REPORT.
 
-    def analyze_all_news_consolidated(self, news_data: List[Dict]) -> Dict:
-        """Main analysis method that returns ONE FINAL REPORT."""
+        With a run_state every stage is checkpointed, and a resumed run skips the
+        stages (and the batches) that already completed.
+        """
         logger.info(f"Starting consolidated analysis of {len(news_data)} news items...")
         
-        # Step 1: Prioritize and categorize
-        prioritized_news = self.prioritize_news(news_data)
-        categorized_news = self.categorize_news_by_sector(prioritized_news)
-        sector_summary = {k: len(v) for k, v in categorized_news.items()}
-        
+        # Step 1: Prioritize, summarize, fit to the token budget and diff against the last run
+        plan = run_state.load('plan') if run_state else None
+        if plan is None:
+            plan = self.plan_analysis(news_data)
+            if run_state:
+                run_state.save('plan', plan)
+        else:
+            logger.info(f"Resuming run {run_state.run_id} from its checkpoints")
+            if self.story_threads:
+                # The interrupted run never saved its threads; replay the assignment so this run does
+                self.thread_stories(plan['prioritized_news'])
+        prioritized_news = plan['prioritized_news']
+        analyze_news = [prioritized_news[i] for i in plan['analyze']]
+        sector_summary = plan['sector_summary']
         logger.info(f"News categorized: {sector_summary}")
         
         # Step 2: Split into batches and extract key insights
-        batches = self.split_into_batches(prioritized_news)
+        batches = self.split_into_batches(analyze_news)
         logger.info(f"Processing {len(batches)} batches for key insights...")
         
-        batch_insights = []
+        batch_results = {}
+        failed_batches = []
         total_api_calls = 0
-        
         for i, batch in enumerate(batches, 1):
-            insights = self.analyze_batch_for_insights(batch, i, len(batches))
-            batch_insights.append(insights)
+            result = run_state.load(f"batch_{i:03d}") if run_state else None
+            if result is None:
+                result, api_calls = self.run_batch(batch, i, len(batches))
+                total_api_calls += api_calls
+                if result is None and self.budget_exhausted:
+                    # Out of budget: report on the batches analyzed so far instead of failing the run
+                    logger.warning(f"Budget exhausted at batch {i}/{len(batches)}, "
+                                   f"{sum(len(b) for b in batches[i - 1:])} items left unanalyzed")
+                    break
+                if result is None:
+                    failed_batches.append(i)
+                    continue
+                if run_state:
+                    run_state.save(f"batch_{i:03d}", result)
+                if i < len(batches):
+                    time.sleep(1)  # Rate limiting
+            batch_results[i] = result
+        
+        # Failed batches are retried on their own rather than re-running everything
+        for i in failed_batches:
+            if self.budget_exhausted:
+                break
+            time.sleep(5)
+            result, api_calls = self.run_batch(batches[i - 1], i, len(batches))
+            total_api_calls += api_calls
+            if result is None:
+                continue
+            if run_state:
+                run_state.save(f"batch_{i:03d}", result)
+            batch_results[i] = result
+        still_failed = [i for i in failed_batches if i not in batch_results]
+        if still_failed and run_state and not self.budget_exhausted:
+            raise RuntimeError(f"Batches {still_failed} failed; rerun to resume run {run_state.run_id}")
+        return self.finish_analysis(news_data, plan, batches, batch_results, total_api_calls, run_state)
+
+    def finish_analysis(self, news_data: List[Dict], plan: Dict, batches: List[List[Dict]], batch_results: Dict,
+                        total_api_calls: int, run_state: Optional[RunState] = None) -> Dict:
+        """Merge the batch results and generate the consolidated report (steps after the batch calls)."""
+        prioritized_news = plan['prioritized_news']
+        analyze_news = [prioritized_news[i] for i in plan['analyze']]
+        sector_summary = plan['sector_summary']
+        offsets = [0]
+        for batch in batches:
+            offsets.append(offsets[-1] + len(batch))
+        
+        # Records point at items by their 1-based position in prioritized_news
+        batch_insights = []
+        insight_records = []
+        analyzed = {}
+        for i, result in sorted(batch_results.items()):
+            if 'insights' in result:
+                batch_insights.append(result['insights'])
+                continue
+            offset = offsets[i - 1]
+            for news_item in batches[i - 1]:
+                analyzed[item_key(news_item)] = {'hash': content_hash(news_item),
+                                                 'headline': news_item.get('headline', ''), 'records': []}
+            for record in result['records']:
+                source = record['source'] - offset - 1
+                news_item = batches[i - 1][source]
+                analyzed[item_key(news_item)]['records'].append({k: v for k, v in record.items() if k != 'source'})
+                insight_records.append({**record, 'source': plan['analyze'][offset + source] + 1})
+        
+        if self.threader is not None:
+            self.remember_thread_records(prioritized_news, plan['analyze'], insight_records)
+        
+        # Differential mode: stories unchanged since the last run reuse their records, as do thread repeats
+        for carried in (plan['unchanged'], plan.get('repeated', {})):
+            analyzed.update(carried)
+            for key, entry in carried.items():
+                insight_records.extend({**record, 'source': entry['source']} for record in entry['records'])
+        insight_records.sort(key=lambda r: r['source'])
+        
+        # Step 3: Merge structured records locally, then generate final consolidated report
+        merged_records = merge_records(insight_records)
+        logger.info(f"Merged {len(insight_records)} insight records into {len(merged_records)}")
+        
+        state = AnalysisState(max_age_hours=self.diff_max_age_hours) if self.diff_mode else None
+        final_report = run_state.load('report') if run_state else None
+        if final_report is None and plan['changes'] and not analyze_news and state.final_report:
+            logger.info("Nothing changed since the last run, reusing its report")
+            final_report = state.final_report
+        elif final_report is None and not analyze_news and not merged_records:
+            # Every item repeated a known story that left no records: nothing for the model to write about
+            logger.info("Nothing new to analyze, skipping consolidation")
+            final_report = ''
+        elif final_report is None:
+            logger.info("Generating final consolidated report...")
+            consolidation = run_state.load('consolidation') if run_state else None
+            if consolidation is None:
+                consolidation = {'batch_insights': batch_insights,
+                                 'merged_summary': format_merged_summary(merged_records),
+                                 'background': self.get_background_context(prioritized_news),
+                                 'sentiment': plan['sentiment']}
+                if run_state:
+                    run_state.save('consolidation', consolidation)
+            final_report = self.generate_final_consolidated_report(
+                consolidation['batch_insights'], sector_summary, len(news_data),
+                merged_summary=consolidation['merged_summary'], background=consolidation['background'],
+                sentiment=consolidation['sentiment'])
             total_api_calls += 1
-            
-            if i < len(batches):
-                time.sleep(1)  # Rate limiting
+            if is_error_response(final_report):
+                if run_state:
+                    raise RuntimeError(f"Consolidation failed ({final_report}); rerun to resume run {run_state.run_id}")
+            elif run_state:
+                run_state.save('report', final_report)
         
-        # Step 3: Generate final consolidated report
-        logger.info("Generating final consolidated report...")
-        final_report = self.generate_final_consolidated_report(batch_insights, sector_summary, len(news_data))
-        total_api_calls += 1
+        local_sections = {'Corporate Actions': plan['local_actions'], 'Other News': plan['other_news']}
+        if plan['developing']:
+            local_sections['Developing Stories'] = plan['developing']
+        if self.threader is not None and not is_error_response(final_report):
+            self.threader.save()
+        if state is not None:
+            if not is_error_response(final_report):
+                state.save(analyzed, final_report)
+            if plan['changes']:
+                new_keys, changed_keys, removed = plan['changes']
+                local_sections['What Changed'] = format_change_bullets(merged_records, prioritized_news,
+                                                                       set(new_keys), set(changed_keys), removed)
         
         return {
             'total_news_items': len(news_data),
+            'items_dropped': plan['items_dropped'],
+            'items_deferred': plan['items_deferred'],
+            'items_repeated': plan['items_repeated'],
+            'items_merged': plan['merged_items'],
+            'items_analyzed': sum(len(batches[i - 1]) for i in batch_results),
             'sector_summary': sector_summary,
             'final_report': final_report,
+            'insight_records': merged_records,
+            'analyzed_news': prioritized_news,
+            'local_sections': local_sections,
             'api_calls_used': total_api_calls,
+            **self.token_budget.summary(),
             'analysis_timestamp': datetime.now().isoformat()
         }
 
-    def prioritize_news(self, news_data: List[Dict]) -> List[Dict]:
-        """Prioritize news based on market impact and recency."""
-        def calculate_priority(news_item):
-            score = 0
-            headline = news_item.get('headline', '').lower()
-            description = news_item.get('description', '').lower()
-            combined_text = f"{headline} {description}"
-            
-            # High impact keywords
-            high_impact_words = [
-    # Corporate Actions
-    'results', 'earnings', 'profit', 'loss', 'merger', 'acquisition', 
-    'ipo', 'dividend', 'buyback', 'split', 'delisting', 'rating', 
-    'upgrade', 'downgrade', 'target', 'recommendation',
-    
-    # Financial Metrics
-    'revenue', 'growth', 'margin', 'ebitda', 'pat', 'eps',
-    'guidance', 'forecast', 'outlook', 'projection',
-    
-    # Corporate Events
-    'launch', 'expansion', 'investment', 'capex', 'order', 'contract',
-    'deal', 'partnership', 'collaboration', 'venture',
-    
-    # Market Actions
-    'circuit', 'upper circuit', 'lower circuit', 'breakout', 'breakdown',
-    'surge', 'plunge', 'rally', 'correction', 'volatility',
-    
-    # Analyst Actions
-    'initiate', 'maintain', 'retain', 'revise', 'cut', 'raise',
-    'bullish', 'bearish', 'neutral', 'outperform', 'underperform'
-]
-            
-            for word in high_impact_words:
-                if word in combined_text:
-                    score += 3
-            
-            # Market moving events
-            market_movers = [
-                # Existing terms
-                'fii', 'dii', 'rbi', 'sebi', 'government', 'policy', 'tax', 
-                'interest rate', 'inflation', 'gdp', 'budget',
-                
-                # Market Structure
-                'sensex', 'nifty', 'bullish', 'bearish', 'correction', 'rally',
-                'volatility', 'consolidation',
-                
-                # Technical Analysis
-                'sma', 'ema', 'resistance', 'support', 'breakout', 'breakdown',
-                'volume', 'technical', 'pattern',
-                
-                # Corporate Actions
-                'merger', 'acquisition', 'm&a', 'dividend', 'buyback',
-                'earnings', 'results', 'quarterly', 'guidance', 'outlook',
-                
-                # Sectors
-                'banking', 'finance', 'it', 'auto', 'pharma', 'realty',
-                'infrastructure', 'cement', 'energy', 'power', 'oil',
-                'defense', 'aerospace',
-                
-                # Global Markets
-                'futures', 'dow', 'nasdaq', 'asian', 'european',
-                'tariff', 'trade', 'commodity', 'gold', 'crude'
-            ]
-            
-            for word in market_movers:
-                if word in combined_text:
-                    score += 2
-            
-            # Financial figures
-            if re.search(r'rs\s*\d+|₹\s*\d+|\d+\s*crore|\d+\s*%', combined_text):
-                score += 2
-            
-            # Recent news gets higher priority
-            time_str = news_item.get('time', '')
-            if 'may 2025' in time_str.lower():
-                score += 1
-            
-            return score
+    def thread_stories(self, prioritized_news: List[Dict]):
+        """Assign items to story threads, tagging each with its 'thread_id' in place."""
+        self.threader = StoryThreader(similarity=self.thread_similarity, max_age_days=self.thread_max_age_days)
+        self.threader.assign(prioritized_news)
+
+    def remember_thread_records(self, prioritized_news: List[Dict], analyze: List[int], insight_records: List[Dict]):
+        """Store the records of this run's analyzed items on their threads, for later repeats."""
+        by_source = {}
+        for record in insight_records:
+            by_source.setdefault(record['source'], []).append({k: v for k, v in record.items() if k != 'source'})
+        for i in analyze:
+            thread_id = prioritized_news[i].get('thread_id')
+            if thread_id is not None and by_source.get(i + 1):
+                self.threader.remember(thread_id, by_source[i + 1])
+
+    def plan_analysis(self, news_data: List[Dict]) -> Dict:
+        """Decide what the model will see this run (JSON-serialisable, so it can be checkpointed)."""
+        # Pure dividend/split/bonus/buyback items are reported from local extraction, without the LLM
+        self.entity_extractor.annotate(news_data)
+        local_news = [n for n in news_data if is_simple_corporate_action(n['entities'])]
+        local_actions = build_corporate_actions_bullets(prioritize(local_news))
+        candidates = [n for n in news_data if not is_simple_corporate_action(n['entities'])]
         
-        return sorted(news_data, key=calculate_priority, reverse=True)
+        prioritized_news, deferred = self.prioritize_news(candidates)
+        if self.enrich_top_n > 0:
+            ArticleEnricher(time_budget=self.enrich_time_budget).enrich(prioritized_news[:self.enrich_top_n])
+        merged_items = 0
+        if self.local_summaries:
+            summarizer = ExtractiveSummarizer(target_tokens=self.summary_target_tokens, model=self.model)
+            prioritized_news = summarizer.summarize(prioritized_news)
+            merged_items = summarizer.stats['items_merged']
+            logger.info(f"Summarized locally: {summarizer.stats}")
+        fitted_news = self.fit_news_to_budget(prioritized_news)
+        
+        # Items over the token budget join the deferred ones in the cheap local-summary tier
+        items_dropped = len(prioritized_news) - len(fitted_news)
+        other_news = self.build_other_news_bullets(prioritized_news[len(fitted_news):] + deferred)
+        prioritized_news = fitted_news
+        categorized_news = self.categorize_news_by_sector(prioritized_news)
+        
+        # Story threading: items repeating a known story are skipped, follow-ups keep only what is new
+        developing = []
+        if self.story_threads:
+            self.thread_stories(prioritized_news)
+            developing = format_thread_bullets(prioritized_news)
+            logger.info(f"Story threads: {self.threader.stats}")
+        analyze = [i for i, n in enumerate(prioritized_news) if n.get('thread_status') != 'repeat']
+        
+        # Differential mode: only stories new or changed since the last run go to the model
+        unchanged = {}
+        changes = None
+        state = AnalysisState(max_age_hours=self.diff_max_age_hours) if self.diff_mode else None
+        if state is not None and state.items:
+            new, changed, unchanged_news, removed = state.diff(prioritized_news)
+            unchanged_ids = {id(n) for n in unchanged_news}
+            analyze = [i for i in analyze if id(prioritized_news[i]) not in unchanged_ids]
+            unchanged = {item_key(n): {**state.items[item_key(n)], 'source': i + 1}
+                         for i, n in enumerate(prioritized_news) if id(n) in unchanged_ids}
+            changes = ([item_key(n) for n in new], [item_key(n) for n in changed], removed)
+            logger.info(f"Diff mode: {len(new)} new, {len(changed)} changed, {len(unchanged_news)} unchanged, "
+                        f"{removed} gone since the last run")
+        
+        # Repeats of known stories carry the records their thread's earlier analysis produced
+        repeated = {}
+        if self.threader is not None:
+            for i, n in enumerate(prioritized_news):
+                if n.get('thread_status') == 'repeat' and item_key(n) not in unchanged:
+                    repeated[item_key(n)] = {'hash': content_hash(n), 'headline': n.get('headline', ''),
+                                             'records': self.threader.records(n['thread_id']), 'source': i + 1}
+        
+        return {
+            'prioritized_news': prioritized_news,
+            'analyze': analyze,
+            'unchanged': unchanged,
+            'repeated': repeated,
+            'changes': changes,
+            'sector_summary': {k: len(v) for k, v in categorized_news.items()},
+            'sentiment': format_sentiment_summary(news_data, SentimentSeries()),
+            'local_actions': local_actions,
+            'other_news': other_news,
+            'developing': developing,
+            'local_items': len(local_news),
+            'merged_items': merged_items,
+            'items_deferred': len(deferred),
+            'items_repeated': len(prioritized_news) - len(analyze) - len(unchanged),
+            'items_dropped': items_dropped,
+        }
+
+    def run_batch(self, batch: List[Dict], batch_num: int, total_batches: int, offset: Optional[int] = None):
+        """Analyze one batch. Returns ({'records': [...]} or {'insights': text} or None on failure, API calls).
+
+        offset is the number of items in the earlier batches (full batches by default).
+        """
+        tiers = self.escalation_tiers()
+        api_calls = 0
+        if self.structured_output:
+            if offset is None:
+                offset = (batch_num - 1) * self.batch_size
+            for tier in tiers:
+                records = self.analyze_batch_structured(batch, batch_num, total_batches, offset=offset, tier=tier)
+                api_calls += 1
+                if records is not None:
+                    return {'records': records}, api_calls
+                if self.budget_exhausted:
+                    return None, api_calls
+                if tier != tiers[-1]:
+                    self.token_budget.record_escalation(tier)
+            # Free-form fallback when JSON extraction fails on every tier goes straight to the large one
+            tiers = ['large']
+        for tier in tiers:
+            insights = self.analyze_batch_for_insights(batch, batch_num, total_batches, tier=tier)
+            api_calls += 1
+            if is_valid_insights(insights):
+                return {'insights': insights}, api_calls
+            if self.budget_exhausted:
+                return None, api_calls
+            logger.warning(f"Batch {batch_num} failed on the {tier} model: {insights[:100]}")
+            if tier != tiers[-1]:
+                self.token_budget.record_escalation(tier)
+        return None, api_calls
+
+    def escalation_tiers(self) -> List[str]:
+        """Tiers a batch is tried on, in order: the small one first, escalating to the large one
+        when its output is invalid."""
+        return ['small', 'large'] if self.tiers['small'][0] != self.tiers['large'][0] else ['large']
+
+    def batch_attempts(self) -> List[Tuple[Callable[[str], Prompt], str]]:
+        """(prompt builder, tier) of every call run_batch can make for one batch, in order."""
+        tiers = self.escalation_tiers()
+        def freeform(summary: str) -> Prompt:
+            return self.build_batch_prompt(summary, 0, 0)
+        
+        if self.structured_output:
+            return [(self.build_structured_batch_prompt, tier) for tier in tiers] + [(freeform, 'large')]
+        return [(freeform, tier) for tier in tiers]
+
+    def estimate_batch_cost(self, batch: List[Dict]) -> Tuple[int, float]:
+        """Worst-case (tokens, USD) of run_batch on a batch, counting its output again in consolidation."""
+        summary = self.prepare_concise_batch_summary(batch)
+        tokens, dollars = self.max_output_tokens, estimate_cost(self.model, self.max_output_tokens, 0)
+        for build, tier in self.batch_attempts():
+            model, max_tokens = self.tiers[tier]
+            prompt_tokens = build(summary).tokens(model)
+            tokens += prompt_tokens + max_tokens
+            dollars += estimate_cost(model, prompt_tokens, max_tokens)
+        return tokens, dollars
+
+    def consolidation_reserve(self) -> Tuple[int, float]:
+        """(tokens, USD) kept back for the consolidation call, beyond the batch outputs it reads."""
+        prompt_tokens = self.build_consolidation_prompt("", "", 0).tokens(self.model)
+        return prompt_tokens + self.max_output_tokens, estimate_cost(self.model, prompt_tokens, self.max_output_tokens)
+
+    def fit_news_to_budget(self, prioritized_news: List[Dict]) -> List[Dict]:
+        """Drop the lowest-priority items that would push the run over its token or cost budget.
+
+        Costs are the worst case of run_batch: every tier of the escalation
+        path is tried with the prompt that is actually sent.
+        """
+        attempts = [(build, *self.tiers[tier]) for build, tier in self.batch_attempts()]
+        # Every batch costs its prompt templates plus their outputs, and the final output is
+        # fed again into consolidation; this overhead is spread across the batch, with one
+        # whole batch's worth reserved up front for a partly filled last batch
+        batch_tokens = sum(build("").tokens(model) + max_tokens for build, model, max_tokens in attempts)
+        batch_tokens += self.max_output_tokens
+        batch_dollars = sum(estimate_cost(model, build("").tokens(model), max_tokens)
+                            for build, model, max_tokens in attempts)
+        batch_dollars += estimate_cost(self.model, self.max_output_tokens, 0)
+        reserve_tokens, reserve_dollars = self.consolidation_reserve()
+        
+        def item_cost(news_item):
+            line = self.format_news_line(0, news_item)
+            return len(attempts) * self.token_budget.count(line) + batch_tokens // self.batch_size + 1
+        
+        def item_dollars(news_item):
+            tokens = self.token_budget.count(self.format_news_line(0, news_item))
+            return sum(estimate_cost(model, tokens, 0) for _, model, _ in attempts) + batch_dollars / self.batch_size
+        
+        return self.token_budget.fit_items(prioritized_news, item_cost, fixed_cost=reserve_tokens + batch_tokens,
+                                           item_dollars=item_dollars, fixed_dollars=reserve_dollars + batch_dollars)
+
+    def analyze_fast_lane(self, news_data: List[Dict]) -> Optional[Report]:
+        """Preliminary 'top movers' report from the highest-priority items, in a single LLM call."""
+        selected, _ = self.prioritize_news(news_data)
+        top = selected[:self.fast_lane_items]
+        if not top:
+            return None
+        logger.info(f"Fast lane: top movers from {len(top)} of {len(news_data)} items")
+        # Output length dominates the latency of one call, so the note is kept short
+        response = self.query_groq_model(movers_prompt(format_batch(top)), max_tokens=self.fast_lane_max_tokens)
+        if is_error_response(response):
+            logger.warning(f"Fast lane failed: {response}")
+            return None
+        sections = parse_sections(response)
+        if not sections:
+            return None
+        return Report(generated=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                      summary=f"⏳ Preliminary note from the top {len(top)} of {len(news_data)} news items. "
+                              f"The full report replaces it when the analysis finishes.",
+                      sections=sections)
+
+    def prioritize_news(self, news_data: List[Dict]):
+        """Score news by market impact and select what the LLM budget covers.
+
+        Returns (selected, deferred), each highest priority first.
+        """
+        self.entity_extractor.annotate(news_data)
+        return self.scheduler.select(news_data)
+
+    def build_other_news_bullets(self, deferred: List[Dict]) -> List[str]:
+        """Local-summary tier: the best items that got no LLM analysis, with their extractive summaries."""
+        shown = deferred[:self.other_news_items]
+        if not shown:
+            return []
+        bullets = []
+        for news_item in ExtractiveSummarizer(target_tokens=self.summary_target_tokens, model=self.model).summarize(shown):
+            summary = news_item.get('summary') or news_item.get('description', '')[:100]
+            bullets.append(f"{news_item.get('headline', '')} — {summary}" if summary else news_item.get('headline', ''))
+        if len(deferred) > len(shown):
+            bullets.append(f"... and {len(deferred) - len(shown)} more lower-priority items")
+        return bullets
 
     def categorize_news_by_sector(self, news_data: List[Dict]) -> Dict[str, List[Dict]]:
         """Categorize news by sectors for better analysis."""
@@ -391,19 +693,7 @@ class StreamlinedFinancialNewsAnalyzer:
         categorized['general'] = []
         
         for news_item in news_data:
-            headline = news_item.get('headline', '').lower()
-            description = news_item.get('description', '').lower()
-            combined_text = f"{headline} {description}"
-            
-            assigned = False
-            for sector, keywords in self.sector_keywords.items():
-                if any(keyword in combined_text for keyword in keywords):
-                    categorized[sector].append(news_item)
-                    assigned = True
-                    break
-            
-            if not assigned:
-                categorized['general'].append(news_item)
+            categorized[classify_sector(news_item, self.sector_keywords)].append(news_item)
         
         return categorized
 
@@ -411,115 +701,134 @@ class StreamlinedFinancialNewsAnalyzer:
         """Split news data into batches."""
         return [news_data[i:i + self.batch_size] for i in range(0, len(news_data), self.batch_size)]
 
-    def analyze_batch_for_insights(self, batch: List[Dict], batch_num: int, total_batches: int) -> str:
+    def analyze_batch_for_insights(self, batch: List[Dict], batch_num: int, total_batches: int,
+                                   tier: str = 'large') -> str:
         """Analyze batch and extract structured insights."""
-        logger.info(f"Extracting structured insights from batch {batch_num}/{total_batches} ({len(batch)} items)")
+        logger.info(f"Extracting structured insights from batch {batch_num}/{total_batches} ({len(batch)} items, "
+                    f"{tier} model)")
         
         # Prepare concise news summary
         news_summary = self.prepare_concise_batch_summary(batch)
+        prompt = self.build_batch_prompt(news_summary, batch_num, total_batches)
         
-        # Create focused prompt for structured insights with exact format
-        prompt = f"""Extract structured insights from this news batch. Focus on specific companies, sectors, and actionable information.
-
-NEWS BATCH {batch_num}/{total_batches}:
-{news_summary}
+        # Drop the lowest-priority items of the batch until it fits the context window
+        while len(batch) > 1 and prompt.tokens(self.model) + self.max_output_tokens > self.max_context_tokens:
+            batch = batch[:-1]
+            news_summary = self.prepare_concise_batch_summary(batch)
+            prompt = self.build_batch_prompt(news_summary, batch_num, total_batches)
+            logger.warning(f"Batch {batch_num} trimmed to {len(batch)} items to fit the context window")
+        
+        return self.query_groq_model(prompt, tier=tier)
 
-Extract and organize in EXACTLY this format:
+    def analyze_batch_structured(self, batch: List[Dict], batch_num: int, total_batches: int,
+                                 offset: int = 0, tier: str = 'large') -> Optional[List[Dict]]:
+        """Extract validated JSON insight records from a batch, or None if the response is unusable."""
+        logger.info(f"Extracting JSON insight records from batch {batch_num}/{total_batches} ({len(batch)} items, "
+                    f"{tier} model)")
+        
+        prompt = self.build_structured_batch_prompt(self.prepare_concise_batch_summary(batch))
+        response = self.query_groq_model(prompt, json_mode=True, tier=tier)
+        
+        try:
+            records, _ = parse_batch_records(response, len(batch), offset)
+        except ValueError as e:
+            logger.warning(f"Batch {batch_num} JSON extraction failed on the {tier} model ({e})")
+            return None
+        return records
 
-**Key Sector Trends** 🌍📈
-- List sector-specific developments with company names and concrete details
-- Include actual numbers and percentages where available
-- Focus on market-moving news
+    def build_structured_batch_prompt(self, news_summary: str) -> Prompt:
+        """Create the JSON-mode extraction prompt for one batch."""
+        return records_prompt(news_summary)
 
-**Buy/Sell Opportunities** 💰🔍
-- Buy: List specific stocks with clear reasoning and target prices
-- Sell/Avoid: List stocks to avoid with specific reasons
-- Include analyst recommendations and technical levels
+    def build_batch_prompt(self, news_summary: str, batch_num: int, total_batches: int) -> Prompt:
+        """Create focused prompt for structured insights with exact format."""
+        return insights_prompt(news_summary, batch_num, total_batches)
 
-**Macro Implications** 🏦📉
-- List government policies and regulatory changes
-- Include economic indicators and market sentiment
-- Focus on items affecting overall market direction
+    def prepare_concise_batch_summary(self, news_data: List[Dict]) -> str:
+        """Prepare very concise summary for batch analysis."""
+        return format_batch(news_data)
 
-**Corporate Actions** 🗓️🏢
-- List earnings results with specific numbers
-- Include dividend announcements and business updates
-- Mention upcoming corporate events
+    def format_news_line(self, index: int, news: Dict) -> str:
+        """Format a single news item as one prompt line."""
+        return format_news_line(index, news)
 
-Keep each point concise but include specific company names, figures, and concrete details."""
+    def get_background_context(self, prioritized_news: List[Dict], per_item: int = 2) -> str:
+        """Look up earlier coverage of the top stories in the local search index."""
+        if self.background_items <= 0:
+            return ""
+        try:
+            index = SearchIndex()
+        except Exception as e:
+            logger.warning(f"Search index unavailable, skipping background context: {e}")
+            return ""
         
-        return self.query_groq_model(prompt)
+        # Only coverage from before today's news cycle counts as background
+        cutoff = time.time() - 12 * 3600
+        lines = []
+        for news_item in prioritized_news[:self.background_items]:
+            for row in index.related(news_item, limit=per_item, before=cutoff):
+                lines.append(f"- {news_item.get('headline', '')[:60]} <- earlier: {row['headline'][:80]} ({row['time']})")
+        index.close()
+        return "\n".join(lines)
 
-    def prepare_concise_batch_summary(self, news_data: List[Dict]) -> str:
-        """Prepare very concise summary for batch analysis."""
-        news_summary = ""
-        for i, news in enumerate(news_data, 1):
-            headline = news.get('headline', '')[:80]
-            description = news.get('description', '')[:100]
-            news_summary += f"{i}. {headline} - {description}\n"
-        return news_summary
-
-    def generate_final_consolidated_report(self, batch_insights: List[str], sector_summary: Dict, total_items: int) -> str:
+    def generate_final_consolidated_report(self, batch_insights: List[str], sector_summary: Dict, total_items: int,
+                                           merged_summary: str = "", background: str = "", sentiment: str = "") -> str:
         """Generate structured report in the exact format requested."""
         
-        # Combine all batch insights
-        all_insights = "\n\n".join([f"BATCH {i+1} INSIGHTS:\n{insight}" for i, insight in enumerate(batch_insights)])
+        # Combine the merged structured records with any free-form batch insights
+        insight_blocks = [f"BATCH {i+1} INSIGHTS:\n{insight}" for i, insight in enumerate(batch_insights)]
+        if sentiment:
+            insight_blocks.insert(0, f"LOCAL SENTIMENT (lexicon scores from -1 to +1, precomputed for all items):\n{sentiment}")
+        if background:
+            insight_blocks.insert(0, f"BACKGROUND (earlier coverage of today's top stories):\n{background}")
+        if merged_summary:
+            insight_blocks.insert(0, f"MERGED INSIGHT RECORDS:\n{merged_summary}")
         
         sector_text = ", ".join([f"{sector.title()}({count})" for sector, count in sector_summary.items() if count > 0])
         
-        consolidation_prompt = f"""You are a senior financial analyst. Create a structured report from these news insights in the EXACT format shown below.
-
-SECTOR DISTRIBUTION: {sector_text}
-TOTAL NEWS ANALYZED: {total_items}
-
-ALL BATCH INSIGHTS:
-{all_insights}
-
-FORMAT YOUR RESPONSE EXACTLY LIKE THIS:
-
-**Key Sector Trends** 🌍📈
-- Sector name: Brief description of trend/development with specific company names and details mentioned in the news
-- Another sector: Description with company names and specific developments
-- Continue for all major sectors with news
-
-**Buy/Sell Opportunities** 💰🔍
-- Buy: List specific stock names with brief reasoning (technical breakouts, earnings, analyst recommendations)
-- Sell/Avoid: List stocks to avoid with reasoning
-- Include specific targets/levels where mentioned
-
-**Macro Implications** 🏦📉
-- List broader economic/policy impacts that affect markets
-- Include government policies, international developments, regulatory changes
-- Focus on items that impact overall market sentiment
-
-**Corporate Actions** 🗓️🏢
-- List specific companies with earnings results, dividend announcements, business updates
-- Include actual numbers (revenue growth %, profit figures, etc.) where available
-- Mention upcoming earnings/events
-
-Use bullet points with clear company names and specific details. Keep each point concise but informative with actual data from the news."""
+        consolidation_prompt = self.build_consolidation_prompt("\n\n".join(insight_blocks), sector_text, total_items)
+        
+        # Batches are in priority order, so drop the trailing insights if over the context window
+        while len(insight_blocks) > 1 and consolidation_prompt.tokens(self.model) + self.max_output_tokens > self.max_context_tokens:
+            insight_blocks.pop()
+            consolidation_prompt = self.build_consolidation_prompt("\n\n".join(insight_blocks), sector_text, total_items)
+            logger.warning(f"Consolidation trimmed to {len(insight_blocks)} batch insights to fit the context window")
         
         return self.query_groq_model(consolidation_prompt)
 
-    def query_groq_model(self, prompt: str, max_retries: int = 3) -> str:
-        """Query Groq model with error handling."""
+    def build_consolidation_prompt(self, all_insights: str, sector_text: str, total_items: int) -> Prompt:
+        """Create the prompt that merges batch insights into the final report."""
+        return report_prompt(all_insights, sector_text, total_items)
+
+    def build_payload(self, prompt: Prompt, json_mode: bool = False, max_tokens: Optional[int] = None,
+                      model: Optional[str] = None) -> Dict:
+        """Chat completion request body for one prompt: the static prefix first, so providers can cache it."""
         payload = {
-            "model": self.model,
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "You are a senior financial analyst. Provide concise, actionable trading insights."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
+            "model": model or self.model,
+            "messages": prompt.messages(),
             "temperature": 0.3,
-            "max_tokens": 800,  # Shorter responses
+            "max_tokens": max_tokens or self.max_output_tokens,
             "top_p": 0.8
         }
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        return payload
+
+    def query_groq_model(self, prompt: Prompt, max_retries: int = 3, json_mode: bool = False,
+                         max_tokens: Optional[int] = None, tier: str = 'large') -> str:
+        """Query the model of the given tier ('small' or 'large') with error handling."""
+        model, tier_max_tokens = self.tiers[tier]
+        payload = self.build_payload(prompt, json_mode, max_tokens or tier_max_tokens, model=model)
+        
+        # Measure the prompt before sending and refuse calls the budget can't cover
+        input_tokens = count_message_tokens(payload["messages"], model)
+        if not self.token_budget.can_afford(input_tokens, payload["max_tokens"], model=model):
+            self.budget_exhausted = True
+            logger.error(f"Token budget exhausted: call needs {input_tokens + payload['max_tokens']}, "
+                         f"{self.token_budget.remaining_tokens()} left")
+            return "Error: Token budget exhausted"
         
+        start = time.perf_counter()
         for attempt in range(max_retries):
             try:
                 response = requests.post(self.base_url, headers=self.headers, json=payload, timeout=60)
@@ -527,7 +836,13 @@ Use bullet points with clear company names and specific details. Keep each point
                 if response.status_code == 200:
                     result = response.json()
                     if 'choices' in result and len(result['choices']) > 0:
-                        return result['choices'][0]['message']['content'].strip()
+                        content = result['choices'][0]['message']['content'].strip()
+                        usage = result.get('usage', {})
+                        self.token_budget.record(usage.get('prompt_tokens', input_tokens),
+                                                 usage.get('completion_tokens', count_tokens(content, model)),
+                                                 model=model, cached_tokens=cached_tokens(usage), tier=tier,
+                                                 seconds=time.perf_counter() - start)
+                        return content
                 
                 elif response.status_code == 429:
                     wait_time = 15 * (attempt + 1)
@@ -549,25 +864,7 @@ Use bullet points with clear company names and specific details. Keep each point
 
     def generate_clean_daily_report(self, results: Dict) -> str:
         """Generate a clean report in the requested structured format."""
-        report_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        sector_text = " | ".join([f"{sector.title()}: {count}" 
-                                 for sector, count in results['sector_summary'].items() if count > 0])
-        
-        # Create report with exact box formatting and emojis
-        report = f"""
-╔══════════════════════════════════════════════════════════════════╗
-║                📈 STRUCTURED FINANCIAL NEWS REPORT 📈            ║
-║                        {report_date}                      ║
-╚══════════════════════════════════════════════════════════════════╝
-
-📊 **Analysis Summary**: {results['total_news_items']} news items analyzed across sectors: {sector_text}
-
-{results['final_report']}
-
-📌 *Note: Analysis based on {results['total_news_items']} items processed through {results['api_calls_used']} AI analysis calls for comprehensive coverage.*
-"""
-        return report
+        return render_text(build_report(results))
 
     def save_report(self, report: str, filename: str = None) -> str:
         """Save the report to a file with consistent naming."""
@@ -577,12 +874,8 @@ Use bullet points with clear company names and specific details. Keep each point
             filename = os.path.join('data', f"zerodha_news_report_{timestamp}.txt")
         
         try:
-            # Ensure data directory exists
-            os.makedirs('data', exist_ok=True)
-            
-            # Save with UTF-8 encoding for emojis
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(report)
+            # Atomic write, so a crash never leaves a truncated report for the bot to send
+            storage.save_report(report, filename)
             logger.info(f"📄 Report saved to: {filename}")
             return filename
         except Exception as e:
@@ -601,6 +894,7 @@ def main():
     
     # Get current timestamp for logging
     start_time = datetime.now()
+    pipeline_start = time.perf_counter()
     print(f"\n📅 Report Generation Started: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
     
     # Get Telegram credentials from environment variables
@@ -610,30 +904,99 @@ def main():
     if not telegram_token or not telegram_chat_id:
         print("⚠️  Telegram credentials not found. Set TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID environment variables to enable Telegram notifications.")
     
-    # Step 1: Scrape news
-    print("\n📰 Step 1: Scraping news from Zerodha Pulse...")
-    news_data = scrape_pulse_zerodha()
-    
-    if not news_data:
-        print("❌ Failed to scrape news. Exiting...")
-        return
+    # Resume the latest unfinished run (crash, 429 storm) from its checkpoints
+    run_state = None
+    news_data = None
+    if os.getenv('CHECKPOINTS', '1') != '0':
+        run_state = RunState.resume_latest(max_age_hours=float(os.getenv('RESUME_MAX_AGE_HOURS', 6)))
+        if run_state:
+            news_data = run_state.load('scraped')
+            print(f"\n♻️  Resuming run {run_state.run_id} (completed: {', '.join(run_state.completed_stages())})")
     
-    # Step 2: Initialize analyzer with Telegram bot if credentials are available
-    print("\n🔧 Step 2: Initializing Financial News Analyzer...")
-    analyzer = StreamlinedFinancialNewsAnalyzer()
+    # Watchlist alerts fire per item while scraping, long before the analysis finishes
+    alert_engine = None
+    if telegram_token and not news_data and os.path.exists(WATCHLISTS_FILE):
+        rules = load_rules()
+        if rules:
+            alert_engine = AlertEngine(
+                rules, lambda chat_id, text: TelegramBot(telegram_token, chat_id).send_message(text, parse_mode="HTML"))
+    on_item = alert_engine.on_item if alert_engine else None
     
-    # Step 3: Analyze news
-    print("\n🔍 Step 3: Analyzing news for structured report...")
-    results = analyzer.analyze_all_news_consolidated(news_data)
+    delivery = ReportDelivery(TelegramBot(telegram_token, telegram_chat_id), started=pipeline_start) \
+        if telegram_token and telegram_chat_id else None
+    scrape = scrape_all_news if os.getenv('MULTI_SOURCE', '1') != '0' else scrape_pulse_zerodha
     
-    # Step 4: Generate and save report
-    print("\n📊 Step 4: Generating final report...")
-    report = analyzer.generate_clean_daily_report(results)
+    if os.getenv('ASYNC_PIPELINE', '0') != '0' and not news_data:
+        # Steps 1-4 overlap: items are analyzed in batches while the scrape continues
+        print("\n🌊 Steps 1-4: Streaming scrape → analysis → report through bounded queues...")
+        analyzer = StreamlinedFinancialNewsAnalyzer()
+        if os.getenv('CHECKPOINTS', '1') != '0':
+            run_state = RunState()
+        pipeline = StreamingPipeline(analyzer, scrape, on_item=on_item, delivery=delivery, run_state=run_state,
+                                     workers=int(os.getenv('LLM_WORKERS', 2)),
+                                     item_queue=int(os.getenv('PIPELINE_ITEM_QUEUE', 256)),
+                                     requests_per_minute=float(os.getenv('GROQ_REQUESTS_PER_MINUTE', 30)))
+        outcome = asyncio.run(pipeline.run())
+        if alert_engine:
+            alert_engine.close()
+        if not outcome:
+            print("❌ Failed to scrape news. Exiting...")
+            return
+        news_data, results, report_model = outcome['news_data'], outcome['results'], outcome['report_model']
+        report = render_text(report_model)
+        saved_file = outcome['saved_file']
+        print_pipeline_stats(outcome['stats'])
+    else:
+        # Step 1: Scrape news
+        if news_data:
+            print(f"\n📰 Step 1: Using the {len(news_data)} news items scraped by the interrupted run")
+        elif scrape is scrape_all_news:
+            print("\n📰 Step 1: Scraping news from Zerodha Pulse and publisher feeds...")
+            news_data = scrape(on_item)
+        else:
+            print("\n📰 Step 1: Scraping news from Zerodha Pulse...")
+            news_data = scrape(on_item)
+        if alert_engine:
+            alert_engine.close()
+        
+        if not news_data:
+            print("❌ Failed to scrape news. Exiting...")
+            return
+        if os.getenv('CHECKPOINTS', '1') != '0' and run_state is None:
+            run_state = RunState()
+            run_state.save('scraped', news_data)
+        
+        # Step 2: Initialize analyzer with Telegram bot if credentials are available
+        print("\n🔧 Step 2: Initializing Financial News Analyzer...")
+        analyzer = StreamlinedFinancialNewsAnalyzer()
+        
+        # Fast lane: a preliminary top-movers note within one LLM call; the full report is edited into it later
+        report_done = run_state is not None and 'report' in run_state.completed_stages()
+        if delivery and analyzer.fast_lane_items > 0 and not report_done:
+            print("\n⚡ Fast lane: analyzing the top-priority items for a preliminary note...")
+            preliminary = analyzer.analyze_fast_lane(news_data)
+            if preliminary and delivery.send_preliminary(preliminary):
+                print(f"⚡ Preliminary note sent to Telegram {delivery.first_message_seconds:.1f}s "
+                      f"after the run started")
+        
+        # Step 3: Analyze news
+        print("\n🔍 Step 3: Analyzing news for structured report...")
+        results = analyzer.analyze_all_news_consolidated(news_data, run_state)
+        
+        # Step 4: Build the report model once and render it for each destination
+        print("\n📊 Step 4: Generating final report...")
+        report_model = build_report(results)
+        report = render_text(report_model)
+        
+        # Use current time for the report filename
+        current_time = datetime.now()
+        filename = os.path.join('data', f"zerodha_news_report_{current_time.strftime('%Y-%m-%d_%H-%M-%S')}.txt")
+        saved_file = analyzer.save_report(report, filename)
     
-    # Use current time for the report filename
-    current_time = datetime.now()
-    filename = os.path.join('data', f"zerodha_news_report_{current_time.strftime('%Y-%m-%d_%H-%M-%S')}.txt")
-    saved_file = analyzer.save_report(report, filename)
+    if alert_engine:
+        stats = alert_engine.stats
+        print(f"🚨 {stats['alerts']} watchlist alerts sent ({stats['failed']} failed), "
+              f"{stats['match_seconds'] * 1e6 / max(1, stats['items']):.0f} µs per item to evaluate")
     
     # Display the report
     print("\n" + "="*80)
@@ -642,100 +1005,52 @@ def main():
     
     if saved_file:
         print(f"\n💾 Report saved to: {saved_file}")
+        if run_state:
+            run_state.mark_complete()
+            prune_runs(keep=int(os.getenv('KEEP_RUNS', 10)))
         
-        # Send to Telegram if credentials are available
-        if telegram_token and telegram_chat_id:
+        # Send to Telegram if credentials are available (the streaming pipeline has already delivered)
+        if delivery and delivery.report_seconds is None:
             try:
                 print("\n📱 Sending report to Telegram...")
-                telegram_bot = TelegramBot(telegram_token, telegram_chat_id)
-                
-                # Get the complete report text, removing decorative lines
-                report_lines = []
-                
-                # Add a clear header
-                report_lines.append("<b>📊 FINANCIAL NEWS REPORT</b>")
-                report_lines.append(f"<b>Generated:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                
-                # Process each line with proper formatting
-                for line in report.split('\n'):
-                    line = line.strip()
-                    # Skip decorative lines
-                    if not line or line.startswith('╔') or line.startswith('║') or line.startswith('╚'):
-                        continue
-                        
-                    # Format section headers
-                    if line.startswith('**') and line.endswith('**'):
-                        # Add extra newline before section headers
-                        report_lines.append('')
-                        line = f"<b>{line[2:-2].upper()}</b>"  # Remove ** and make uppercase
-                    elif line.startswith('*'):
-                        # Format subsection headers
-                        line = f"<b>{line[1:]}</b>" if line.endswith('*') else f"<b>{line[1:]}</b>"
-                    
-                    # Format bullet points and numbering
-                    if line.startswith('- '):
-                        line = f"• {line[2:]}"
-                    elif re.match(r'^\d+\.\s', line):
-                        # Keep numbered lists as is
-                        pass
-                    
-                    # No need to escape special characters for HTML
-                    report_lines.append(line)
-                
-                # Add footer with analysis info
-                report_lines.append('\n<b>Analysis Information</b>')
-                report_lines.append(f"• Total News Items Analyzed: {results['total_news_items']}")
-                report_lines.append(f"• AI Analysis Calls: {results['api_calls_used']}")
-                report_lines.append(f"• Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-                
-                # Join lines and split into chunks if needed
-                full_report = '\n'.join(report_lines)
-                
-                # Split the report into chunks if it exceeds the limit
-                chunks = []
-                max_length=4000;
-                if len(full_report) > max_length:
-                    # Split by double newlines to try to keep sections together
-                    sections = full_report.split('\n\n')
-                    current_chunk = []
-                    current_length = 0
-                    
-                    for section in sections:
-                        if current_length + len(section) + 2 > max_length:
-                            if current_chunk:
-                                chunks.append('\n\n'.join(current_chunk))
-                            current_chunk = [section]
-                            current_length = len(section)
-                        else:
-                            current_chunk.append(section)
-                            current_length += len(section) + 2
-                    
-                    if current_chunk:
-                        chunks.append('\n\n'.join(current_chunk))
-                else:
-                    chunks = [full_report]
-                
-                # Send each chunk as a separate message
-                for i, chunk in enumerate(chunks, 1):
-                    try:
-                        # Add part number if there are multiple chunks
-                        if len(chunks) > 1:
-                            message = f"<b>📊 Financial News Report (Part {i}/{len(chunks)})</b>\n\n{chunk}"
-                        else:
-                            message = f"<b>📊 Financial News Report</b>\n\n{chunk}"
-                            
-                        # Use parse_mode='HTML' instead of 'Markdown'
-                        if telegram_bot.send_message(message, parse_mode='HTML'):
-                            print(f"✅ Successfully sent part {i}/{len(chunks)} to Telegram")
-                        else:
-                            print(f"❌ Failed to send part {i}/{len(chunks)} to Telegram")
-                    except Exception as e:
-                        print(f"❌ Error sending part {i}/{len(chunks)} to Telegram: {e}")
-                
-                print("📱 Telegram notification complete!")
-                
+                delivery.send_full_report(report_model)
             except Exception as e:
                 print(f"❌ Error sending to Telegram: {e}")
+        
+        # The report's Buy/Sell calls go into the ledger that recommendations.py backtests;
+        # a failure here (e.g. a locked database) must not affect the delivered report
+        try:
+            ledger = RecommendationLedger()
+            try:
+                print(f"📒 {ledger.ingest([saved_file])} buy/sell calls added to the recommendation ledger")
+            finally:
+                ledger.close()
+        except Exception as e:
+            logger.warning(f"Could not update the recommendation ledger: {e}")
+    
+    # One shared analysis, cut into a report per subscriber profile
+    if telegram_token and os.getenv('PERSONALIZED_REPORTS', '0') != '0':
+        subscribers = load_profiles()
+        if subscribers:
+            print(f"\n🎯 Building personalized reports for {len(subscribers)} subscribers...")
+            shared = build_shared_analysis(results)
+            save_shared_analysis(shared)
+            note_tokens = int(os.getenv('PERSONAL_NOTE_MAX_TOKENS', 200))
+            personalizer = Personalizer(shared, lambda prompt: analyzer.query_groq_model(prompt, max_tokens=note_tokens,
+                                                                                         tier='small'))
+            personal_reports = personalizer.build_all(subscribers)
+            personalizer.save()
+            sent = 0
+            for chat_id, personal_report in personal_reports.items():
+                bot = TelegramBot(telegram_token, chat_id)
+                try:
+                    sent += all([bot.send_message(message, parse_mode='HTML')
+                                 for message in render_telegram_messages(personal_report)])
+                except Exception as e:
+                    print(f"❌ Error sending personalized report to {chat_id}: {e}")
+            stats = personalizer.stats
+            print(f"🎯 {sent}/{len(subscribers)} personalized reports sent: {stats['profiles']} distinct profiles, "
+                  f"{stats['llm_calls']} LLM calls, {stats['memo_hits']} memoized notes")
     
     end_time = datetime.now()
     duration = end_time - start_time
@@ -744,6 +1059,24 @@ def main():
     print(f"⏱️  Total Processing Time: {duration.total_seconds():.2f} seconds")
     print("📈 Key Sector Trends | 💰 Buy/Sell Opportunities | 🏦 Macro Implications | 🏢 Corporate Actions")
     print(f"🔢 Used {results['api_calls_used']} API calls to analyze {results['total_news_items']} news items")
+    print(f"🪙 Tokens: {results['input_tokens']} in / {results['output_tokens']} out "
+          f"(~${results['estimated_cost']:.5f}, {results['daily_tokens']} used today)")
+    for tier, usage in results['tiers'].items():
+        escalated = f", {usage['escalated']} escalated" if usage['escalated'] else ""
+        print(f"🪜 {tier} model ({analyzer.tiers[tier][0]}): {usage['calls']} calls, "
+              f"{usage['seconds'] / max(1, usage['calls']):.1f}s avg, ~${usage['cost']:.5f}{escalated}")
+    if results['cached_tokens']:
+        print(f"♻️  {results['cached_tokens']} input tokens served from the provider's prompt cache")
+    if analyzer.diff_mode:
+        print(f"🔄 Diff mode: {results['items_analyzed']} new or changed items sent to the model")
+    if results['items_merged']:
+        print(f"🧩 {results['items_merged']} duplicate items merged into their top-priority copy")
+    if results['items_repeated']:
+        print(f"🧵 {results['items_repeated']} items repeated known stories and were not re-analyzed")
+    if results['items_deferred']:
+        print(f"📰 {results['items_deferred']} low-priority items summarized locally instead of by the model")
+    if results['items_dropped']:
+        print(f"⚠️  {results['items_dropped']} lowest-priority items summarized locally to stay within the token budget")
 
 if __name__ == "__main__":
     try: